@@ -6,23 +6,39 @@ ENHANCED with full tool integration
 """
 
 import os
+import re
 import json
 import time
 import uuid
+import asyncio
+import importlib
+import difflib
+import contextlib
+import concurrent.futures
 from typing import Dict, Any, List, Optional
 from pathlib import Path
 from enum import Enum
+from collections import OrderedDict
 
 # Import all tool modules
 from tools import code_tools, file_tools, system_tools, web_tools, memory_tools, osint_tools
 
 # Import advanced agent features
 from tools.rag_tools import RAGMemory
-from tools.planning_tools import TaskPlanner, PlanExecutor
+from tools.planning_tools import TaskPlanner, PlanExecutor, StepStatus
 from tools.delegation_tools import AgentDelegationManager
 from tools.chain_tools import ToolChainExecutor
 from tools.sandbox_tools import CodeSandbox
-from tools.evaluation_tools import AgentEvaluator
+from tools.evaluation_tools import AgentEvaluator, LiveAgentMetrics
+from tools.routing_tools import EmbeddingRouter, KeywordMatcher
+
+# Shared pooled HTTP transport for all LLM backends
+from llm_http import llm_http_pool
+from response_cache import ResponseCache
+from context_budget import ContextBudget
+from session_history import SessionHistory
+from conversation_index import ConversationIndex
+from backend_scheduler import backend_scheduler, RequestPriority, BackendOverloaded, current_priority
 
 
 class AgentType(Enum):
@@ -45,6 +61,251 @@ class TaskComplexity(Enum):
     COMPLEX = "complex"       # Multi-step, requires multiple agents
 
 
+# Keyword lists for the fallback router (compiled once into a KeywordMatcher)
+ROUTING_KEYWORDS = {
+    # Code-related keywords
+    AgentType.CODER: [
+        'code', 'function', 'class', 'debug', 'bug', 'error', 'refactor',
+        'implement', 'write code', 'python', 'javascript', 'script',
+        'algorithm', 'optimize', 'fix', 'syntax', 'variable'
+    ],
+
+    # Research keywords
+    AgentType.RESEARCHER: [
+        'search', 'find', 'lookup', 'research', 'what is', 'who is',
+        'when did', 'how to', 'wikipedia', 'documentation', 'docs',
+        'latest', 'current', 'news', 'github', 'library'
+    ],
+
+    # Execution keywords
+    AgentType.EXECUTOR: [
+        'run', 'execute', 'list files', 'read file', 'write file',
+        'create file', 'delete', 'move', 'copy', 'command', 'bash',
+        'shell', 'directory'
+    ],
+
+    # Planning/reasoning keywords
+    AgentType.REASONER: [
+        'plan', 'strategy', 'approach', 'analyze', 'compare', 'evaluate',
+        'pros and cons', 'should i', 'which', 'best way', 'explain why',
+        'logic', 'reasoning'
+    ],
+
+    # Consultant keywords (complex decisions, voting, expert advice)
+    AgentType.CONSULTANT: [
+        'vote', 'decide', 'choose between', 'which option', 'expert opinion',
+        'deep thought', 'complex decision', 'consult', 'advise', 'recommend',
+        'philosophical', 'ethical', 'strategic decision', 'critical choice'
+    ],
+
+    # Security/Cybersecurity keywords (UNCENSORED - pentesting, hacking, security)
+    AgentType.SECURITY: [
+        'hack', 'hacking', 'exploit', 'vulnerability', 'vuln', 'penetration test',
+        'pentest', 'security', 'cybersecurity', 'injection', 'xss', 'csrf',
+        'sql injection', 'buffer overflow', 'reverse engineering', 'malware',
+        'backdoor', 'rootkit', 'privilege escalation', 'brute force', 'crack',
+        'password crack', 'hash', 'decrypt', 'encryption', 'cryptography',
+        'nmap', 'metasploit', 'burp suite', 'wireshark', 'kali', 'red team',
+        'blue team', 'threat', 'attack', 'payload', 'shellcode', 'zero day',
+        'cve', 'security audit', 'web security', 'network security', 'firewall',
+        'bypass', 'evade', 'stealth', 'osint', 'reconnaissance', 'footprint',
+        'enumeration', 'port scan', 'directory traversal', 'lfi', 'rfi',
+        'command injection', 'code injection', 'deserialization', 'xxe'
+    ],
+
+    # Vision/Image analysis keywords
+    AgentType.VISION: [
+        'image', 'screenshot', 'picture', 'photo', 'visual', 'see', 'look at',
+        'what do you see', 'analyze image', 'describe image', 'ui', 'interface',
+        'diagram', 'chart', 'graph', 'drawing', 'render', 'displayed', 'shown',
+        'screen', 'display', 'visible', 'ocr', 'read text from', 'extract text',
+        'recognize', 'detect', 'identify in image', 'what\'s in', 'show me'
+    ]
+}
+
+# Score multipliers applied to keyword counts
+ROUTING_KEYWORD_WEIGHTS = {
+    AgentType.CONSULTANT: 2,    # Weight consultant higher
+    AgentType.SECURITY: 2.5,    # Weight security highest for safety
+    AgentType.VISION: 2,        # Weight vision high for image tasks (local)
+}
+
+# Typical seconds per task until enough measurements exist (midpoints of the old estimates)
+SPEED_PRIOR_SECONDS = {
+    'fast': 3.5,
+    'medium': 10,
+    'slow': 20,
+    'very_slow': 75,
+}
+
+# Agents that can stand in for each other; adaptive routing picks the cheaper one
+AGENT_ALTERNATES = {
+    AgentType.VISION: [AgentType.VISION_CLOUD],
+    AgentType.VISION_CLOUD: [AgentType.VISION],
+}
+
+# Concurrent requests assumed for backends that aren't pooled HTTP endpoints (cloud APIs, ...)
+DEFAULT_BACKEND_CAPACITY = 4
+
+# System prompts for Claude-backed agents (native tool use, no ReAct instructions)
+CLAUDE_SYSTEM_PROMPTS = {
+    AgentType.CODER: "You are an expert code writer with access to powerful tools. IMPORTANT: Always respond in English only. Use tools to read, edit, and write code. Always use edit_file for surgical changes instead of rewriting entire files. Explain your reasoning.",
+    AgentType.EXECUTOR: "You are a system administrator with full terminal access. IMPORTANT: Always respond in English only. Use bash and process tools to execute commands and manage systems. Always explain what you're doing before executing commands.",
+    AgentType.RESEARCHER: "You are a research specialist with access to the web and documentation. IMPORTANT: Always respond in English only. Use web search, documentation lookup, and file search tools to find accurate information. Cite your sources.",
+    AgentType.REASONER: "You are a reasoning expert. IMPORTANT: Always respond in English only. Think through problems logically, break them down into steps, and save your findings to memory for later use.",
+    AgentType.CONSULTANT: "You are an expert consultant with access to ALL tools. IMPORTANT: Always respond in English only. Analyze the task, choose the right tools, and provide comprehensive solutions. You have maximum intelligence - use it wisely.",
+    AgentType.VISION: "You are a vision and image analysis expert. IMPORTANT: Always respond in English only. Never use Chinese or any other language. Analyze images, screenshots, UI elements, and visual content clearly.",
+    AgentType.GENERAL: "You are a helpful general assistant. IMPORTANT: Always respond in English only. Answer questions clearly and concisely.",
+}
+
+# Modules that provide langchain tools (reloaded by the tool registry when edited)
+TOOL_MODULES = [code_tools, file_tools, system_tools, web_tools, memory_tools, osint_tools]
+
+# Payload fields that don't change the generated answer (excluded from response cache keys)
+RESPONSE_CACHE_IGNORED_PARAMS = {'model', 'messages', 'stream', 'cache_prompt', 'id_slot'}
+
+# Per-tool timeouts in seconds (others use PKN_TOOL_TIMEOUT)
+DEFAULT_TOOL_TIMEOUTS = {
+    'web_search': 30,
+    'fetch_url': 30,
+    'wiki_lookup': 30,
+    'github_search': 30,
+    'stack_overflow_search': 30,
+    'docs_search': 30,
+    'bash': 125,              # bash enforces its own 120s default
+}
+
+# Appended to every ReAct prompt: several TOOL/ARGS blocks in one reply run concurrently
+PARALLEL_TOOLS_HINT = """To use several independent tools at once, put one TOOL/ARGS block after another in the same reply:
+TOOL: first_tool
+ARGS: {"param1": "value1"}
+TOOL: second_tool
+ARGS: {"param1": "value1"}
+They run in parallel and their results come back in the same order. Only combine calls that don't depend on each other's results."""
+
+# Agents that run the prompt-based tool loop (ReAct) on local models when streaming
+TOOL_AGENT_TYPES = [
+    AgentType.CODER, AgentType.EXECUTOR, AgentType.RESEARCHER,
+    AgentType.REASONER, AgentType.SECURITY
+]
+
+# Agents whose blocking execute_task runs the tool loop (security answers without tools there)
+BLOCKING_TOOL_AGENT_TYPES = [
+    AgentType.CODER, AgentType.EXECUTOR, AgentType.RESEARCHER, AgentType.REASONER
+]
+
+TOOL_LINE_RE = re.compile(r'TOOL:\s*(\w+)', re.IGNORECASE)
+ARGS_LINE_RE = re.compile(r'ARGS:\s*', re.IGNORECASE)
+
+
+class JsonObjectScanner:
+    """
+    Finds where a JSON object ends, tracking nesting and string escapes.
+
+    Resumable: feed it a growing buffer and it continues from where it
+    stopped, so scanning a streamed object is linear in its length.
+    """
+
+    def __init__(self, start: int = 0):
+        self.pos = start
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+
+    def scan(self, text: str) -> Optional[int]:
+        """Index just past the closing brace, or None if the object isn't complete yet"""
+        pos, depth, in_string, escaped = self.pos, self.depth, self.in_string, self.escaped
+        length = len(text)
+
+        while pos < length:
+            char = text[pos]
+            pos += 1
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == '\\':
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char in '{[':
+                depth += 1
+            elif char in '}]':
+                depth -= 1
+                if depth == 0:
+                    self.pos, self.depth, self.in_string, self.escaped = pos, depth, in_string, escaped
+                    return pos
+
+        self.pos, self.depth, self.in_string, self.escaped = pos, depth, in_string, escaped
+        return None
+
+
+class ToolCallStreamParser:
+    """
+    Watches a streamed ReAct reply for complete TOOL/ARGS blocks.
+
+    feed() returns True once the reply's tool calls are complete and the
+    model has moved on to something other than another TOOL block (or the
+    per-turn call limit is hit), so the caller can stop generation there.
+    Blocks without a JSON ARGS object never trigger an early stop; those
+    replies are parsed after the model finishes as before.
+    """
+
+    def __init__(self, max_calls: int):
+        self.max_calls = max_calls
+        self.text = ''
+        self.calls = 0
+        self.block_end = None  # End of the last complete ARGS object
+        self._search_from = 0
+        self._scanner = None
+        self._gave_up = False
+
+    def feed(self, chunk: str) -> bool:
+        self.text += chunk
+        if self._gave_up:
+            return False
+
+        while True:
+            if self._scanner is None and self.block_end is None:
+                tool_match = TOOL_LINE_RE.search(self.text, self._search_from)
+                if not tool_match:
+                    return False
+                args_match = ARGS_LINE_RE.search(self.text, tool_match.end())
+                if not args_match:
+                    return False
+                if args_match.end() == len(self.text):
+                    return False
+                if self.text[args_match.end()] != '{':
+                    self._gave_up = True
+                    return False
+                self._scanner = JsonObjectScanner(args_match.end())
+
+            if self._scanner is not None:
+                end = self._scanner.scan(self.text)
+                if end is None:
+                    return False
+                self._scanner = None
+                self.block_end = end
+                self.calls += 1
+                if self.calls >= self.max_calls:
+                    return True
+
+            trailing = self.text[self.block_end:].lstrip()
+            head = trailing[:5].upper()
+            if head == 'TOOL:':
+                # Another call follows; parse it too
+                self._search_from = self.block_end
+                self.block_end = None
+                continue
+            # Nothing yet, or possibly the start of "TOOL:"
+            return bool(trailing) and not 'TOOL:'.startswith(head)
+
+    def tool_text(self) -> str:
+        """The reply up to the end of its last complete tool call"""
+        return self.text[:self.block_end] if self.block_end is not None else self.text
+
+
 class AgentMessage:
     """Message for agent-to-agent communication"""
 
@@ -82,18 +343,77 @@ class AgentManager:
         self.active_tasks = {}
         self.conversation_history = {}
         self.agent_stats = {}
+        self.http_pool = llm_http_pool
+        self.scheduler = backend_scheduler  # Per-backend slots, priorities and load shedding
+
+        # llama.cpp prompt (KV) cache reuse; pinning sessions to slots is opt-in
+        self.prompt_cache_enabled = os.environ.get('PKN_PROMPT_CACHE', '1') != '0'
+        self.slot_pinning_enabled = os.environ.get('PKN_PIN_SLOTS', '0') == '1'
+        self.max_pinned_sessions = int(os.environ.get('PKN_PINNED_SESSIONS', 1024))
+        self._session_slots = OrderedDict()  # {(endpoint, session_key): slot}
+        self._next_slot = {}
+
+        # Precompiled tool prompts/schemas per agent type (see refresh_tool_registry)
+        self._compiled_tools = {}
+        self._tool_mtimes = {}
+        self.tool_registry_stats = {'compiles': 0, 'reloads': 0, 'compile_ms': 0.0, 'compiled_at': None}
+
+        # Bounded pool for tool calls (independent calls from one turn run in parallel)
+        self.tool_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=int(os.environ.get('PKN_TOOL_WORKERS', 8)),
+            thread_name_prefix='pkn-tool'
+        )
+        self.max_tools_per_turn = int(os.environ.get('PKN_MAX_TOOLS_PER_TURN', 8))
+        self.default_tool_timeout = float(os.environ.get('PKN_TOOL_TIMEOUT', 60))
+        # Ceiling for a 'timeout' argument the model asks for
+        self.max_tool_timeout = float(os.environ.get('PKN_TOOL_TIMEOUT_MAX', 300))
+        self.tool_timeouts = dict(DEFAULT_TOOL_TIMEOUTS)
+        self.tool_exec_stats = {'calls': 0, 'parallel_turns': 0, 'timeouts': 0, 'errors': 0, 'early_exits': 0}
+
+        # Voting: who is asked by default and how long to wait for them
+        self.default_voters = [
+            v.strip() for v in os.environ.get('PKN_VOTERS', 'consultant,reasoner').split(',') if v.strip()
+        ]
+        self.vote_deadline = float(os.environ.get('PKN_VOTE_DEADLINE', 0)) or None
+
+        # Speculation (opt-in, PKN_SPECULATE=1): stream a fast General draft while a slow specialist answers, then confirm/replace it
+        self.speculation_enabled = os.environ.get('PKN_SPECULATE', '0') == '1'
+        self.speculation_confirm_ratio = float(os.environ.get('PKN_SPECULATE_CONFIRM', 0.85))
+        self.speculation_stats = {'drafts': 0, 'confirmed': 0, 'replaced': 0, 'fallbacks': 0, 'drafts_cut_short': 0}
 
         # Initialize available agents
         self._init_agents()
+        self.refresh_tool_registry(force=True)
 
         # Initialize advanced features
         self.rag_memory = RAGMemory(str(project_root))
+        # Embedding router shares RAGMemory's MiniLM encoder; keyword scoring is the fallback
+        self.keyword_matcher = KeywordMatcher(ROUTING_KEYWORDS)
+        self.task_router = None
+        if os.environ.get('PKN_EMBED_ROUTER', '1') == '1':
+            self.task_router = EmbeddingRouter(self.rag_memory.encoder, str(project_root))
+            self.task_router.warm_up()
         self.task_planner = None  # Lazy init (requires LLM client)
-        self.plan_executor = PlanExecutor(self)
+        self.plan_executor = PlanExecutor(self, str(project_root))
         self.delegation_manager = AgentDelegationManager(self, str(project_root))
         self.tool_chain_executor = ToolChainExecutor(self._get_tool_registry())
         self.code_sandbox = CodeSandbox(str(project_root))
         self.evaluator = AgentEvaluator(str(project_root))
+        self.response_cache = ResponseCache(str(project_root))  # Opt-in: PKN_RESPONSE_CACHE=1
+        self.context_budget = ContextBudget(str(project_root))  # Token budgets for ReAct prompts
+        self.session_history = SessionHistory(self._summarize_history)  # Prior turns + rolling summary
+        self.conversation_index = ConversationIndex(self.rag_memory, str(project_root))  # Search past exchanges
+        self.conversation_index.start()
+
+        # Live latency/success/load window for adaptive routing (seeded from evaluator history)
+        self.adaptive_routing = os.environ.get('PKN_ADAPTIVE_ROUTING', '1') != '0'
+        self.min_metric_samples = int(os.environ.get('PKN_MIN_METRIC_SAMPLES', 5))
+        self.live_metrics = LiveAgentMetrics(int(os.environ.get('PKN_METRICS_WINDOW', 100)))
+        for agent_type in self.agents:
+            self.live_metrics.seed(
+                agent_type.value,
+                self.evaluator.get_recent_executions(agent_type.value, self.live_metrics.window)
+            )
 
     def _init_agents(self):
         """Initialize available agent configurations"""
@@ -107,6 +427,8 @@ class AgentManager:
             'speed': 'slow',      # ~6s for simple tasks
             'quality': 'high',    # Best code quality
             'tools_enabled': True,
+            'speculative': True,  # Stream a fast General draft while this model works
+            'context_budget': 8192,  # Prompt + reply tokens per ReAct call (llama.cpp slot context)
         }
 
         # Reasoner Agent - Could use DeepSeek or same Qwen
@@ -118,6 +440,8 @@ class AgentManager:
             'speed': 'slow',
             'quality': 'high',
             'tools_enabled': True,
+            'speculative': True,
+            'context_budget': 8192,
         }
 
         # Researcher Agent - Enhanced agent with web tools
@@ -151,6 +475,7 @@ class AgentManager:
             'speed': 'fast',      # ~2s for simple tasks
             'quality': 'medium',
             'tools_enabled': False,
+            'context_budget': 4096,  # Ollama's default num_ctx
         }
 
         # Consultant Agent - Claude API for maximum intelligence
@@ -180,6 +505,8 @@ class AgentManager:
             'quality': 'high',    # Expert-level security knowledge
             'tools_enabled': True,  # Full access to OSINT, web, system tools
             'uncensored': True,   # NO content filtering
+            'speculative': False, # A filtered draft model would only get in the way here
+            'context_budget': 8192,
         }
 
         # Vision Agent - LLaVA for image/UI analysis (LOCAL)
@@ -197,6 +524,7 @@ class AgentManager:
             'quality': 'high',      # Good vision understanding
             'tools_enabled': True,  # Can use file tools to load images
             'vision': True,         # Supports image input
+            'context_budget': 4096, # LLaVA runs with a smaller context
         }
 
         # Vision Cloud Agent - Groq Llama-3.2-90B-Vision (FREE, FAST, ENGLISH-ONLY)
@@ -306,110 +634,128 @@ class AgentManager:
 
         return registry
 
-    def classify_task(self, instruction: str) -> Dict[str, Any]:
+    def _tool_modules_mtime(self) -> Dict[str, float]:
+        """Modification time of every tool module source file"""
+        mtimes = {}
+        for module in TOOL_MODULES:
+            try:
+                mtimes[module.__name__] = os.path.getmtime(module.__file__)
+            except (OSError, TypeError):
+                mtimes[module.__name__] = 0.0
+        return mtimes
+
+    def _compile_tools(self, agent_type: AgentType, descriptions: Dict[str, tuple] = None) -> Dict[str, Any]:
         """
-        Classify task by type, complexity, and required agent.
+        Compile everything an agent's tool loops need from its tool list.
+
+        Args:
+            agent_type: Agent to compile for
+            descriptions: Optional {tool_name: (react_text, anthropic_schema)} shared
+                          across agents so each tool's schema is generated once
 
         Returns:
-            {
-                'agent_type': AgentType,
-                'complexity': TaskComplexity,
-                'confidence': float,
-                'reasoning': str,
-                'requires_tools': bool
-            }
+            {'tools', 'tool_map', 'system_prompt', 'anthropic_tools', 'claude_system_prompt'}
         """
-        instruction_lower = instruction.lower()
+        if descriptions is None:
+            descriptions = {}
 
-        # Code-related keywords
-        code_keywords = [
-            'code', 'function', 'class', 'debug', 'bug', 'error', 'refactor',
-            'implement', 'write code', 'python', 'javascript', 'script',
-            'algorithm', 'optimize', 'fix', 'syntax', 'variable'
-        ]
+        tools = self.get_tools_for_agent(agent_type)
+        tool_map = {}
+        tool_descriptions = []
+        anthropic_tools = []
 
-        # Research keywords
-        research_keywords = [
-            'search', 'find', 'lookup', 'research', 'what is', 'who is',
-            'when did', 'how to', 'wikipedia', 'documentation', 'docs',
-            'latest', 'current', 'news', 'github', 'library'
-        ]
+        for tool in tools:
+            tool_map[tool.name] = tool
+            if tool.name not in descriptions:
+                descriptions[tool.name] = (self._describe_tool(tool), self._anthropic_tool_schema(tool))
+            react_text, anthropic_schema = descriptions[tool.name]
+            tool_descriptions.append(react_text)
+            anthropic_tools.append(anthropic_schema)
 
-        # Execution keywords
-        execute_keywords = [
-            'run', 'execute', 'list files', 'read file', 'write file',
-            'create file', 'delete', 'move', 'copy', 'command', 'bash',
-            'shell', 'directory'
-        ]
+        return {
+            'tools': tools,
+            'tool_map': tool_map,
+            'system_prompt': self._build_tool_prompt(agent_type, "\n\n".join(tool_descriptions)),
+            'anthropic_tools': anthropic_tools,
+            'claude_system_prompt': CLAUDE_SYSTEM_PROMPTS.get(
+                agent_type,
+                "You are a helpful AI assistant. IMPORTANT: Always respond in English only."
+            )
+        }
 
-        # Planning/reasoning keywords
-        planning_keywords = [
-            'plan', 'strategy', 'approach', 'analyze', 'compare', 'evaluate',
-            'pros and cons', 'should i', 'which', 'best way', 'explain why',
-            'logic', 'reasoning'
-        ]
+    def refresh_tool_registry(self, force: bool = False, reload: bool = False) -> bool:
+        """
+        Recompile tool prompts and schemas for every agent type.
 
-        # Consultant keywords (complex decisions, voting, expert advice)
-        consultant_keywords = [
-            'vote', 'decide', 'choose between', 'which option', 'expert opinion',
-            'deep thought', 'complex decision', 'consult', 'advise', 'recommend',
-            'philosophical', 'ethical', 'strategic decision', 'critical choice'
-        ]
+        Only called at startup and from the admin reload endpoint, never on
+        the request path: reloading swaps module globals under tools that
+        may be running in worker threads, so it has to be an explicit choice.
 
-        # Security/Cybersecurity keywords (UNCENSORED - pentesting, hacking, security)
-        security_keywords = [
-            'hack', 'hacking', 'exploit', 'vulnerability', 'vuln', 'penetration test',
-            'pentest', 'security', 'cybersecurity', 'injection', 'xss', 'csrf',
-            'sql injection', 'buffer overflow', 'reverse engineering', 'malware',
-            'backdoor', 'rootkit', 'privilege escalation', 'brute force', 'crack',
-            'password crack', 'hash', 'decrypt', 'encryption', 'cryptography',
-            'nmap', 'metasploit', 'burp suite', 'wireshark', 'kali', 'red team',
-            'blue team', 'threat', 'attack', 'payload', 'shellcode', 'zero day',
-            'cve', 'security audit', 'web security', 'network security', 'firewall',
-            'bypass', 'evade', 'stealth', 'osint', 'reconnaissance', 'footprint',
-            'enumeration', 'port scan', 'directory traversal', 'lfi', 'rfi',
-            'command injection', 'code injection', 'deserialization', 'xxe'
-        ]
+        Args:
+            force: Recompile even if no tool module changed
+            reload: Reload tool modules whose source changed since the last compile
 
-        # Vision/Image analysis keywords
-        vision_keywords = [
-            'image', 'screenshot', 'picture', 'photo', 'visual', 'see', 'look at',
-            'what do you see', 'analyze image', 'describe image', 'ui', 'interface',
-            'diagram', 'chart', 'graph', 'drawing', 'render', 'displayed', 'shown',
-            'screen', 'display', 'visible', 'ocr', 'read text from', 'extract text',
-            'recognize', 'detect', 'identify in image', 'what\'s in', 'show me'
-        ]
+        Returns:
+            True if the registry was rebuilt
+        """
+        mtimes = self._tool_modules_mtime()
+        changed = [m for m in TOOL_MODULES if mtimes[m.__name__] != self._tool_mtimes.get(m.__name__)]
 
-        # Count keyword matches
-        code_score = sum(1 for kw in code_keywords if kw in instruction_lower)
-        research_score = sum(1 for kw in research_keywords if kw in instruction_lower)
-        execute_score = sum(1 for kw in execute_keywords if kw in instruction_lower)
-        planning_score = sum(1 for kw in planning_keywords if kw in instruction_lower)
-        consultant_score = sum(1 for kw in consultant_keywords if kw in instruction_lower)
-        security_score = sum(1 for kw in security_keywords if kw in instruction_lower)
-        vision_score = sum(1 for kw in vision_keywords if kw in instruction_lower)
+        if not force and not changed:
+            return False
 
-        # Determine agent type and complexity
-        scores = {
-            AgentType.CODER: code_score,
-            AgentType.RESEARCHER: research_score,
-            AgentType.EXECUTOR: execute_score,
-            AgentType.REASONER: planning_score,
-            AgentType.CONSULTANT: consultant_score * 2,  # Weight consultant higher
-            AgentType.SECURITY: security_score * 2.5,  # Weight security highest for safety
-            AgentType.VISION: vision_score * 2,  # Weight vision high for image tasks (local)
-            AgentType.VISION_CLOUD: vision_score * 2,  # Same weight as local vision
-            AgentType.GENERAL: 0  # Default agent, always has score 0
+        if reload and self._tool_mtimes:
+            for module in changed:
+                try:
+                    importlib.reload(module)
+                    self.tool_registry_stats['reloads'] += 1
+                except Exception as e:
+                    print(f"Warning: Failed to reload {module.__name__}: {e}")
+
+        start = time.perf_counter()
+        descriptions = {}
+        self._compiled_tools = {
+            agent_type: self._compile_tools(agent_type, descriptions)
+            for agent_type in AgentType
         }
+        self._tool_mtimes = mtimes
 
-        # Get highest scoring agent
-        if max(scores.values()) > 0:
-            agent_type = max(scores, key=scores.get)
-            confidence = min(scores[agent_type] / 3.0, 1.0)  # Normalize to 0-1
+        # Tool chains look tools up by name, keep them on the reloaded objects
+        if hasattr(self, 'tool_chain_executor'):
+            self.tool_chain_executor.tool_registry = self._get_tool_registry()
+
+        self.tool_registry_stats['compiles'] += 1
+        self.tool_registry_stats['compile_ms'] = (time.perf_counter() - start) * 1000
+        self.tool_registry_stats['compiled_at'] = time.time()
+        return True
+
+    def get_compiled_tools(self, agent_type: AgentType) -> Dict[str, Any]:
+        """Get the precompiled tool prompt, tool map and Anthropic schemas for an agent"""
+        return self._compiled_tools[agent_type]
+
+    def classify_task(self, instruction: str) -> Dict[str, Any]:
+        """
+        Classify task by type, complexity, and required agent.
+
+        Returns:
+            {
+                'agent_type': AgentType,
+                'complexity': TaskComplexity,
+                'confidence': float,
+                'reasoning': str,
+                'requires_tools': bool
+            }
+        """
+        instruction_lower = instruction.lower()
+
+        # Embed once and match labeled exemplars; keyword scoring when unsure
+        route = self.task_router.classify(instruction) if self.task_router else None
+        if route:
+            agent_type = AgentType(route['agent_type'])
+            confidence = route['confidence']
+            reasoning = f"Nearest exemplars for {agent_type.value} (similarity: {route['similarity']:.2f})"
         else:
-            # Default to general for simple questions
-            agent_type = AgentType.GENERAL
-            confidence = 0.5
+            agent_type, confidence, reasoning = self._keyword_route(instruction_lower)
 
         # Determine complexity
         word_count = len(instruction.split())
@@ -429,12 +775,41 @@ class AgentManager:
             'agent_type': agent_type,  # Keep as enum for internal use
             'complexity': complexity,  # Keep as enum for internal use
             'confidence': confidence,
-            'reasoning': f"Matched {agent_type.value} keywords (score: {scores[agent_type]})",
+            'reasoning': reasoning,
             'requires_tools': requires_tools,
             'word_count': word_count,
             'has_multi_steps': has_multi_steps
         }
 
+    def _keyword_route(self, instruction_lower: str):
+        """
+        Score an instruction against per-agent keyword lists.
+
+        Returns:
+            (agent_type, confidence, reasoning)
+        """
+        # One pass over the text counts hits for every agent's keywords
+        counts = self.keyword_matcher.counts(instruction_lower)
+        weighted = {agent: counts[agent] * ROUTING_KEYWORD_WEIGHTS.get(agent, 1) for agent in ROUTING_KEYWORDS}
+
+        # Determine agent type and complexity
+        scores = {
+            **weighted,
+            AgentType.VISION_CLOUD: weighted[AgentType.VISION],  # Same weight as local vision
+            AgentType.GENERAL: 0  # Default agent, always has score 0
+        }
+
+        # Get highest scoring agent
+        if max(scores.values()) > 0:
+            agent_type = max(scores, key=scores.get)
+            confidence = min(scores[agent_type] / 3.0, 1.0)  # Normalize to 0-1
+        else:
+            # Default to general for simple questions
+            agent_type = AgentType.GENERAL
+            confidence = 0.5
+
+        return agent_type, confidence, f"Matched {agent_type.value} keywords (score: {scores[agent_type]})"
+
     def _make_json_safe(self, data):
         """Convert enums to their values for JSON serialization"""
         if isinstance(data, dict):
@@ -463,6 +838,14 @@ class AgentManager:
             }
         """
         classification = self.classify_task(instruction)
+        agent_type = classification['agent_type']
+        adaptive = None
+
+        if self.adaptive_routing:
+            agent_type, adaptive = self._adaptive_route(agent_type, classification)
+            if adaptive['downgraded'] and classification['complexity'] == TaskComplexity.COMPLEX:
+                # The faster model it moved to handles it as a single-agent task
+                classification = {**classification, 'complexity': TaskComplexity.MEDIUM}
 
         # Determine strategy
         if classification['complexity'] == TaskComplexity.COMPLEX:
@@ -470,32 +853,125 @@ class AgentManager:
         else:
             strategy = 'single_agent'
 
-        # Estimate time based on agent and complexity
-        agent_config = self.agents[classification['agent_type']]
-        speed = agent_config['speed']
-
-        time_estimates = {
-            'fast': '2-5 seconds',
-            'medium': '5-15 seconds',
-            'slow': '10-30 seconds',
-            'very_slow': '30-120 seconds'
-        }
+        # Estimate time from measured latency (falls back to the agent's nominal speed)
+        agent_config = self.agents[agent_type]
+        estimate = self._latency_estimate(agent_type)
 
         return {
-            'agent': classification['agent_type'],  # Keep as enum for internal use
+            'agent': agent_type,  # Keep as enum for internal use
             'classification': classification,
             'strategy': strategy,
-            'estimated_time': time_estimates.get(speed, 'unknown'),
+            'estimated_time': estimate['text'],
+            'estimate': estimate,
+            'adaptive': adaptive,
             'agent_config': agent_config
         }
 
-    async def execute_task(self, instruction: str, conversation_id: str = None) -> Dict[str, Any]:
+    async def _route_task_async(self, instruction: str, conversation_id: str = None) -> Dict[str, Any]:
+        """route_task for coroutines: the instruction is embedded on a worker thread first"""
+        if self.task_router:
+            await asyncio.to_thread(self.task_router.prepare, instruction)
+        return self.route_task(instruction, conversation_id)
+
+    def _backend_key(self, agent_type: AgentType) -> str:
+        """Backend an agent's requests actually land on (shared endpoints share load)"""
+        config = self.agents[agent_type]
+        if config.get('tools_enabled', False) and agent_type in TOOL_AGENT_TYPES:
+            return self._tool_backend(agent_type)[0]
+        return config.get('endpoint') or config['model']
+
+    def _backend_capacity(self, backend: str) -> int:
+        """Requests a backend serves concurrently (pooled connections, sized from the slots it reports)"""
+        if backend.startswith('http'):
+            return self.http_pool.get_endpoint_config(backend).max_connections
+        return DEFAULT_BACKEND_CAPACITY
+
+    def _backend_load(self, agent_type: AgentType) -> float:
+        """In-flight requests on an agent's backend as a fraction of its capacity"""
+        backend = self._backend_key(agent_type)
+        return self.live_metrics.backend_in_flight.get(backend, 0) / self._backend_capacity(backend)
+
+    def _latency_estimate(self, agent_type: AgentType) -> Dict[str, Any]:
+        """
+        Expected latency for an agent.
+
+        Uses the rolling p50/p95 once at least min_metric_samples executions are
+        recorded, otherwise a prior derived from the agent's nominal speed.
+        """
+        profile = self.live_metrics.profile(agent_type.value)
+
+        if profile['samples'] >= self.min_metric_samples:
+            p50, p95, source = profile['p50'], profile['p95'], 'measured'
+        else:
+            prior = SPEED_PRIOR_SECONDS.get(self.agents[agent_type]['speed'], 20)
+            p50, p95, source = prior, prior * 2, 'prior'
+
+        return {
+            'p50': p50,
+            'p95': p95,
+            'success_rate': profile['success_rate'],
+            'samples': profile['samples'],
+            'source': source,
+            'text': "<1 second" if p95 < 1 else f"{max(1, round(p50))}-{max(1, round(p95))} seconds"
+        }
+
+    def _adaptive_route(self, agent_type: AgentType, classification: Dict[str, Any]):
+        """
+        Pick among qualifying agents using live latency, success rate and load.
+
+        Candidates are the classified agent plus any AGENT_ALTERNATES with
+        enough measurements. When the classified agent's backend is saturated,
+        work that needs no tools may also move to the fast GENERAL model. The
+        candidate with the lowest expected cost wins: p50 * (1 + backend load)
+        / success rate.
+
+        'downgraded' is reported only when saturation actually moved the task
+        to a different, cheaper agent (and so a different model/endpoint);
+        route_task then treats COMPLEX work as MEDIUM.
+
+        Returns:
+            (agent_type, details for the routing response)
+        """
+        loaded = self._backend_load(agent_type) >= 1.0
+
+        # Alternates only compete once they have a measured track record
+        candidates = [agent_type] + [
+            a for a in AGENT_ALTERNATES.get(agent_type, [])
+            if a in self.agents and self._latency_estimate(a)['source'] == 'measured'
+        ]
+        if loaded and not classification['requires_tools'] and AgentType.GENERAL not in candidates:
+            candidates.append(AgentType.GENERAL)
+
+        costs = {}
+        for candidate in candidates:
+            estimate = self._latency_estimate(candidate)
+            success_rate = estimate['success_rate'] if estimate['source'] == 'measured' else 1.0
+            costs[candidate] = estimate['p50'] * (1 + self._backend_load(candidate)) / max(success_rate, 0.1)
+
+        chosen = min(candidates, key=costs.get)  # Ties keep the classified agent
+        downgraded = loaded and chosen != agent_type
+
+        return chosen, {
+            'classified_agent': agent_type,
+            'backend_load': round(self._backend_load(agent_type), 2),
+            'downgraded': downgraded,
+            'costs': {candidate.value: round(cost, 2) for candidate, cost in costs.items()}
+        }
+
+    async def execute_task(self, instruction: str, conversation_id: str = None,
+                           use_cache: bool = True, agent_type: Optional[str] = None,
+                           priority: Optional[str] = None, include_history: bool = True) -> Dict[str, Any]:
         """
         Execute a task using the appropriate agent(s).
 
         Args:
             instruction: The task to perform
             conversation_id: Optional conversation ID for context
+            use_cache: False to bypass the response cache lookup
+            agent_type: Run on this agent instead of routing (e.g. delegated subtasks)
+            priority: Backend queue class for this task's LLM calls
+                      ('interactive' (default), 'autocomplete', 'delegation', 'background')
+            include_history: Give the agent the session's earlier turns (and rolling summary)
 
         Returns:
             {
@@ -509,8 +985,34 @@ class AgentManager:
         task_id = str(uuid.uuid4())
         start_time = time.time()
 
+        # Caller input is checked before the task is tracked, so a bad value is just a failed task
+        try:
+            forced = None
+            if agent_type:
+                forced = agent_type if isinstance(agent_type, AgentType) else AgentType(agent_type)
+            task_priority = None
+            if isinstance(priority, str):
+                if priority.upper() not in RequestPriority.__members__:
+                    raise ValueError(f"'{priority}' is not a valid priority")
+                task_priority = RequestPriority[priority.upper()]
+            elif priority is not None:
+                task_priority = RequestPriority(priority)
+        except ValueError as e:
+            return {
+                'response': f"Error executing task: {str(e)}",
+                'agent_used': str(agent_type or 'unknown'),
+                'execution_time': time.time() - start_time,
+                'tools_used': [],
+                'status': 'error',
+                'error': str(e),
+                'task_id': task_id
+            }
+
         # Route the task
-        routing = self.route_task(instruction, conversation_id)
+        routing = await self._route_task_async(instruction, conversation_id)
+        if forced:
+            # Caller already chose the agent; keep the classification for metrics
+            routing = {**routing, 'agent': forced, 'agent_config': self.agents[forced], 'strategy': 'delegated'}
         agent_type = routing['agent']
         agent_config = routing['agent_config']
 
@@ -521,16 +1023,22 @@ class AgentManager:
             'status': 'running',
             'start_time': start_time
         }
+        backend = self._backend_key(agent_type)
+        self.live_metrics.begin(agent_type.value, backend)
+        priority_token = current_priority.set(task_priority) if task_priority is not None else None
 
         try:
+            # Earlier turns of this session, bounded by the agent's budget
+            history = await self._build_history(conversation_id, instruction, agent_type) if include_history else []
+
             # Execute based on agent type and tool requirements
             if agent_config['model'] == 'groq_vision':
                 # Use Groq cloud vision API
                 from groq_vision import groq_vision
 
                 if groq_vision.is_available():
-                    # Groq vision with images
-                    response_data = groq_vision.analyze_text(instruction)
+                    # Groq vision with images (blocking HTTP, keep it off the event loop)
+                    response_data = await asyncio.to_thread(groq_vision.analyze_text, instruction)
                     if response_data['success']:
                         response = response_data['response']
                         tools_used = ['groq_cloud_vision']
@@ -563,7 +1071,7 @@ class AgentManager:
                 if claude_api.is_available():
                     # Claude API with tools
                     response, tools_used = await self._execute_claude_with_tools(
-                        instruction,
+                        self._with_history_text(instruction, history),
                         agent_type
                     )
                 else:
@@ -575,28 +1083,33 @@ class AgentManager:
                         instruction,
                         AgentType.REASONER,
                         fallback_config['endpoint'],
-                        fallback_config['model']
+                        fallback_config['model'],
+                        cache_key=conversation_id or task_id,
+                        history=history
                     )
                     tools_used = ['fallback_to_reasoner'] + tools_used
-            elif agent_config.get('tools_enabled', False) and agent_type in [AgentType.CODER, AgentType.EXECUTOR, AgentType.RESEARCHER, AgentType.REASONER]:
+            elif agent_config.get('tools_enabled', False) and agent_type in BLOCKING_TOOL_AGENT_TYPES:
                 # Use tool-enhanced execution
+                endpoint, model = self._tool_backend(agent_type)
                 response, tools_used = await self._execute_with_tools(
                     instruction,
                     agent_type,
-                    agent_config['endpoint'],
-                    agent_config['model']
+                    endpoint,
+                    model,
+                    cache_key=conversation_id or task_id,
+                    history=history
                 )
             elif agent_config['model'] == 'enhanced_agent':
                 # Fallback to local_parakleon_agent for backwards compatibility
                 from local_parakleon_agent import run_agent
-                response = run_agent(instruction)
+                response = await asyncio.to_thread(run_agent, self._with_history_text(instruction, history))
                 tools_used = ['enhanced_agent_tools']
             elif agent_config['model'] == 'external_api':
                 # Legacy external LLM support (kept for backwards compatibility)
                 from external_llm import external_llm
 
                 result = await external_llm.query_best_available(
-                    prompt=instruction,
+                    prompt=self._with_history_text(instruction, history),
                     system_prompt="You are an expert consultant providing thoughtful, well-reasoned advice."
                 )
 
@@ -633,7 +1146,11 @@ class AgentManager:
                     instruction,
                     agent_config['endpoint'],
                     agent_config['model'],
-                    agent_system_prompt
+                    agent_system_prompt,
+                    cache_key=conversation_id or task_id,
+                    response_scope=agent_type.value,
+                    use_cache=use_cache,
+                    history=history
                 )
                 tools_used = []
 
@@ -658,7 +1175,8 @@ class AgentManager:
 
             # Log execution to evaluator
             try:
-                self.evaluator.log_execution(
+                await asyncio.to_thread(
+                    self.evaluator.log_execution,
                     agent_type=agent_type.value,
                     task=instruction[:200],  # Truncate long tasks
                     response=response[:500],  # Truncate long responses
@@ -688,7 +1206,8 @@ class AgentManager:
 
             # Log failure to evaluator
             try:
-                self.evaluator.log_execution(
+                await asyncio.to_thread(
+                    self.evaluator.log_execution,
                     agent_type=agent_type.value,
                     task=instruction[:200],
                     response="",
@@ -700,7 +1219,7 @@ class AgentManager:
             except Exception as eval_error:
                 print(f"Warning: Failed to log error: {eval_error}")
 
-            return {
+            result = {
                 'response': f"Error executing task: {str(e)}",
                 'agent_used': agent_type.value,
                 'execution_time': execution_time,
@@ -709,59 +1228,55 @@ class AgentManager:
                 'error': str(e),
                 'task_id': task_id
             }
+            if isinstance(e, BackendOverloaded):
+                # Load shedding: the server answers 503 with Retry-After
+                result['overloaded'] = True
+                result['retry_after'] = e.retry_after
+            return result
 
-    async def _execute_with_tools(self, instruction: str, agent_type: AgentType, endpoint: str, model: str) -> tuple[str, list]:
-        """
-        Execute task with tool support - works with ANY local model!
-        Uses prompt-based tool calling (ReAct pattern) instead of function calling.
+        finally:
+            if priority_token is not None:
+                current_priority.reset(priority_token)
+            status = self.active_tasks[task_id]['status']
+            self.live_metrics.end(agent_type.value, backend, time.time() - start_time,
+                                  None if status == 'running' else status == 'completed')
+
+    def _describe_tool(self, tool) -> str:
+        """Render one tool's name, description and parameters for a ReAct prompt"""
+        params = []
+        if hasattr(tool, 'args_schema') and tool.args_schema:
+            schema = tool.args_schema.schema()
+            props = schema.get('properties', {})
+            required = schema.get('required', [])
+            for param_name, param_info in props.items():
+                req_marker = " (required)" if param_name in required else ""
+                params.append(f"  - {param_name}: {param_info.get('description', 'no description')}{req_marker}")
+
+        param_str = "\n".join(params) if params else "  (no parameters)"
+        return f"**{tool.name}**: {tool.description}\nParameters:\n{param_str}"
+
+    def _anthropic_tool_schema(self, tool) -> Dict[str, Any]:
+        """Convert a langchain tool to the Anthropic tool schema"""
+        return {
+            'name': tool.name,
+            'description': tool.description or tool.name,
+            'input_schema': {
+                'type': 'object',
+                'properties': tool.args if hasattr(tool, 'args') else {},
+                'required': []
+            }
+        }
 
-        Returns: (response, tools_used)
+    def _build_tool_prompt(self, agent_type: AgentType, tools_text: str) -> str:
         """
-        import re
-        import json
-
-        # Get tools for this agent
-        tools = self.get_tools_for_agent(agent_type)
-
-        if not tools:
-            # No tools, just call API with agent-specific system prompt
-            if agent_type == AgentType.VISION:
-                system_prompt = "You are a vision and image analysis expert. IMPORTANT: Always respond in English only. Never use Chinese or any other language."
-            elif agent_type == AgentType.GENERAL:
-                system_prompt = "You are a helpful general assistant. IMPORTANT: Always respond in English only."
-            elif agent_type == AgentType.CODER:
-                system_prompt = "You are an expert code writer. IMPORTANT: Always respond in English only."
-            elif agent_type == AgentType.REASONER:
-                system_prompt = "You are a reasoning expert. IMPORTANT: Always respond in English only."
-            else:
-                system_prompt = None  # Use default
-
-            response = await self._call_chat_api(instruction, endpoint, model, system_prompt)
-            return response, []
-
-        # Build tool descriptions for the prompt
-        tool_descriptions = []
-        tool_map = {}
-
-        for tool in tools:
-            tool_map[tool.name] = tool
-            # Get tool parameters
-            params = []
-            if hasattr(tool, 'args_schema') and tool.args_schema:
-                schema = tool.args_schema.schema()
-                props = schema.get('properties', {})
-                required = schema.get('required', [])
-                for param_name, param_info in props.items():
-                    req_marker = " (required)" if param_name in required else ""
-                    params.append(f"  - {param_name}: {param_info.get('description', 'no description')}{req_marker}")
-
-            param_str = "\n".join(params) if params else "  (no parameters)"
-            tool_descriptions.append(
-                f"**{tool.name}**: {tool.description}\nParameters:\n{param_str}"
-            )
+        Build the ReAct system prompt for an agent.
 
-        tools_text = "\n\n".join(tool_descriptions)
+        Args:
+            agent_type: Agent the prompt is for
+            tools_text: Rendered tool descriptions (see _describe_tool)
 
+        Returns: system_prompt
+        """
         # System prompt with tool instructions
         system_prompts = {
             AgentType.CODER: f"""You are an expert code writer with access to powerful tools.
@@ -840,6 +1355,18 @@ TOOL: tool_name
 ARGS: {{"param1": "value1"}}
 
 Answer questions clearly and concisely. Use tools when they can help provide better answers.""",
+
+            AgentType.SECURITY: f"""You are a cybersecurity expert (penetration testing, vulnerability analysis, OSINT).
+IMPORTANT: Always respond in English only.
+
+AVAILABLE TOOLS:
+{tools_text}
+
+To use a tool, respond with:
+TOOL: tool_name
+ARGS: {{"param1": "value1"}}
+
+Use OSINT, web and system tools for reconnaissance and analysis. Explain findings clearly.""",
         }
 
         system_prompt = system_prompts.get(
@@ -847,47 +1374,259 @@ Answer questions clearly and concisely. Use tools when they can help provide bet
             f"You are a helpful AI assistant. IMPORTANT: Always respond in English only.\n\nAVAILABLE TOOLS:\n{tools_text}"
         )
 
-        # Conversation history (without system prompt - that goes as parameter)
-        conversation = f"User: {instruction}\n\nAssistant:"
+        return f"{system_prompt}\n\n{PARALLEL_TOOLS_HINT}"
+
+    def _parse_tool_call(self, response: str) -> Optional[tuple[str, dict]]:
+        """
+        Extract a TOOL/ARGS call from a ReAct response.
+
+        Returns: (tool_name, tool_args) or None if the response is a final answer
+        """
+        tool_match = TOOL_LINE_RE.search(response)
+        if not tool_match:
+            return None
+
+        # Parse arguments (balanced scan, so nested objects and braces in strings work)
+        tool_args = {}
+        args_match = ARGS_LINE_RE.search(response, tool_match.end())
+        if args_match and response.startswith('{', args_match.end()):
+            end = JsonObjectScanner(args_match.end()).scan(response)
+            if end is not None:
+                args_str = response[args_match.end():end]
+                for candidate in (args_str, args_str.replace('\n', ' ')):
+                    try:
+                        tool_args = json.loads(candidate)
+                        break
+                    except ValueError:
+                        continue
+
+        return tool_match.group(1), tool_args
+
+    def _parse_tool_calls(self, response: str) -> List[tuple[str, dict]]:
+        """
+        Extract every TOOL/ARGS block from a ReAct response, in order.
+
+        Returns: [(tool_name, tool_args), ...] (empty if the response is a final answer)
+        """
+        starts = [m.start() for m in TOOL_LINE_RE.finditer(response)]
+        calls = []
+
+        # Each block runs from its TOOL: line up to the next one
+        for start, end in zip(starts, starts[1:] + [len(response)]):
+            tool_call = self._parse_tool_call(response[start:end])
+            if tool_call:
+                calls.append(tool_call)
+
+        return calls[:self.max_tools_per_turn]
+
+    def _tool_timeout(self, tool_name: str, tool_args: dict) -> float:
+        """
+        Timeout for one tool call (tools with their own timeout arg get a small grace period).
+
+        The model chooses that argument, so _run_tool caps it at max_tool_timeout first.
+        """
+        requested = tool_args.get('timeout') if isinstance(tool_args, dict) else None
+        if isinstance(requested, (int, float)) and requested > 0:
+            return min(float(requested), self.max_tool_timeout) + 5
+        return self.tool_timeouts.get(tool_name, self.default_tool_timeout)
+
+    async def _run_tool(self, tool_map: dict, tool_name: str, tool_args: dict) -> str:
+        """Execute one tool on the tool pool, returning its result or an error string"""
+        tool_func = tool_map.get(tool_name)
+        if not tool_func:
+            return f"Error: Tool '{tool_name}' not found"
+
+        requested = tool_args.get('timeout') if isinstance(tool_args, dict) else None
+        if isinstance(requested, (int, float)) and requested > self.max_tool_timeout:
+            # The tool itself would keep its worker busy for as long as it was told to
+            tool_args = {**tool_args, 'timeout': self.max_tool_timeout}
+
+        timeout = self._tool_timeout(tool_name, tool_args)
+        loop = asyncio.get_running_loop()
+        self.tool_exec_stats['calls'] += 1
+
+        try:
+            return await asyncio.wait_for(
+                loop.run_in_executor(self.tool_executor, tool_func.invoke, tool_args),
+                timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            # The worker thread can't be interrupted; its result is discarded
+            self.tool_exec_stats['timeouts'] += 1
+            return f"Error: Tool '{tool_name}' timed out after {timeout:.0f}s"
+        except Exception as e:
+            self.tool_exec_stats['errors'] += 1
+            return f"Error: {str(e)}"
+
+    def _start_tools(self, tool_map: dict, tool_calls: List[tuple[str, dict]]) -> List[asyncio.Task]:
+        """Start independent tool calls concurrently; tasks are in call order"""
+        if len(tool_calls) > 1:
+            self.tool_exec_stats['parallel_turns'] += 1
+        return [
+            asyncio.ensure_future(self._run_tool(tool_map, tool_name, tool_args))
+            for tool_name, tool_args in tool_calls
+        ]
+
+    async def _run_tools(self, tool_map: dict, tool_calls: List[tuple[str, dict]]) -> List[str]:
+        """
+        Run one turn's tool calls concurrently on the bounded tool pool.
+
+        Args:
+            tool_map: Name -> langchain tool
+            tool_calls: [(tool_name, tool_args), ...]
+
+        Returns:
+            Results in the same order as tool_calls
+        """
+        return list(await asyncio.gather(*self._start_tools(tool_map, tool_calls)))
+
+    def _tool_backend(self, agent_type: AgentType) -> tuple[str, str]:
+        """
+        Endpoint and model used for an agent's ReAct loop.
+        Agents backed by the enhanced agent have no endpoint, so they run
+        their tool loop on the local llama.cpp server instead.
+        """
+        config = self.agents[agent_type]
+        if config.get('endpoint'):
+            return config['endpoint'], config['model']
+
+        fallback = self.agents[AgentType.CODER]
+        return fallback['endpoint'], fallback['model']
+
+    async def _build_history(self, conversation_id: Optional[str], instruction: str,
+                             agent_type: AgentType) -> List[Dict[str, str]]:
+        """Earlier turns of a session sized for an agent's context budget"""
+        if not conversation_id:
+            return []
+        backend = self._backend_key(agent_type)
+        model = self._tool_backend(agent_type)[1] if backend.startswith('http') else self.agents[agent_type]['model']
+        try:
+            return await self.session_history.build(
+                conversation_id, instruction, self._context_budget_for(agent_type),
+                backend if backend.startswith('http') else None, model
+            )
+        except Exception as e:
+            print(f"Warning: Could not load session history: {e}")
+            return []
+
+    def _with_history_text(self, instruction: str, history: List[Dict[str, str]]) -> str:
+        """Fold history into a single prompt for backends that only take one string"""
+        if not history:
+            return instruction
+        lines = [
+            m['content'] if m['role'] == 'system' else f"{m['role'].capitalize()}: {m['content']}"
+            for m in history
+        ]
+        return "Conversation so far:\n" + "\n\n".join(lines) + f"\n\nCurrent request: {instruction}"
+
+    async def _summarize_history(self, summary: str, messages: List[Dict[str, Any]]) -> str:
+        """Fold messages into a session's rolling summary (fast General model)"""
+        general = self.agents[AgentType.GENERAL]
+        transcript = "\n\n".join(f"{m['role'].capitalize()}: {m['content'][:1500]}" for m in messages)
+        prompt = (
+            f"Current summary:\n{summary or '(none)'}\n\n"
+            f"New conversation turns:\n{transcript}\n\n"
+            "Write an updated summary of the whole conversation in at most 150 words. Keep names, "
+            "file paths, decisions, open questions and anything the user asked to remember."
+        )
+        return await self._call_chat_api(
+            prompt, general['endpoint'], general['model'],
+            "You maintain concise conversation summaries. IMPORTANT: Always respond in English only."
+        )
+
+    def _react_messages(self, system_prompt: str, instruction: str,
+                        history: Optional[List[Dict[str, str]]] = None) -> List[Dict[str, str]]:
+        """Start a ReAct conversation: the stable prefix every iteration shares"""
+        return [
+            {'role': 'system', 'content': system_prompt},
+            *(history or []),
+            {'role': 'user', 'content': instruction}
+        ]
+
+    def _context_budget_for(self, agent_type: AgentType) -> int:
+        """Context budget (tokens) for an agent's prompts"""
+        return self.agents[agent_type].get('context_budget') or self.context_budget.default_budget
+
+    def _append_tool_turn(self, messages: List[Dict[str, str]], response: str,
+                          tool_calls: List[tuple[str, dict]], tool_results: List[Any],
+                          budget: Optional[int] = None, endpoint: Optional[str] = None):
+        """
+        Append the model's tool calls and their outputs, leaving earlier turns untouched.
+        Oversized outputs are cut to their share of the budget (full text kept on disk).
+        """
+        messages.append({'role': 'assistant', 'content': response})
+
+        tool_results = [
+            self.context_budget.cap_tool_result(tool_name, tool_result, budget, endpoint)
+            for (tool_name, _), tool_result in zip(tool_calls, tool_results)
+        ]
+        if len(tool_calls) == 1:
+            content = f"TOOL RESULT:\n{tool_results[0]}"
+        else:
+            content = "\n\n".join(
+                f"TOOL RESULT ({tool_name}):\n{tool_result}"
+                for (tool_name, _), tool_result in zip(tool_calls, tool_results)
+            )
+        messages.append({'role': 'user', 'content': content})
+
+    async def _execute_with_tools(self, instruction: str, agent_type: AgentType, endpoint: str, model: str,
+                                  cache_key: str = None,
+                                  history: Optional[List[Dict[str, str]]] = None) -> tuple[str, list]:
+        """
+        Execute task with tool support - works with ANY local model!
+        Uses prompt-based tool calling (ReAct pattern) instead of function calling.
+
+        The conversation is an append-only message list, so every iteration
+        resends an unchanged prefix and the backend's prompt cache (pinned by
+        cache_key) only has to evaluate the latest tool result. Each reply is
+        streamed and cut off once its tool calls are complete.
+
+        Returns: (response, tools_used)
+        """
+        # Get precompiled tools for this agent
+        compiled = self.get_compiled_tools(agent_type)
+
+        if not compiled['tools']:
+            # No tools, just call API with agent-specific system prompt
+            if agent_type == AgentType.VISION:
+                system_prompt = "You are a vision and image analysis expert. IMPORTANT: Always respond in English only. Never use Chinese or any other language."
+            elif agent_type == AgentType.GENERAL:
+                system_prompt = "You are a helpful general assistant. IMPORTANT: Always respond in English only."
+            elif agent_type == AgentType.CODER:
+                system_prompt = "You are an expert code writer. IMPORTANT: Always respond in English only."
+            elif agent_type == AgentType.REASONER:
+                system_prompt = "You are a reasoning expert. IMPORTANT: Always respond in English only."
+            else:
+                system_prompt = None  # Use default
+
+            response = await self._call_chat_api(instruction, endpoint, model, system_prompt,
+                                                 cache_key=cache_key, history=history)
+            return response, []
+
+        system_prompt, tool_map = compiled['system_prompt'], compiled['tool_map']
+
+        messages = self._react_messages(system_prompt, instruction, history)
+        protected = len(messages)  # System prompt, history and task are never trimmed
+        budget = self._context_budget_for(agent_type)
         tools_used = []
         max_iterations = 5
 
         for iteration in range(max_iterations):
-            # Call LLM with system prompt parameter
-            response = await self._call_chat_api(conversation, endpoint, model, system_prompt)
-
-            # Check if response contains a tool call
-            tool_match = re.search(r'TOOL:\s*(\w+)', response, re.IGNORECASE)
-            args_match = re.search(r'ARGS:\s*({[^}]+})', response, re.IGNORECASE | re.DOTALL)
+            # Call LLM with the full (append-only, budget-trimmed) conversation
+            await self.context_budget.fit(messages, budget, endpoint, model, protected)
+            response = await self._generate_react_turn(endpoint, model, messages, cache_key)
 
-            if tool_match:
-                tool_name = tool_match.group(1)
-                tools_used.append(tool_name)
+            # Check if response contains tool calls
+            tool_calls = self._parse_tool_calls(response)
 
-                # Parse arguments
-                try:
-                    if args_match:
-                        args_str = args_match.group(1)
-                        # Clean up the JSON string
-                        args_str = args_str.replace('\n', ' ').strip()
-                        tool_args = json.loads(args_str)
-                    else:
-                        tool_args = {}
-                except:
-                    tool_args = {}
+            if tool_calls:
+                tools_used.extend(tool_name for tool_name, _ in tool_calls)
 
-                # Execute tool
-                tool_func = tool_map.get(tool_name)
-                if tool_func:
-                    try:
-                        tool_result = tool_func.invoke(tool_args)
-                    except Exception as e:
-                        tool_result = f"Error: {str(e)}"
-                else:
-                    tool_result = f"Error: Tool '{tool_name}' not found"
+                # Execute this turn's tools concurrently (results keep call order)
+                tool_results = await self._run_tools(tool_map, tool_calls)
 
                 # Add to conversation
-                conversation += f" {response}\n\nTOOL RESULT:\n{tool_result}\n\nAssistant:"
+                self._append_tool_turn(messages, response, tool_calls, tool_results, budget, endpoint)
             else:
                 # No tool call, this is the final answer
                 return response, tools_used
@@ -895,6 +1634,104 @@ Answer questions clearly and concisely. Use tools when they can help provide bet
         # Max iterations reached
         return response, tools_used
 
+    async def _generate_react_turn(self, endpoint: str, model: str, messages: List[Dict[str, str]],
+                                   cache_key: str = None) -> str:
+        """
+        Generate one ReAct reply.
+
+        The reply is streamed so generation can be cut off as soon as its
+        TOOL/ARGS blocks are complete, instead of decoding whatever the model
+        writes after them.
+
+        Returns: The reply (up to its last tool call when cut off early)
+        """
+        parser = ToolCallStreamParser(self.max_tools_per_turn)
+        stream = self._call_chat_api_streaming('', endpoint, model, messages=messages, cache_key=cache_key)
+
+        async with contextlib.aclosing(stream):
+            async for chunk in stream:
+                if chunk['type'] == 'chunk':
+                    if parser.feed(chunk['content']):
+                        # Closing the stream drops the connection, which stops the backend
+                        self.tool_exec_stats['early_exits'] += 1
+                        return parser.tool_text()
+                elif chunk['type'] == 'error':
+                    raise Exception(chunk['content'])
+                elif chunk['type'] == 'done':
+                    break
+
+        return parser.text
+
+    async def _execute_with_tools_streaming(self, instruction: str, agent_type: AgentType,
+                                            endpoint: str, model: str, cache_key: str = None,
+                                            history: Optional[List[Dict[str, str]]] = None):
+        """
+        Streaming variant of _execute_with_tools (ReAct pattern).
+
+        Yields:
+            dict: Events as the loop progresses:
+                - {'type': 'chunk', 'content': str, 'iteration': int}
+                - {'type': 'tool_call', 'tool': str, 'args': dict, 'iteration': int}
+                - {'type': 'tool_result', 'tool': str, 'result': str, 'iteration': int}
+                - {'type': 'final', 'response': str, 'tools_used': list}
+                - {'type': 'error', 'content': str}
+        """
+        compiled = self.get_compiled_tools(agent_type)
+        system_prompt, tool_map = compiled['system_prompt'], compiled['tool_map']
+
+        messages = self._react_messages(system_prompt, instruction, history)
+        protected = len(messages)
+        budget = self._context_budget_for(agent_type)
+        tools_used = []
+        max_iterations = 5
+        response = ""
+
+        for iteration in range(max_iterations):
+            await self.context_budget.fit(messages, budget, endpoint, model, protected)
+            parser = ToolCallStreamParser(self.max_tools_per_turn)
+            stream = self._call_chat_api_streaming(instruction, endpoint, model,
+                                                   messages=messages, cache_key=cache_key)
+
+            async with contextlib.aclosing(stream):
+                async for chunk in stream:
+                    if chunk['type'] == 'chunk':
+                        yield {**chunk, 'iteration': iteration}
+                        if parser.feed(chunk['content']):
+                            # Tool calls are complete; stop generating the rest of the turn
+                            self.tool_exec_stats['early_exits'] += 1
+                            break
+                    elif chunk['type'] == 'error':
+                        yield chunk
+                        return
+                    elif chunk['type'] == 'done':
+                        break
+            response = parser.tool_text()
+
+            tool_calls = self._parse_tool_calls(response)
+            if not tool_calls:
+                # No tool call, this is the final answer
+                break
+
+            for tool_name, tool_args in tool_calls:
+                tools_used.append(tool_name)
+                yield {'type': 'tool_call', 'tool': tool_name, 'args': tool_args, 'iteration': iteration}
+
+            # All calls run concurrently; results are reported in call order
+            tasks = self._start_tools(tool_map, tool_calls)
+            tool_results = []
+            try:
+                for (tool_name, _), task in zip(tool_calls, tasks):
+                    tool_result = await task
+                    tool_results.append(tool_result)
+                    yield {'type': 'tool_result', 'tool': tool_name, 'result': str(tool_result)[:2000], 'iteration': iteration}
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+            self._append_tool_turn(messages, response, tool_calls, tool_results, budget, endpoint)
+
+        yield {'type': 'final', 'response': response, 'tools_used': tools_used}
+
     async def _execute_claude_with_tools(self, instruction: str, agent_type: AgentType) -> tuple[str, list]:
         """
         Execute task with Claude API and tool support.
@@ -903,44 +1740,17 @@ Answer questions clearly and concisely. Use tools when they can help provide bet
         """
         from claude_api import claude_api
 
-        # Get tools for this agent
-        tools = self.get_tools_for_agent(agent_type)
+        # Get precompiled tools and Anthropic schemas for this agent
+        compiled = self.get_compiled_tools(agent_type)
 
-        if not tools:
+        if not compiled['tools']:
             # No tools, just call Claude API
             result = await claude_api.query(instruction)
             return result.get('response', ''), []
 
-        # Convert langchain tools to Anthropic format
-        anthropic_tools = []
-        tool_map = {}  # Map tool names to langchain tool objects
-
-        for tool in tools:
-            tool_map[tool.name] = tool
-
-            # Convert to Anthropic tool schema
-            anthropic_tools.append({
-                'name': tool.name,
-                'description': tool.description or tool.name,
-                'input_schema': {
-                    'type': 'object',
-                    'properties': tool.args if hasattr(tool, 'args') else {},
-                    'required': []
-                }
-            })
-
-        # System prompts for each agent type
-        system_prompts = {
-            AgentType.CODER: "You are an expert code writer with access to powerful tools. IMPORTANT: Always respond in English only. Use tools to read, edit, and write code. Always use edit_file for surgical changes instead of rewriting entire files. Explain your reasoning.",
-            AgentType.EXECUTOR: "You are a system administrator with full terminal access. IMPORTANT: Always respond in English only. Use bash and process tools to execute commands and manage systems. Always explain what you're doing before executing commands.",
-            AgentType.RESEARCHER: "You are a research specialist with access to the web and documentation. IMPORTANT: Always respond in English only. Use web search, documentation lookup, and file search tools to find accurate information. Cite your sources.",
-            AgentType.REASONER: "You are a reasoning expert. IMPORTANT: Always respond in English only. Think through problems logically, break them down into steps, and save your findings to memory for later use.",
-            AgentType.CONSULTANT: "You are an expert consultant with access to ALL tools. IMPORTANT: Always respond in English only. Analyze the task, choose the right tools, and provide comprehensive solutions. You have maximum intelligence - use it wisely.",
-            AgentType.VISION: "You are a vision and image analysis expert. IMPORTANT: Always respond in English only. Never use Chinese or any other language. Analyze images, screenshots, UI elements, and visual content clearly.",
-            AgentType.GENERAL: "You are a helpful general assistant. IMPORTANT: Always respond in English only. Answer questions clearly and concisely.",
-        }
-
-        system_prompt = system_prompts.get(agent_type, "You are a helpful AI assistant. IMPORTANT: Always respond in English only.")
+        anthropic_tools = compiled['anthropic_tools']
+        tool_map = compiled['tool_map']  # Map tool names to langchain tool objects
+        system_prompt = compiled['claude_system_prompt']
 
         # Tool execution loop
         messages = [{"role": "user", "content": instruction}]
@@ -949,7 +1759,8 @@ Answer questions clearly and concisely. Use tools when they can help provide bet
 
         for iteration in range(max_iterations):
             # Call Claude API with tools
-            response = claude_api.client.messages.create(
+            response = await asyncio.to_thread(
+                claude_api.client.messages.create,
                 model="claude-sonnet-4-20250514",  # Use Sonnet 4 for speed
                 max_tokens=4096,
                 temperature=0.2,
@@ -966,30 +1777,23 @@ Answer questions clearly and concisely. Use tools when they can help provide bet
                     if hasattr(block, 'text'):
                         text_response += block.text
 
-                # Execute tools
-                tool_results = []
-                for block in response.content:
-                    if block.type == "tool_use":
-                        tool_name = block.name
-                        tool_input = block.input
-                        tools_used.append(tool_name)
-
-                        # Find and execute the tool
-                        tool_func = tool_map.get(tool_name)
-                        if tool_func:
-                            try:
-                                tool_result = tool_func.invoke(tool_input)
-                            except Exception as e:
-                                tool_result = f"Error executing {tool_name}: {str(e)}"
-                        else:
-                            tool_result = f"Tool {tool_name} not found"
-
-                        # Store tool result in Anthropic format
-                        tool_results.append({
-                            "type": "tool_result",
-                            "tool_use_id": block.id,
-                            "content": str(tool_result)
-                        })
+                # Execute all requested tools concurrently
+                tool_blocks = [block for block in response.content if block.type == "tool_use"]
+                tools_used.extend(block.name for block in tool_blocks)
+                outputs = await self._run_tools(
+                    tool_map,
+                    [(block.name, block.input) for block in tool_blocks]
+                )
+
+                # Store tool results in Anthropic format (same order as the tool_use blocks)
+                tool_results = [
+                    {
+                        "type": "tool_result",
+                        "tool_use_id": block.id,
+                        "content": str(output)
+                    }
+                    for block, output in zip(tool_blocks, outputs)
+                ]
 
                 # Add assistant response to messages
                 messages.append({
@@ -1020,32 +1824,25 @@ Answer questions clearly and concisely. Use tools when they can help provide bet
 
         return final_response, tools_used
 
-    async def _call_chat_api(self, instruction: str, endpoint: str, model: str, system_prompt: str = None) -> str:
-        """Call a chat API endpoint (supports both Ollama and OpenAI-compatible)"""
-        import requests
-
-        # Build messages array with system prompt for English enforcement
-        messages = []
-
-        # Add system message for English-only enforcement
-        if system_prompt:
-            messages.append({'role': 'system', 'content': system_prompt})
-        else:
-            # Default English-only enforcement
-            messages.append({'role': 'system', 'content': 'IMPORTANT: You must respond ONLY in English. Never use Chinese, Spanish, or any other language. English only.'})
+    def _build_chat_request(self, messages: List[Dict[str, str]], endpoint: str, model: str,
+                            stream: bool = False, cache_key: str = None) -> tuple[str, dict]:
+        """
+        Build the URL and payload for an Ollama or OpenAI-compatible chat call.
 
-        # Add user message
-        messages.append({'role': 'user', 'content': instruction})
+        For llama.cpp the payload asks the server to keep the evaluated prompt
+        in its KV cache, and pins calls sharing a cache_key to one slot so the
+        next call with the same message prefix only evaluates the new tokens.
 
-        # Determine if this is Ollama or OpenAI-compatible endpoint
+        Returns: (url, payload)
+        """
         if model.startswith('ollama:'):
-            # Ollama endpoint
+            # Ollama endpoint (reuses its cache for a matching prefix on its own)
             actual_model = model.replace('ollama:', '', 1)
             url = f"{endpoint}/api/chat"
             payload = {
                 'model': actual_model,
                 'messages': messages,
-                'stream': False
+                'stream': stream
             }
         else:
             # OpenAI-compatible endpoint (llama.cpp, etc.)
@@ -1054,109 +1851,409 @@ Answer questions clearly and concisely. Use tools when they can help provide bet
                 'model': model,
                 'messages': messages
             }
+            if stream:
+                payload['stream'] = True
+
+            if self.prompt_cache_enabled:
+                payload['cache_prompt'] = True
+                slot = self._slot_for(endpoint, cache_key) if cache_key and self.slot_pinning_enabled else None
+                if slot is not None:
+                    payload['id_slot'] = slot
+
+        return url, payload
+
+    def _slot_for(self, endpoint: str, cache_key: str) -> Optional[int]:
+        """
+        Pin a session to a llama.cpp slot on this endpoint.
+
+        New sessions are handed slots round-robin so concurrent sessions spread
+        across the server's slots; a returning session gets the slot that
+        still holds its prompt. Only slots the server reported via /props are
+        used; with an unknown count (not probed yet, llama-cpp-python) this
+        returns None and the request relies on cache_prompt alone, where
+        llama.cpp picks the slot with the most similar cached prompt.
+        """
+        slot_count = self.http_pool.get_endpoint_config(endpoint).slots
+        if not slot_count:
+            return None
+
+        key = (endpoint, cache_key)
+
+        slot = self._session_slots.get(key)
+        if slot is None or slot >= slot_count:
+            slot = self._next_slot.get(endpoint, 0) % slot_count
+            self._next_slot[endpoint] = slot + 1
+            self._session_slots[key] = slot
+
+            # Forget the oldest sessions once the table is full
+            while len(self._session_slots) > self.max_pinned_sessions:
+                self._session_slots.popitem(last=False)
+        else:
+            self._session_slots.move_to_end(key)
+
+        return slot
+
+    async def _call_chat_api(self, instruction: str, endpoint: str, model: str, system_prompt: str = None,
+                             messages: List[Dict[str, str]] = None, cache_key: str = None,
+                             response_scope: str = None, use_cache: bool = True,
+                             history: Optional[List[Dict[str, str]]] = None) -> str:
+        """
+        Call a chat API endpoint (supports both Ollama and OpenAI-compatible)
+
+        Args:
+            instruction: The prompt/instruction (ignored when messages is given)
+            endpoint: API endpoint URL
+            model: Model identifier
+            system_prompt: Optional system message sent before the instruction
+            messages: Full message list to send instead of system_prompt + instruction
+            cache_key: Session key used to reuse the backend's prompt cache
+            response_scope: Agent type / feature name; enables the response cache for this call
+            use_cache: False to skip the cache lookup (the fresh answer is still stored)
+            history: Earlier session turns placed before the instruction (ignored when messages is given)
+        """
+        if messages is None:
+            # Build messages array with system prompt for English enforcement
+            messages = []
+
+            # Add system message for English-only enforcement
+            if system_prompt:
+                messages.append({'role': 'system', 'content': system_prompt})
+            else:
+                # Default English-only enforcement
+                messages.append({'role': 'system', 'content': 'IMPORTANT: You must respond ONLY in English. Never use Chinese, Spanish, or any other language. English only.'})
+
+            # Earlier turns, then the user message
+            messages.extend(history or [])
+            messages.append({'role': 'user', 'content': instruction})
 
-        response = requests.post(url, json=payload, timeout=120)
-        response.raise_for_status()
+        url, payload = self._build_chat_request(messages, endpoint, model, cache_key=cache_key)
+
+        response_key = self._response_cache_key(response_scope, model, messages, payload)
+        if response_key:
+            if use_cache:
+                cached = await self.response_cache.lookup(response_key)
+                if cached is not None:
+                    return cached
+            else:
+                self.response_cache.record_bypass()
 
-        data = response.json()
+        async with self.scheduler.slot(url, cache_key):
+            data = await self.http_pool.post_json(url, payload)
 
         # Handle different response formats
+        response = None
         if 'message' in data and 'content' in data['message']:
             # Ollama format
-            return data['message']['content']
+            response = data['message']['content']
         elif 'choices' in data and len(data['choices']) > 0:
             # OpenAI format
-            return data['choices'][0]['message']['content']
+            response = data['choices'][0]['message']['content']
+
+        if response_key and response:
+            await self.response_cache.store(response_key, response, scope=response_scope)
+
+        return response
+
+    def _response_cache_key(self, response_scope: Optional[str], model: str,
+                            messages: List[Dict[str, str]], payload: Dict[str, Any]) -> Optional[str]:
+        """Response cache key for a chat request, or None when the call isn't cacheable"""
+        if not response_scope or not self.response_cache.enabled:
+            return None
+
+        # Only parameters that change the answer belong in the key
+        params = {k: v for k, v in payload.items() if k not in RESPONSE_CACHE_IGNORED_PARAMS}
+        return self.response_cache.make_key(response_scope, model, messages, params)
 
-    async def _call_chat_api_streaming(self, instruction: str, endpoint: str, model: str):
+    async def _call_chat_api_streaming(self, instruction: str, endpoint: str, model: str,
+                                       system_prompt: str = None, messages: List[Dict[str, str]] = None,
+                                       cache_key: str = None, response_scope: str = None,
+                                       use_cache: bool = True, history: Optional[List[Dict[str, str]]] = None):
         """
         Call a chat API endpoint with streaming support.
         Yields chunks of the response as they arrive.
 
         Args:
-            instruction: The prompt/instruction
+            instruction: The prompt/instruction (ignored when messages is given)
             endpoint: API endpoint URL
             model: Model identifier
+            system_prompt: Optional system message sent before the instruction
+            messages: Full message list to send instead of system_prompt + instruction
+            cache_key: Session key used to reuse the backend's prompt cache
+            response_scope: Agent type / feature name; enables the response cache for this call
+            use_cache: False to skip the cache lookup (the fresh answer is still stored)
+            history: Earlier session turns placed before the instruction (ignored when messages is given)
 
         Yields:
             dict: Chunks with 'type', 'content', and optional metadata
         """
-        import requests
-        import json as json_lib
+        if messages is None:
+            messages = []
+            if system_prompt:
+                messages.append({'role': 'system', 'content': system_prompt})
+            messages.extend(history or [])
+            messages.append({'role': 'user', 'content': instruction})
+
+        url, payload = self._build_chat_request(messages, endpoint, model, stream=True, cache_key=cache_key)
+
+        response_key = self._response_cache_key(response_scope, model, messages, payload)
+        if response_key:
+            if use_cache:
+                cached = await self.response_cache.lookup(response_key)
+                if cached is not None:
+                    # Replay the cached answer as one chunk
+                    yield {'type': 'chunk', 'content': cached}
+                    yield {'type': 'done', 'content': '', 'cached': True}
+                    return
+            else:
+                self.response_cache.record_bypass()
+
+        response = ""
+        stream = self._stream_chat(url, payload, cache_key)
+        async with contextlib.aclosing(stream):
+            async for chunk in stream:
+                if chunk['type'] == 'chunk':
+                    response += chunk['content']
+                elif chunk['type'] == 'done' and response_key and response:
+                    await self.response_cache.store(response_key, response, scope=response_scope)
+                yield chunk
+
+    async def _stream_chat(self, url: str, payload: Dict[str, Any], session: Optional[str] = None):
+        """
+        Stream one chat request and normalize Ollama / OpenAI-compatible chunks.
+        The backend slot is held until the stream finishes or is closed.
 
-        # Determine if this is Ollama or OpenAI-compatible endpoint
-        if model.startswith('ollama:'):
-            # Ollama endpoint
-            actual_model = model.replace('ollama:', '', 1)
-            url = f"{endpoint}/api/chat"
-            payload = {
-                'model': actual_model,
-                'messages': [{'role': 'user', 'content': instruction}],
-                'stream': True
-            }
-        else:
-            # OpenAI-compatible endpoint (llama.cpp, etc.)
-            url = f"{endpoint}/chat/completions"
-            payload = {
-                'model': model,
-                'messages': [{'role': 'user', 'content': instruction}],
-                'stream': True
-            }
+        Yields:
+            dict: {'type': 'chunk'|'done'|'error', 'content': str, ...}
+
+        Raises:
+            BackendOverloaded: The backend scheduler shed the request
+        """
+        import json as json_lib
 
         try:
-            response = requests.post(url, json=payload, timeout=120, stream=True)
-            response.raise_for_status()
+            # Process streaming response (pooled, non-blocking)
+            async with self.scheduler.slot(url, session), \
+                    contextlib.aclosing(self.http_pool.stream_lines(url, payload)) as lines:
+                async for line in lines:
+                    # Handle SSE format (OpenAI-compatible)
+                    if line.startswith('data: '):
+                        line = line[6:]  # Remove 'data: ' prefix
+
+                    if line == '[DONE]':
+                        yield {'type': 'done', 'content': ''}
+                        break
+
+                    try:
+                        data = json_lib.loads(line)
+
+                        # Handle different response formats
+                        if 'message' in data and 'content' in data['message']:
+                            # Ollama format
+                            content = data['message'].get('content', '')
+                            if content:
+                                yield {'type': 'chunk', 'content': content}
+
+                            if data.get('done', False):
+                                yield {'type': 'done', 'content': '', 'tokens': data.get('eval_count')}
+                                break
+
+                        elif 'choices' in data and len(data['choices']) > 0:
+                            # OpenAI format
+                            delta = data['choices'][0].get('delta', {})
+                            content = delta.get('content', '')
+
+                            if content:
+                                yield {'type': 'chunk', 'content': content}
+
+                            # Check if this is the final chunk (llama.cpp attaches timings)
+                            if data['choices'][0].get('finish_reason'):
+                                timings = data.get('timings') or {}
+                                yield {'type': 'done', 'content': '', 'tokens': timings.get('predicted_n')}
+                                break
+
+                    except json_lib.JSONDecodeError:
+                        # Skip malformed JSON
+                        continue
+
+        except BackendOverloaded:
+            raise
+        except Exception as e:
+            yield {'type': 'error', 'content': str(e)}
+
+    def _should_speculate(self, agent_type: AgentType, classification: Dict[str, Any]) -> bool:
+        """
+        Whether to stream a General draft while agent_type works on the answer.
 
-            # Process streaming response
-            for line in response.iter_lines():
-                if not line:
-                    continue
+        Only for agents that allow it, SIMPLE/MEDIUM tasks, and when General
+        runs on a different backend that still has a free slot.
+        """
+        if not self.speculation_enabled or not self.agents[agent_type].get('speculative', False):
+            return False
+        if classification['complexity'] == TaskComplexity.COMPLEX:
+            return False
+        if self._backend_key(AgentType.GENERAL) == self._backend_key(agent_type):
+            return False
+        return self._backend_load(AgentType.GENERAL) < 1.0
+
+    async def _collect_specialist(self, instruction: str, agent_type: AgentType,
+                                  cache_key: str, use_cache: bool = True,
+                                  history: Optional[List[Dict[str, str]]] = None) -> Dict[str, Any]:
+        """
+        Run a specialist's streaming path to completion without forwarding its events.
 
-                line = line.decode('utf-8')
+        Returns:
+            {'response': str, 'tools_used': list, 'tokens': int, 'cached': bool}
+        """
+        agent_config = self.agents[agent_type]
+        result = {'response': '', 'tools_used': [], 'tokens': 0, 'cached': False}
+
+        if agent_config.get('tools_enabled', False) and agent_type in TOOL_AGENT_TYPES:
+            endpoint, model = self._tool_backend(agent_type)
+            stream = self._execute_with_tools_streaming(instruction, agent_type, endpoint, model,
+                                                        cache_key=cache_key, history=history)
+            async with contextlib.aclosing(stream):
+                async for event in stream:
+                    if event['type'] == 'chunk':
+                        result['tokens'] += 1
+                    elif event['type'] == 'error':
+                        raise Exception(event['content'])
+                    elif event['type'] == 'final':
+                        result['response'] = event['response']
+                        result['tools_used'] = event['tools_used']
+        else:
+            stream = self._call_chat_api_streaming(
+                instruction, agent_config['endpoint'], agent_config['model'],
+                cache_key=cache_key, response_scope=agent_type.value, use_cache=use_cache,
+                history=history
+            )
+            async with contextlib.aclosing(stream):
+                async for chunk in stream:
+                    if chunk['type'] == 'chunk':
+                        result['response'] += chunk['content']
+                        result['tokens'] += 1
+                    elif chunk['type'] == 'error':
+                        raise Exception(chunk['content'])
+                    elif chunk['type'] == 'done':
+                        result['tokens'] = chunk.get('tokens') or result['tokens']
+                        result['cached'] = chunk.get('cached', False)
+                        break
 
-                # Handle SSE format (OpenAI-compatible)
-                if line.startswith('data: '):
-                    line = line[6:]  # Remove 'data: ' prefix
+        return result
 
-                if line == '[DONE]':
-                    yield {'type': 'done', 'content': ''}
-                    break
+    async def _execute_speculative_streaming(self, instruction: str, agent_type: AgentType,
+                                             cache_key: str, use_cache: bool = True,
+                                             history: Optional[List[Dict[str, str]]] = None):
+        """
+        Stream a fast General draft while the specialist answers the same request.
 
-                try:
-                    data = json_lib.loads(line)
+        The draft stops early if the specialist finishes first. Once the
+        specialist is done its answer either confirms the draft (similar
+        enough) or replaces it. If the specialist fails after a complete
+        draft, the draft is kept as the answer.
 
-                    # Handle different response formats
-                    if 'message' in data and 'content' in data['message']:
-                        # Ollama format
-                        content = data['message'].get('content', '')
-                        if content:
-                            yield {'type': 'chunk', 'content': content}
+        Yields:
+            dict: {'type': 'draft', 'content': str}, then
+                  {'type': 'confirm'|'replace', 'content': str, 'similarity': float}
+                  (content is the answer that is kept and stored), then
+                  {'type': 'final', 'response': str, 'tools_used': list, 'tokens': int,
+                   'cached': bool, 'speculation': dict}
+        """
+        general = self.agents[AgentType.GENERAL]
+        draft_backend = self._backend_key(AgentType.GENERAL)
+        specialist = asyncio.ensure_future(
+            self._collect_specialist(instruction, agent_type, cache_key, use_cache, history)
+        )
+        self.speculation_stats['drafts'] += 1
+        self.live_metrics.begin(AgentType.GENERAL.value, draft_backend)
+
+        draft = ""
+        draft_complete = False
+        draft_stream = self._call_chat_api_streaming(
+            instruction, general['endpoint'], general['model'],
+            cache_key=cache_key, response_scope=AgentType.GENERAL.value, use_cache=use_cache,
+            history=history
+        )
+        next_chunk = None
 
-                        if data.get('done', False):
-                            yield {'type': 'done', 'content': ''}
+        try:
+            try:
+                while True:
+                    next_chunk = asyncio.ensure_future(draft_stream.__anext__())
+                    await asyncio.wait({next_chunk, specialist}, return_when=asyncio.FIRST_COMPLETED)
+                    if not next_chunk.done():
+                        if specialist.exception() is None:
+                            # Specialist answered first; the rest of the draft is moot
+                            self.speculation_stats['drafts_cut_short'] += 1
                             break
+                        # Specialist failed; finish the draft so it can stand in
+                        await asyncio.wait({next_chunk})
 
-                    elif 'choices' in data and len(data['choices']) > 0:
-                        # OpenAI format
-                        delta = data['choices'][0].get('delta', {})
-                        content = delta.get('content', '')
+                    try:
+                        chunk = next_chunk.result()
+                    except StopAsyncIteration:
+                        break
+                    except Exception:
+                        # Draft backend failed or shed us; the specialist answer still arrives
+                        break
+                    finally:
+                        next_chunk = None
+
+                    if chunk['type'] == 'chunk':
+                        draft += chunk['content']
+                        yield {'type': 'draft', 'content': chunk['content']}
+                    elif chunk['type'] == 'done':
+                        draft_complete = True
+                        break
+                    elif chunk['type'] == 'error':
+                        break
+            finally:
+                if next_chunk is not None:
+                    next_chunk.cancel()
+                    with contextlib.suppress(BaseException):
+                        await next_chunk
+                await draft_stream.aclose()
+                self.live_metrics.end(AgentType.GENERAL.value, draft_backend, None, None)
 
-                        if content:
-                            yield {'type': 'chunk', 'content': content}
+            try:
+                result = await specialist
+            except Exception as e:
+                if not (draft_complete and draft):
+                    raise
+                self.speculation_stats['fallbacks'] += 1
+                yield {'type': 'confirm', 'content': draft, 'similarity': None, 'fallback': True, 'reason': str(e)}
+                yield {
+                    'type': 'final', 'response': draft, 'tools_used': [], 'tokens': None, 'cached': False,
+                    'speculation': {'outcome': 'fallback', 'draft_agent': AgentType.GENERAL.value}
+                }
+                return
 
-                        # Check if this is the final chunk
-                        if data['choices'][0].get('finish_reason'):
-                            yield {'type': 'done', 'content': ''}
-                            break
+            similarity = difflib.SequenceMatcher(None, draft, result['response']).ratio() if draft else 0.0
+            if draft and similarity >= self.speculation_confirm_ratio:
+                outcome = 'confirmed'
+                yield {'type': 'confirm', 'content': result['response'], 'similarity': similarity}
+            else:
+                outcome = 'replaced'
+                yield {'type': 'replace', 'content': result['response'], 'similarity': similarity}
+            self.speculation_stats[outcome] += 1
 
-                except json_lib.JSONDecodeError:
-                    # Skip malformed JSON
-                    continue
+            yield {
+                'type': 'final', **result,
+                'speculation': {
+                    'outcome': outcome,
+                    'similarity': similarity,
+                    'draft_agent': AgentType.GENERAL.value,
+                    'draft_complete': draft_complete
+                }
+            }
 
-        except Exception as e:
-            yield {'type': 'error', 'content': str(e)}
+        finally:
+            if not specialist.done():
+                specialist.cancel()
+                with contextlib.suppress(BaseException):
+                    await specialist
 
-    async def execute_task_streaming(self, instruction: str, conversation_id: str = None):
+    async def execute_task_streaming(self, instruction: str, conversation_id: str = None,
+                                     use_cache: bool = True):
         """
         Execute a task with streaming support.
         Yields chunks as they arrive from the LLM.
@@ -1164,20 +2261,27 @@ Answer questions clearly and concisely. Use tools when they can help provide bet
         Args:
             instruction: The task to perform
             conversation_id: Optional conversation ID for context
+            use_cache: False to bypass the response cache lookup
 
         Yields:
             dict: Event dictionaries with various types:
                 - {'type': 'start', 'agent': str, 'routing': dict}
                 - {'type': 'chunk', 'content': str}
-                - {'type': 'done', 'execution_time': float, 'tools_used': list}
+                - {'type': 'tool_call', 'tool': str, 'args': dict}
+                - {'type': 'tool_result', 'tool': str, 'result': str}
+                - {'type': 'draft', 'content': str}  (speculative General draft)
+                - {'type': 'confirm'|'replace', ...}  (specialist verdict on the draft)
+                - {'type': 'done', 'execution_time': float, 'tools_used': list,
+                   'ttft': float, 'tokens': int, 'tokens_per_second': float}
                 - {'type': 'error', 'content': str}
         """
         task_id = str(uuid.uuid4())
         start_time = time.time()
+        tracked = None  # (agent, backend) while counted as in flight
 
         try:
             # Route the task
-            routing = self.route_task(instruction, conversation_id)
+            routing = await self._route_task_async(instruction, conversation_id)
             agent_type = routing['agent']
             agent_config = routing['agent_config']
 
@@ -1188,6 +2292,11 @@ Answer questions clearly and concisely. Use tools when they can help provide bet
                 'status': 'running',
                 'start_time': start_time
             }
+            tracked = (agent_type.value, self._backend_key(agent_type))
+            self.live_metrics.begin(*tracked)
+
+            speculative = self._should_speculate(agent_type, routing['classification'])
+            history = await self._build_history(conversation_id, instruction, agent_type)
 
             # Send start event with routing info
             yield {
@@ -1195,16 +2304,66 @@ Answer questions clearly and concisely. Use tools when they can help provide bet
                 'agent': agent_type.value,
                 'agent_name': agent_config['name'],
                 'routing': self._make_json_safe(routing),
-                'task_id': task_id
+                'task_id': task_id,
+                'speculative': speculative
             }
 
             full_response = ""
+            first_token_time = None
+            token_count = 0
+            backend_tokens = None
+            cached = False
+            speculation = None
 
             # Stream response based on agent type
-            if agent_config['model'] == 'enhanced_agent':
+            if speculative:
+                # Fast draft now, specialist answer when ready
+                stream = self._execute_speculative_streaming(instruction, agent_type,
+                                                             conversation_id or task_id, use_cache, history)
+                async with contextlib.aclosing(stream):
+                    async for event in stream:
+                        if event['type'] == 'draft':
+                            if first_token_time is None:
+                                first_token_time = time.time()
+                            yield event
+                        elif event['type'] in ('confirm', 'replace'):
+                            if first_token_time is None:
+                                first_token_time = time.time()
+                            yield event
+                        elif event['type'] == 'final':
+                            full_response = event['response']
+                            tools_used = event['tools_used']
+                            backend_tokens = event['tokens']
+                            cached = event['cached']
+                            speculation = event['speculation']
+
+            elif agent_config.get('tools_enabled', False) and agent_type in TOOL_AGENT_TYPES:
+                # Streaming ReAct loop: tokens, tool calls and tool results as they happen
+                endpoint, model = self._tool_backend(agent_type)
+                tools_used = []
+                stream = self._execute_with_tools_streaming(instruction, agent_type, endpoint, model,
+                                                            cache_key=conversation_id or task_id,
+                                                            history=history)
+                async with contextlib.aclosing(stream):
+                    async for event in stream:
+                        if event['type'] == 'chunk':
+                            if first_token_time is None:
+                                first_token_time = time.time()
+                            token_count += 1
+                            yield event
+                        elif event['type'] in ('tool_call', 'tool_result'):
+                            yield event
+                        elif event['type'] == 'error':
+                            raise Exception(event['content'])
+                        elif event['type'] == 'final':
+                            full_response = event['response']
+                            tools_used = event['tools_used']
+
+            elif agent_config['model'] == 'enhanced_agent':
                 # Enhanced agent doesn't support streaming yet, use regular execution
                 from local_parakleon_agent import run_agent
-                response = run_agent(instruction)
+                response = await asyncio.to_thread(run_agent, self._with_history_text(instruction, history))
+                first_token_time = time.time()
                 yield {'type': 'chunk', 'content': response}
                 full_response = response
                 tools_used = ['enhanced_agent_tools']
@@ -1213,12 +2372,13 @@ Answer questions clearly and concisely. Use tools when they can help provide bet
                 # External LLM - use their streaming if available
                 from external_llm import external_llm
                 result = await external_llm.query_best_available(
-                    prompt=instruction,
+                    prompt=self._with_history_text(instruction, history),
                     system_prompt="You are an expert consultant providing thoughtful, well-reasoned advice."
                 )
                 if result.get('available'):
                     # External APIs typically return complete responses
                     # Send as single chunk for now
+                    first_token_time = time.time()
                     yield {'type': 'chunk', 'content': result['response']}
                     full_response = result['response']
                     tools_used = [f"external_llm_{result['provider']}"]
@@ -1228,20 +2388,38 @@ Answer questions clearly and concisely. Use tools when they can help provide bet
             else:
                 # Use streaming chat API
                 tools_used = []
-                async for chunk in self._call_chat_api_streaming(
+                stream = self._call_chat_api_streaming(
                     instruction,
                     agent_config['endpoint'],
-                    agent_config['model']
-                ):
-                    if chunk['type'] == 'chunk':
-                        full_response += chunk['content']
-                        yield chunk
-                    elif chunk['type'] == 'error':
-                        raise Exception(chunk['content'])
-                    elif chunk['type'] == 'done':
-                        break
+                    agent_config['model'],
+                    cache_key=conversation_id or task_id,
+                    response_scope=agent_type.value,
+                    use_cache=use_cache,
+                    history=history
+                )
+                async with contextlib.aclosing(stream):
+                    async for chunk in stream:
+                        if chunk['type'] == 'chunk':
+                            if first_token_time is None:
+                                first_token_time = time.time()
+                            token_count += 1
+                            full_response += chunk['content']
+                            yield chunk
+                        elif chunk['type'] == 'error':
+                            raise Exception(chunk['content'])
+                        elif chunk['type'] == 'done':
+                            backend_tokens = chunk.get('tokens')
+                            cached = chunk.get('cached', False)
+                            break
 
-            execution_time = time.time() - start_time
+            end_time = time.time()
+            execution_time = end_time - start_time
+
+            # Streaming performance (backend token count when reported, else one token per chunk)
+            tokens_generated = backend_tokens or token_count
+            ttft = (first_token_time - start_time) if first_token_time else None
+            generation_time = (end_time - first_token_time) if first_token_time else 0
+            tokens_per_second = (tokens_generated / generation_time) if generation_time > 0 and tokens_generated else None
 
             # Update task status
             self.active_tasks[task_id]['status'] = 'completed'
@@ -1267,29 +2445,59 @@ Answer questions clearly and concisely. Use tools when they can help provide bet
                 'tools_used': tools_used,
                 'response': full_response,
                 'agent_used': agent_type.value,
-                'agent_name': agent_config['name']
+                'agent_name': agent_config['name'],
+                'ttft': ttft,
+                'tokens': tokens_generated,
+                'tokens_per_second': tokens_per_second,
+                'cached': cached,
+                'speculation': speculation
             }
 
         except Exception as e:
             execution_time = time.time() - start_time
-            self.active_tasks[task_id]['status'] = 'error'
-            yield {
+            if task_id in self.active_tasks:
+                self.active_tasks[task_id]['status'] = 'error'
+            error_event = {
                 'type': 'error',
                 'content': str(e),
                 'execution_time': execution_time
             }
+            if isinstance(e, BackendOverloaded):
+                error_event['overloaded'] = True
+                error_event['retry_after'] = e.retry_after
+            yield error_event
+
+        finally:
+            if tracked:
+                status = self.active_tasks[task_id]['status']
+                self.live_metrics.end(*tracked, time.time() - start_time,
+                                      None if status == 'running' else status == 'completed')
 
     async def vote_on_decision(self, question: str, options: List[str],
-                              context: str = "", use_external: bool = True) -> Dict[str, Any]:
+                              context: str = "", use_external: bool = True,
+                              use_cache: bool = True, voters: Optional[List[str]] = None,
+                              quorum: Optional[int] = None,
+                              deadline: Optional[float] = None) -> Dict[str, Any]:
         """
         Voting mechanism for complex decisions.
         Queries multiple agents and/or external LLMs for consensus.
 
+        All voters are asked at the same time. Voting closes as soon as
+        `quorum` votes are in or `deadline` seconds have passed, and any
+        voter still running is cancelled. For local agents that closes their
+        request; the consultant's call runs in a worker thread, so it finishes
+        in the background and its answer is dropped.
+
         Args:
             question: The decision question
             options: List of possible choices
             context: Additional context
             use_external: Whether to include external LLM (Claude/GPT) in voting
+            use_cache: False to bypass the response cache for local votes
+            voters: Agent types to ask, plus 'consultant' for the external LLM
+                    (default: PKN_VOTERS or consultant + reasoner)
+            quorum: Votes needed to close early (default: every voter)
+            deadline: Seconds to wait for votes (default: PKN_VOTE_DEADLINE, or no limit)
 
         Returns:
             {
@@ -1297,11 +2505,24 @@ Answer questions clearly and concisely. Use tools when they can help provide bet
                 'votes': Dict[str, str],  # agent -> choice
                 'reasoning': Dict[str, str],  # agent -> reason
                 'consensus': float,  # 0-1, how much agreement
-                'final_reasoning': str
+                'final_reasoning': str,
+                'voters': List[str],  # agents asked
+                'failed': Dict[str, str],  # agent -> error
+                'cancelled': List[str],  # agents still running when voting closed
+                'elapsed': float
             }
         """
         votes = {}
         reasoning = {}
+        failed = {}
+        start_time = time.time()
+
+        voters = list(voters or self.default_voters)
+        if not use_external:
+            voters = [v for v in voters if v != 'consultant']
+        quorum = min(quorum or len(voters), len(voters))
+        if deadline is None:
+            deadline = self.vote_deadline
 
         # Format the question
         prompt = f"{question}\n\nContext: {context}\n\nOptions:\n"
@@ -1309,35 +2530,37 @@ Answer questions clearly and concisely. Use tools when they can help provide bet
             prompt += f"{i+1}. {opt}\n"
         prompt += "\nChoose the best option and explain why."
 
-        # Vote with external LLM if available and requested
-        if use_external:
-            try:
-                from external_llm import external_llm
-
-                if external_llm.is_available():
-                    result = await external_llm.vote_on_decision(question, options, context)
-                    votes['consultant'] = result['choice']
-                    reasoning['consultant'] = result['reasoning']
-            except Exception as e:
-                print(f"External LLM vote failed: {e}")
+        # Fan out to every voter at once
+        pending = {
+            asyncio.ensure_future(self._cast_vote(voter, prompt, question, options, context, use_cache)): voter
+            for voter in voters
+        }
+        loop = asyncio.get_running_loop()
+        closes_at = loop.time() + deadline if deadline else None
 
-        # Vote with local reasoner agent
         try:
-            reasoner_config = self.agents[AgentType.REASONER]
-            reasoner_system_prompt = "You are a reasoning expert. IMPORTANT: Always respond in English only. Analyze options carefully and provide clear reasoning."
-            reasoner_response = await self._call_chat_api(
-                prompt,
-                reasoner_config['endpoint'],
-                reasoner_config['model'],
-                reasoner_system_prompt
-            )
+            while pending and len(votes) < quorum:
+                timeout = max(closes_at - loop.time(), 0) if closes_at is not None else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break  # Deadline passed
+
+                for task in done:
+                    voter = pending.pop(task)
+                    try:
+                        chosen, reason = task.result()
+                        votes[voter] = chosen
+                        reasoning[voter] = reason
+                    except Exception as e:
+                        failed[voter] = str(e)
+                        print(f"{voter} vote failed: {e}")
+        finally:
+            # Late voters are not needed anymore (a consultant call already in its thread runs to completion)
+            for task in pending:
+                task.cancel()
 
-            # Parse response to find chosen option
-            chosen = self._parse_choice_from_response(reasoner_response, options)
-            votes['reasoner'] = chosen
-            reasoning['reasoner'] = reasoner_response
-        except Exception as e:
-            print(f"Reasoner vote failed: {e}")
+        cancelled = list(pending.values())
+        elapsed = time.time() - start_time
 
         # Tally votes
         if not votes:
@@ -1346,7 +2569,11 @@ Answer questions clearly and concisely. Use tools when they can help provide bet
                 'votes': {},
                 'reasoning': {},
                 'consensus': 0.0,
-                'final_reasoning': 'No agents available for voting, defaulting to first option'
+                'final_reasoning': 'No agents available for voting, defaulting to first option',
+                'voters': voters,
+                'failed': failed,
+                'cancelled': cancelled,
+                'elapsed': elapsed
             }
 
         # Count votes for each option
@@ -1370,9 +2597,52 @@ Answer questions clearly and concisely. Use tools when they can help provide bet
             'votes': votes,
             'reasoning': reasoning,
             'consensus': consensus,
-            'final_reasoning': final_reasoning
+            'final_reasoning': final_reasoning,
+            'voters': voters,
+            'failed': failed,
+            'cancelled': cancelled,
+            'elapsed': elapsed
         }
 
+    async def _cast_vote(self, voter: str, prompt: str, question: str, options: List[str],
+                         context: str, use_cache: bool) -> tuple[str, str]:
+        """
+        Ask one voter for its choice.
+
+        Args:
+            voter: Agent type value, or 'consultant' for the external LLM
+
+        Returns: (chosen_option, reasoning)
+        """
+        if voter == 'consultant':
+            from external_llm import external_llm
+
+            if not external_llm.is_available():
+                raise RuntimeError("External LLM not configured")
+            result = await external_llm.vote_on_decision(question, options, context)
+            return result['choice'], result['reasoning']
+
+        config = self.agents.get(AgentType(voter))
+        if not config or not config.get('endpoint'):
+            raise ValueError(f"Agent '{voter}' has no chat endpoint to vote with")
+
+        if voter == AgentType.REASONER.value:
+            system_prompt = "You are a reasoning expert. IMPORTANT: Always respond in English only. Analyze options carefully and provide clear reasoning."
+        else:
+            system_prompt = f"You are the {config['name']}. IMPORTANT: Always respond in English only. Analyze options carefully and provide clear reasoning."
+
+        response = await self._call_chat_api(
+            prompt,
+            config['endpoint'],
+            config['model'],
+            system_prompt,
+            response_scope='vote',
+            use_cache=use_cache
+        )
+
+        # Parse response to find chosen option
+        return self._parse_choice_from_response(response, options), response
+
     def _parse_choice_from_response(self, response: str, options: List[str]) -> str:
         """Extract the chosen option from an agent's response"""
         response_lower = response.lower()
@@ -1393,7 +2663,7 @@ Answer questions clearly and concisely. Use tools when they can help provide bet
     async def search_codebase_with_rag(self, query: str, n_results: int = 5) -> Dict[str, Any]:
         """Search codebase using RAG semantic search"""
         try:
-            result = self.rag_memory.search_code(query, n_results=n_results)
+            result = await asyncio.to_thread(self.rag_memory.search_code, query, n_results=n_results)
             return result
         except Exception as e:
             return {
@@ -1402,26 +2672,29 @@ Answer questions clearly and concisely. Use tools when they can help provide bet
                 'results': []
             }
 
+    def _get_task_planner(self) -> TaskPlanner:
+        """Lazily create the task planner (backed by the reasoner agent)"""
+        if not self.task_planner:
+            # Create a simple LLM client wrapper
+            class SimpleLLMClient:
+                def __init__(self, agent_manager):
+                    self.agent_manager = agent_manager
+
+                async def call(self, prompt, temperature=0.3, max_tokens=2000):
+                    # Use the reasoner agent to create the plan
+                    config = self.agent_manager.agents[AgentType.REASONER]
+                    return await self.agent_manager._call_chat_api(
+                        prompt, config['endpoint'], config['model']
+                    )
+
+            self.task_planner = TaskPlanner(SimpleLLMClient(self), str(self.project_root))
+
+        return self.task_planner
+
     async def create_task_plan(self, task: str, context: Optional[Dict] = None) -> Dict[str, Any]:
         """Create a structured execution plan for a complex task"""
         try:
-            # Initialize task planner if not already done
-            if not self.task_planner:
-                # Create a simple LLM client wrapper
-                class SimpleLLMClient:
-                    def __init__(self, agent_manager):
-                        self.agent_manager = agent_manager
-
-                    async def call(self, prompt, temperature=0.3, max_tokens=2000):
-                        # Use the reasoner agent to create the plan
-                        config = self.agent_manager.agents[AgentType.REASONER]
-                        return await self.agent_manager._call_chat_api(
-                            prompt, config['endpoint'], config['model']
-                        )
-
-                self.task_planner = TaskPlanner(SimpleLLMClient(self), str(self.project_root))
-
-            plan = self.task_planner.create_plan(task, context)
+            plan = await self._get_task_planner().create_plan(task, context)
 
             return {
                 'success': True,
@@ -1437,16 +2710,44 @@ Answer questions clearly and concisely. Use tools when they can help provide bet
             }
 
     async def execute_plan(self, plan_id: str, session_id: str) -> Dict[str, Any]:
-        """Execute a created plan step by step"""
+        """Execute a created plan (independent steps run concurrently)"""
+        try:
+            plan = await asyncio.to_thread(self._get_task_planner().load_plan, plan_id)
+            if not plan:
+                return {
+                    'success': False,
+                    'error': f'Plan {plan_id} not found'
+                }
+            if any(step.status != StepStatus.PENDING for step in plan.steps):
+                # The journal has progress for this plan; /resume reuses it and re-runs the rest
+                return {
+                    'success': False,
+                    'error': f'Plan {plan_id} already has checkpointed progress; '
+                             f'use /api/planning/resume/{plan_id} to continue it'
+                }
+
+            result = await self.plan_executor.execute_plan(plan, session_id)
+            return {
+                'success': result.get('success', True),
+                **result
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+    async def resume_plan(self, plan_id: str, session_id: str) -> Dict[str, Any]:
+        """Resume a checkpointed plan, reusing the results of completed steps"""
         try:
-            plan = self.task_planner.load_plan(plan_id)
+            plan = await asyncio.to_thread(self._get_task_planner().load_plan, plan_id)
             if not plan:
                 return {
                     'success': False,
                     'error': f'Plan {plan_id} not found'
                 }
 
-            result = self.plan_executor.execute_plan(plan, session_id)
+            result = await self.plan_executor.resume_plan(plan, session_id)
             return {
                 'success': result.get('success', True),
                 **result
@@ -1473,7 +2774,7 @@ Answer questions clearly and concisely. Use tools when they can help provide bet
             )
 
             # Execute the delegation
-            result = self.delegation_manager.execute_delegation(
+            result = await self.delegation_manager.execute_delegation(
                 delegation.id,
                 parent_task_id or str(uuid.uuid4())
             )
@@ -1489,15 +2790,17 @@ Answer questions clearly and concisely. Use tools when they can help provide bet
                 'error': str(e)
             }
 
-    async def collaborate_agents(self, agents: List[str], task: str,
-                                session_id: str, coordinator: str = 'reasoner') -> Dict[str, Any]:
+    async def collaborate_agents(self, agents: List[str], task: str, session_id: str,
+                                coordinator: str = 'reasoner',
+                                max_parallel: Optional[int] = None) -> Dict[str, Any]:
         """Have multiple agents collaborate on a task"""
         try:
-            result = self.delegation_manager.collaborate(
+            result = await self.delegation_manager.collaborate(
                 agents=agents,
                 task=task,
                 session_id=session_id,
-                coordinator=coordinator
+                coordinator=coordinator,
+                max_parallel=max_parallel
             )
 
             return {
@@ -1514,12 +2817,13 @@ Answer questions clearly and concisely. Use tools when they can help provide bet
                                   timeout: int = 30) -> Dict[str, Any]:
         """Execute code in a safe sandbox environment"""
         try:
+            # Sandbox runs block on docker/subprocess, keep them off the event loop
             if language == 'python':
-                result = self.code_sandbox.execute_python(code, timeout=timeout)
+                result = await asyncio.to_thread(self.code_sandbox.execute_python, code, timeout=timeout)
             elif language == 'javascript':
-                result = self.code_sandbox.execute_javascript(code, timeout=timeout)
+                result = await asyncio.to_thread(self.code_sandbox.execute_javascript, code, timeout=timeout)
             elif language == 'shell':
-                result = self.code_sandbox.execute_shell(code, timeout=timeout)
+                result = await asyncio.to_thread(self.code_sandbox.execute_shell, code, timeout=timeout)
             else:
                 return {
                     'success': False,
@@ -1560,7 +2864,22 @@ Answer questions clearly and concisely. Use tools when they can help provide bet
         return {
             'agents': self.agent_stats,
             'active_tasks': len([t for t in self.active_tasks.values() if t['status'] == 'running']),
-            'total_tasks': len(self.active_tasks)
+            'total_tasks': len(self.active_tasks),
+            'tool_registry': self.tool_registry_stats,
+            'tool_execution': self.tool_exec_stats,
+            'response_cache': self.response_cache.get_stats(),
+            'context_budget': self.context_budget.get_stats(),
+            'session_history': self.session_history.get_stats(),
+            'conversation_index': self.conversation_index.get_stats(),
+            'router': self.task_router.get_stats() if self.task_router else {'available': False},
+            'live_metrics': self.live_metrics.get_stats(),
+            'backend_scheduler': self.scheduler.get_stats(),
+            'speculation': {'enabled': self.speculation_enabled, **self.speculation_stats},
+            'prompt_cache': {
+                'enabled': self.prompt_cache_enabled,
+                'slot_pinning': self.slot_pinning_enabled,
+                'pinned_sessions': len(self._session_slots)
+            }
         }
 
     def get_available_agents(self) -> List[Dict[str, Any]]:
@@ -1613,6 +2932,24 @@ if __name__ == '__main__':
         print(f"  Strategy: {routing['strategy']}")
         print(f"  Est. Time: {routing['estimated_time']}")
 
+    print("\n" + "=" * 60)
+    print("TOOL REGISTRY BENCHMARK:")
+    print("-" * 60)
+    iterations = 200
+    for agent_type in TOOL_AGENT_TYPES:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            agent_manager._compile_tools(agent_type)
+        uncached_ms = (time.perf_counter() - start) * 1000 / iterations
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            agent_manager.get_compiled_tools(agent_type)
+        cached_ms = (time.perf_counter() - start) * 1000 / iterations
+
+        print(f"{agent_type.value:<12} rebuild: {uncached_ms:8.3f} ms   precompiled: {cached_ms:8.4f} ms")
+    print(f"Full registry compile: {agent_manager.tool_registry_stats['compile_ms']:.1f} ms")
+
     print("\n" + "=" * 60)
     print("AVAILABLE AGENTS:")
     print("-" * 60)
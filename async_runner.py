@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Persistent Event Loop Runner
+Runs all multi-agent coroutines on one long-lived asyncio loop in a dedicated thread
+"""
+
+import os
+import asyncio
+import threading
+import concurrent.futures
+from typing import Any, Dict, Optional, Coroutine, AsyncIterator, Iterator
+
+
+class AsyncLoopRunner:
+    """
+    Owns a single event loop running forever in a background thread.
+
+    Flask request threads submit coroutines to it instead of calling
+    asyncio.run() per request, so every chat shares the same loop, the
+    same pooled HTTP connections and the same in-process caches.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or int(os.environ.get('PKN_LOOP_WORKERS', 16))
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+        self.stats = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'in_flight': 0,
+            'stalled_streams': 0
+        }
+
+    def start(self) -> asyncio.AbstractEventLoop:
+        """Start the loop thread (idempotent) and return the loop"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return self.loop
+
+            self._ready.clear()
+            self._thread = threading.Thread(
+                target=self._run_loop,
+                name='pkn-event-loop',
+                daemon=True
+            )
+            self._thread.start()
+
+        self._ready.wait()
+        return self.loop
+
+    def _run_loop(self):
+        """Thread target: create the loop and run it until stopped"""
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+
+        # Blocking work offloaded with asyncio.to_thread() runs here
+        loop.set_default_executor(concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix='pkn-worker'
+        ))
+
+        self.loop = loop
+        self._ready.set()
+
+        try:
+            loop.run_forever()
+        finally:
+            try:
+                # Pools must be closed on the loop that owns them, before it closes
+                from llm_http import llm_http_pool
+                loop.run_until_complete(llm_http_pool.close())
+            except Exception as e:
+                print(f"Warning: Failed to close HTTP pools: {e}")
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.run_until_complete(loop.shutdown_default_executor())
+            loop.close()
+
+    def in_loop_thread(self) -> bool:
+        """True when called from the runner's own thread"""
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, coro: Coroutine) -> concurrent.futures.Future:
+        """
+        Schedule a coroutine on the shared loop.
+
+        Args:
+            coro: Coroutine to run
+
+        Returns:
+            concurrent.futures.Future resolving to the coroutine's result
+        """
+        loop = self.start()
+        future = asyncio.run_coroutine_threadsafe(coro, loop)
+
+        with self._lock:
+            self.stats['submitted'] += 1
+            self.stats['in_flight'] += 1
+        future.add_done_callback(self._on_done)
+
+        return future
+
+    def _on_done(self, future: concurrent.futures.Future):
+        """Bookkeeping for finished submissions"""
+        failed = future.cancelled() or not isinstance(future.exception(), (type(None), StopAsyncIteration))
+        with self._lock:
+            self.stats['in_flight'] -= 1
+            self.stats['failed' if failed else 'completed'] += 1
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """
+        Run a coroutine on the shared loop and block the calling thread for its result.
+
+        Args:
+            coro: Coroutine to run
+            timeout: Optional seconds to wait before cancelling
+
+        Returns:
+            The coroutine's result (exceptions are re-raised)
+        """
+        if self.in_loop_thread():
+            raise RuntimeError("AsyncLoopRunner.run() called from inside the event loop; use await instead")
+
+        future = self.submit(coro)
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def iterate(self, async_gen: AsyncIterator, max_buffer: Optional[int] = None,
+                stall_timeout: Optional[float] = None) -> Iterator:
+        """
+        Consume an async generator from a synchronous thread (e.g. a Flask SSE response).
+
+        The generator is pumped by a task on the shared loop into a bounded
+        buffer. When the buffer is full the producer waits (backpressure);
+        if the consumer stalls for longer than stall_timeout the producer is
+        cancelled so a slow client cannot keep a backend generation running.
+
+        Args:
+            async_gen: Async generator to drive on the shared loop
+            max_buffer: Maximum buffered items (default: PKN_STREAM_BUFFER or 64)
+            stall_timeout: Seconds to wait for buffer space (default: PKN_STREAM_STALL_TIMEOUT or 30)
+
+        Yields:
+            Items produced by the async generator
+        """
+        max_buffer = max_buffer or int(os.environ.get('PKN_STREAM_BUFFER', 64))
+        stall_timeout = stall_timeout or float(os.environ.get('PKN_STREAM_STALL_TIMEOUT', 30))
+        loop = self.start()
+        done = object()
+
+        async def _make_queue():
+            return asyncio.Queue(maxsize=max_buffer)
+
+        queue = self.run(_make_queue())
+
+        def _put_final(item):
+            # The consumer may be gone or stalled: make room instead of waiting
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(item)
+
+        async def _pump():
+            try:
+                async for item in async_gen:
+                    await asyncio.wait_for(queue.put(item), timeout=stall_timeout)
+                await asyncio.wait_for(queue.put(done), timeout=stall_timeout)
+            except asyncio.TimeoutError:
+                with self._lock:
+                    self.stats['stalled_streams'] += 1
+                _put_final(TimeoutError(f"Stream consumer stalled for more than {stall_timeout}s"))
+            except Exception as e:
+                _put_final(e)
+            finally:
+                await async_gen.aclose()
+
+        pump = self.submit(_pump())
+
+        try:
+            while True:
+                item = asyncio.run_coroutine_threadsafe(queue.get(), loop).result()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # Client disconnected or stream finished: stop producing
+            pump.cancel()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the loop thread (its shared HTTP pools are closed on the way out)"""
+        if not self._thread or not self._thread.is_alive():
+            return
+
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=timeout)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get loop runner statistics"""
+        return {
+            **self.stats,
+            'running': bool(self._thread and self._thread.is_alive()),
+            'max_workers': self.max_workers
+        }
+
+
+# Global instance shared by all server routes
+async_runner = AsyncLoopRunner()
+
+
+if __name__ == '__main__':
+    # Test the loop runner
+    import time
+
+    print("=" * 60)
+    print("ASYNC LOOP RUNNER TEST")
+    print("=" * 60)
+
+    async def sleepy(n):
+        await asyncio.sleep(0.2)
+        return n * 2
+
+    async def counter(n):
+        for i in range(n):
+            await asyncio.sleep(0.01)
+            yield i
+
+    start = time.time()
+    futures = [async_runner.submit(sleepy(i)) for i in range(10)]
+    results = [f.result() for f in futures]
+    print(f"10 concurrent tasks: {results} in {time.time() - start:.2f}s")
+
+    print(f"Iterated: {list(async_runner.iterate(counter(5)))}")
+    print(f"Stats: {async_runner.get_stats()}")
+
+    async_runner.stop()
+    print("=" * 60)
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Backend Request Scheduler
+Per-endpoint admission control with concurrency limits, priorities and fair queuing
+"""
+
+import os
+import json
+import time
+import asyncio
+import threading
+import contextlib
+import contextvars
+from enum import IntEnum
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional
+from urllib.parse import urlsplit
+
+from llm_http import llm_http_pool
+
+
+class RequestPriority(IntEnum):
+    """Priority classes (lower value is served first)"""
+    INTERACTIVE = 0    # User is waiting on a chat reply
+    AUTOCOMPLETE = 1   # Editor suggestions
+    DELEGATION = 2     # Agent-to-agent subtasks, plan steps
+    BACKGROUND = 3     # Indexing, summaries, other deferred work
+
+
+# Priority of LLM calls made from the current task (set by entry points, read by the scheduler)
+current_priority: contextvars.ContextVar = contextvars.ContextVar(
+    'pkn_request_priority', default=RequestPriority.INTERACTIVE
+)
+
+
+class BackendOverloaded(Exception):
+    """Raised when a backend sheds a request (queue full or wait too long); maps to HTTP 503"""
+
+    def __init__(self, backend: str, reason: str, retry_after: float):
+        super().__init__(f"Backend {backend} overloaded: {reason}")
+        self.backend = backend
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@dataclass
+class _Waiter:
+    future: asyncio.Future
+    priority: RequestPriority
+    session: str
+    enqueued_at: float
+    state: str = 'queued'  # queued | granted | shed
+
+
+@dataclass
+class _BackendState:
+    """Admission state for one backend origin"""
+    max_concurrency: int
+    max_queue: int
+    active: int = 0
+    # One round-robin ring of sessions per priority: {priority: {session: deque[_Waiter]}}
+    queues: Dict[RequestPriority, OrderedDict] = field(
+        default_factory=lambda: {priority: OrderedDict() for priority in RequestPriority}
+    )
+    queued: int = 0
+    stats: Dict[str, Any] = field(default_factory=lambda: {
+        'admitted': 0,
+        'queued_total': 0,
+        'shed': 0,
+        'timeouts': 0,
+        'max_queue_depth': 0,
+        'total_wait_ms': 0.0
+    })
+
+
+class BackendScheduler:
+    """
+    Admission control in front of each LLM backend.
+
+    Every request to an endpoint takes one of its slots; at most
+    max_concurrency run at once (the pool's connection limit, resized on first
+    use to the slot count a llama.cpp server reports). Waiting requests are
+    served strictly by priority class and, within a class, round-robin
+    across sessions so one chatty session can't starve the others. When the
+    queue is full the lowest-priority waiter is shed (or the newcomer, if it
+    ranks lowest), and waits longer than max_wait are shed too, both with
+    BackendOverloaded so the server can answer 503.
+    """
+
+    def __init__(self, http_pool=None, max_queue: Optional[int] = None, max_wait: Optional[float] = None):
+        self.http_pool = http_pool or llm_http_pool
+        self.default_max_queue = max_queue or int(os.environ.get('PKN_BACKEND_MAX_QUEUE', 64))
+        self.max_wait = max_wait or float(os.environ.get('PKN_BACKEND_MAX_WAIT', 60))
+        self.enabled = os.environ.get('PKN_BACKEND_SCHEDULER', '1') != '0'
+
+        self._backends: Dict[str, _BackendState] = {}
+        self._lock = threading.Lock()
+        self._sized = set()  # Origins whose concurrency was configured or discovered
+
+    def _origin(self, url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def configure_backend(self, url: str, max_concurrency: Optional[int] = None,
+                          max_queue: Optional[int] = None) -> Dict[str, int]:
+        """
+        Set the concurrency limit and queue bound for a backend.
+
+        Args:
+            url: Any URL on the backend (path is ignored)
+            max_concurrency: Requests allowed to run at once (the server's --parallel slots)
+            max_queue: Requests allowed to wait before shedding
+
+        Returns:
+            The resulting limits
+        """
+        state = self._state(url)
+        with self._lock:
+            if max_concurrency:
+                self._sized.add(self._origin(url))
+                state.max_concurrency = max_concurrency
+            if max_queue:
+                state.max_queue = max_queue
+            self._dispatch(state)
+        return {'max_concurrency': state.max_concurrency, 'max_queue': state.max_queue}
+
+    def _state(self, url: str) -> _BackendState:
+        origin = self._origin(url)
+        with self._lock:
+            state = self._backends.get(origin)
+            if state is None:
+                state = _BackendState(
+                    max_concurrency=self.http_pool.get_endpoint_config(origin).max_connections,
+                    max_queue=self.default_max_queue
+                )
+                self._backends[origin] = state
+            return state
+
+    @contextlib.asynccontextmanager
+    async def slot(self, url: str, session: Optional[str] = None,
+                   priority: Optional[RequestPriority] = None):
+        """
+        Hold one of the backend's slots for the duration of the block.
+
+        Args:
+            url: Request URL (the slot belongs to its origin)
+            session: Session/conversation key for fair queuing
+            priority: Priority class (default: current_priority of the calling task)
+
+        Raises:
+            BackendOverloaded: The request was shed
+        """
+        if not self.enabled:
+            yield
+            return
+
+        priority = RequestPriority(priority if priority is not None else current_priority.get())
+        await self._discover(url)
+        state = self._state(url)
+        await self._acquire(state, url, session or '', priority)
+        try:
+            yield
+        finally:
+            self._release(state)
+
+    async def _discover(self, url: str):
+        """Size a backend from the slot count it reports, the first time it is used"""
+        origin = self._origin(url)
+        if origin in self._sized:
+            return
+        # Concurrent first requests all wait here for the same probe (no one bypasses the limit)
+        slots = await self.http_pool.discover_slots(origin)
+        if origin in self._sized:
+            return  # Sized by another caller (or configure_backend) meanwhile
+        self._sized.add(origin)
+        if slots:
+            self.configure_backend(origin, max_concurrency=self.http_pool.get_endpoint_config(origin).max_connections)
+
+    async def _acquire(self, state: _BackendState, url: str, session: str, priority: RequestPriority):
+        loop = asyncio.get_running_loop()
+
+        with self._lock:
+            if state.active < state.max_concurrency and state.queued == 0:
+                state.active += 1
+                state.stats['admitted'] += 1
+                return
+
+            if state.queued >= state.max_queue:
+                victim = self._lowest_waiter(state)
+                if victim is None or victim.priority <= priority:
+                    state.stats['shed'] += 1
+                    raise BackendOverloaded(self._origin(url), 'queue full', self._retry_after(state))
+                # Make room by shedding the least important waiter
+                self._remove_waiter(state, victim)
+                victim.state = 'shed'
+                state.stats['shed'] += 1
+                self._settle(victim.future, BackendOverloaded(
+                    self._origin(url), 'displaced by higher priority work', self._retry_after(state)))
+
+            waiter = _Waiter(loop.create_future(), priority, session, time.time())
+            state.queues[priority].setdefault(session, deque()).append(waiter)
+            state.queued += 1
+            state.stats['queued_total'] += 1
+            state.stats['max_queue_depth'] = max(state.stats['max_queue_depth'], state.queued)
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            with self._lock:
+                if waiter.state == 'queued':
+                    self._remove_waiter(state, waiter)
+                    waiter.state = 'shed'
+                    state.stats['timeouts'] += 1
+            if waiter.state == 'granted':
+                # Slot arrived just as the deadline passed; keep it
+                return
+            raise BackendOverloaded(self._origin(url), f'waited over {self.max_wait:.0f}s', self._retry_after(state))
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.state == 'queued':
+                    self._remove_waiter(state, waiter)
+                    waiter.state = 'shed'
+            if waiter.state == 'granted':
+                self._release(state)
+            raise
+
+        with self._lock:
+            state.stats['total_wait_ms'] += (time.time() - waiter.enqueued_at) * 1000
+
+    def _release(self, state: _BackendState):
+        with self._lock:
+            state.active -= 1
+            self._dispatch(state)
+
+    def _dispatch(self, state: _BackendState):
+        """Hand free slots to waiters: highest priority first, round-robin across sessions (lock held)"""
+        while state.active < state.max_concurrency and state.queued:
+            waiter = self._next_waiter(state)
+            if waiter is None:
+                break
+            state.active += 1
+            state.stats['admitted'] += 1
+            waiter.state = 'granted'
+            self._settle(waiter.future, None)
+
+    def _next_waiter(self, state: _BackendState) -> Optional[_Waiter]:
+        for priority in RequestPriority:
+            ring = state.queues[priority]
+            while ring:
+                session, waiters = next(iter(ring.items()))
+                waiter = waiters.popleft()
+                state.queued -= 1
+                # Session goes to the back of the ring (or leaves it when drained)
+                del ring[session]
+                if waiters:
+                    ring[session] = waiters
+                if waiter.state == 'queued':
+                    return waiter
+        return None
+
+    def _lowest_waiter(self, state: _BackendState) -> Optional[_Waiter]:
+        """Most recently queued waiter of the lowest priority class"""
+        for priority in reversed(RequestPriority):
+            ring = state.queues[priority]
+            if ring:
+                return next(reversed(ring.values()))[-1]
+        return None
+
+    def _remove_waiter(self, state: _BackendState, waiter: _Waiter):
+        """Take a still-queued waiter out of its session's queue (lock held)"""
+        waiters = state.queues[waiter.priority][waiter.session]
+        waiters.remove(waiter)
+        state.queued -= 1
+        if not waiters:
+            del state.queues[waiter.priority][waiter.session]
+
+    def _settle(self, future: asyncio.Future, error: Optional[Exception]):
+        """Resolve a waiter's future on its own loop"""
+        def _set():
+            if future.done():
+                return
+            if error is None:
+                future.set_result(True)
+            else:
+                future.set_exception(error)
+        future.get_loop().call_soon_threadsafe(_set)
+
+    def _retry_after(self, state: _BackendState) -> float:
+        """Rough seconds until a slot frees up, for Retry-After"""
+        return max(1.0, min(self.max_wait, state.queued / max(state.max_concurrency, 1) * 5))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth, running requests and counters per backend"""
+        with self._lock:
+            backends = {}
+            for origin, state in self._backends.items():
+                waited = max(state.stats['queued_total'] - state.stats['timeouts'], 1)
+                backends[origin] = {
+                    'max_concurrency': state.max_concurrency,
+                    'max_queue': state.max_queue,
+                    'active': state.active,
+                    'queued': state.queued,
+                    'queued_by_priority': {
+                        priority.name.lower(): sum(len(w) for w in state.queues[priority].values())
+                        for priority in RequestPriority
+                    },
+                    **{k: v for k, v in state.stats.items() if k != 'total_wait_ms'},
+                    'avg_wait_ms': state.stats['total_wait_ms'] / waited
+                }
+
+        return {'enabled': self.enabled, 'max_wait': self.max_wait, 'backends': backends}
+
+
+# Global instance shared by all agents
+backend_scheduler = BackendScheduler()
+
+
+if __name__ == '__main__':
+    # Simulate a 2-slot backend under mixed load
+    print("=" * 60)
+    print("BACKEND SCHEDULER TEST")
+    print("=" * 60)
+
+    async def main():
+        scheduler = BackendScheduler(max_queue=4, max_wait=5)
+        url = 'http://127.0.0.1:9999/v1/chat/completions'
+        scheduler.configure_backend(url, max_concurrency=2)
+        order = []
+
+        async def request(name, priority, session, duration=0.1):
+            try:
+                async with scheduler.slot(url, session, priority):
+                    order.append(name)
+                    await asyncio.sleep(duration)
+            except BackendOverloaded as e:
+                order.append(f"{name}:503")
+
+        tasks = [asyncio.ensure_future(request('warm1', RequestPriority.INTERACTIVE, 'a')),
+                 asyncio.ensure_future(request('warm2', RequestPriority.INTERACTIVE, 'a'))]
+        await asyncio.sleep(0.01)
+        for i in range(3):
+            tasks.append(asyncio.ensure_future(request(f'bg{i}', RequestPriority.BACKGROUND, 'idx')))
+        for i in range(2):
+            tasks.append(asyncio.ensure_future(request(f'a{i}', RequestPriority.INTERACTIVE, 'a')))
+        tasks.append(asyncio.ensure_future(request('b0', RequestPriority.INTERACTIVE, 'b')))
+        await asyncio.gather(*tasks)
+
+        print(f"Service order: {order}")
+        print(json.dumps(scheduler.get_stats(), indent=2))
+
+    asyncio.run(main())
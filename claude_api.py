@@ -7,6 +7,7 @@ Use this for the CONSULTANT agent when maximum intelligence is needed.
 
 import os
 import json
+import asyncio
 from typing import Dict, Any, Optional, List
 from pathlib import Path
 
@@ -92,7 +93,8 @@ class ClaudeAPI:
             # Call Claude API
             if tools:
                 # With tools
-                response = self.client.messages.create(
+                response = await asyncio.to_thread(
+                    self.client.messages.create,
                     model=model,
                     max_tokens=max_tokens,
                     temperature=temperature,
@@ -102,7 +104,8 @@ class ClaudeAPI:
                 )
             else:
                 # Without tools
-                response = self.client.messages.create(
+                response = await asyncio.to_thread(
+                    self.client.messages.create,
                     model=model,
                     max_tokens=max_tokens,
                     temperature=temperature,
@@ -173,7 +176,8 @@ class ClaudeAPI:
 
         for iteration in range(max_iterations):
             try:
-                response = self.client.messages.create(
+                response = await asyncio.to_thread(
+                    self.client.messages.create,
                     model=model,
                     max_tokens=4096,
                     system=system_prompt if system_prompt else "You are a helpful AI assistant with access to tools.",
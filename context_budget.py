@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+Context Budget for Agent Prompts
+Token counting (backend tokenizer or calibrated estimate) and per-agent prompt budgets
+"""
+
+import os
+import re
+import time
+import hashlib
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+from urllib.parse import urlsplit
+
+from llm_http import llm_http_pool
+
+
+# Tool results as appended by AgentManager._append_tool_turn
+TOOL_RESULT_PREFIX = "TOOL RESULT"
+COMPRESSED_MARKER = "[compressed]"
+
+# Chat templates add a few tokens of framing per message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class TokenCounter:
+    """
+    Counts tokens the way the backend will.
+
+    llama.cpp exposes POST /tokenize, which is exact and cheap; results are
+    cached by content hash, so an append-only conversation only tokenizes
+    each new message once. Backends without a tokenizer (Ollama, cloud APIs)
+    get a chars-per-token estimate, calibrated from every exact count we have
+    seen for that endpoint.
+    """
+
+    def __init__(self, http_pool=None, chars_per_token: Optional[float] = None,
+                 max_entries: int = 4096):
+        self.http_pool = http_pool or llm_http_pool
+        self.default_chars_per_token = chars_per_token or float(os.environ.get('PKN_CHARS_PER_TOKEN', 3.5))
+        self.max_entries = max_entries
+        self.retry_unsupported = 300  # Seconds before asking a tokenizer-less endpoint again
+
+        self._counts: OrderedDict = OrderedDict()  # {(origin, sha1): tokens}
+        self._ratios: Dict[str, float] = {}  # {origin: chars per token}
+        self._unsupported: Dict[str, float] = {}  # {origin: retry_at}
+        self._lock = threading.Lock()
+        self.stats = {'exact': 0, 'estimated': 0, 'cache_hits': 0, 'tokenize_errors': 0}
+
+    def _origin(self, endpoint: Optional[str]) -> str:
+        if not endpoint:
+            return ''
+        parts = urlsplit(endpoint)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def estimate(self, text: str, endpoint: Optional[str] = None) -> int:
+        """Approximate token count using the endpoint's calibrated chars/token ratio"""
+        if not text:
+            return 0
+        ratio = self._ratios.get(self._origin(endpoint), self.default_chars_per_token)
+        return max(1, int(len(text) / ratio + 0.5))
+
+    def chars_for(self, tokens: int, endpoint: Optional[str] = None) -> int:
+        """Approximate number of characters that make up `tokens` tokens"""
+        return int(tokens * self._ratios.get(self._origin(endpoint), self.default_chars_per_token))
+
+    async def count(self, text: str, endpoint: Optional[str] = None, model: Optional[str] = None) -> int:
+        """
+        Count tokens in text.
+
+        Args:
+            text: Text to count
+            endpoint: Backend base URL (its /tokenize is used when available)
+            model: Model identifier (Ollama and cloud models are always estimated)
+
+        Returns:
+            Token count (exact when the backend could tokenize it)
+        """
+        if not text:
+            return 0
+
+        origin = self._origin(endpoint)
+        key = (origin, hashlib.sha1(text.encode('utf-8', 'replace')).hexdigest())
+        with self._lock:
+            tokens = self._counts.get(key)
+            if tokens is not None:
+                self._counts.move_to_end(key)
+                self.stats['cache_hits'] += 1
+                return tokens
+
+        tokens = None
+        if origin and not (model or '').startswith('ollama:') and self._unsupported.get(origin, 0) <= time.time():
+            try:
+                data = await self.http_pool.post_json(f"{origin}/tokenize", {'content': text}, timeout=10)
+                tokens = len(data['tokens'])
+                self._calibrate(origin, len(text), tokens)
+                self.stats['exact'] += 1
+            except Exception:
+                self.stats['tokenize_errors'] += 1
+                self._unsupported[origin] = time.time() + self.retry_unsupported
+
+        if tokens is None:
+            tokens = self.estimate(text, endpoint)
+            self.stats['estimated'] += 1
+
+        with self._lock:
+            self._counts[key] = tokens
+            while len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+        return tokens
+
+    def _calibrate(self, origin: str, chars: int, tokens: int):
+        """Blend an exact measurement into the endpoint's chars/token ratio"""
+        if chars < 64 or tokens == 0:
+            return
+        sample = chars / tokens
+        current = self._ratios.get(origin)
+        self._ratios[origin] = sample if current is None else current * 0.8 + sample * 0.2
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'cached_counts': len(self._counts),
+            'chars_per_token': {origin: round(ratio, 2) for origin, ratio in self._ratios.items()}
+        }
+
+
+class ContextBudget:
+    """
+    Keeps ReAct conversations inside an agent's context budget.
+
+    Two levers, applied in order:
+      1. Every tool result is capped when it is appended (a share of the
+         budget). The full output is written to memory/tool_outputs/ and the
+         prompt keeps its head and tail plus a pointer for read_file.
+      2. Before each LLM call, if the conversation is over budget, older
+         tool results are compressed to a short excerpt + pointer, oldest
+         first, then (if still needed) whole old tool turns are dropped.
+
+    Compression is sticky and overshoots to a lower target, so the message
+    prefix changes rarely and the backend's prompt cache stays useful;
+    prompt size (and prompt eval time) stays bounded across iterations.
+
+    Spill files are written by a background thread (the pointer is known up
+    front), which also prunes memory/tool_outputs/ by age and total size.
+    """
+
+    def __init__(self, project_root: str = "/home/gh0st/pkn", counter: Optional[TokenCounter] = None,
+                 default_budget: Optional[int] = None, reserve_tokens: Optional[int] = None,
+                 result_share: Optional[float] = None):
+        self.project_root = Path(project_root)
+        self.counter = counter or token_counter
+        self.default_budget = default_budget or int(os.environ.get('PKN_CONTEXT_BUDGET', 8192))
+        self.reserve_tokens = reserve_tokens or int(os.environ.get('PKN_CONTEXT_RESERVE', 1024))
+        self.result_share = result_share or float(os.environ.get('PKN_TOOL_RESULT_SHARE', 0.25))
+        self.compress_target = 0.75  # Fraction of the prompt limit to compress down to
+        self.compressed_chars = 400  # Excerpt kept from a compressed tool result
+
+        self.outputs_dir = self.project_root / "memory" / "tool_outputs"
+        self.outputs_max_bytes = int(float(os.environ.get('PKN_TOOL_OUTPUTS_MB', 256)) * 1024 * 1024)
+        self.outputs_max_age = float(os.environ.get('PKN_TOOL_OUTPUTS_DAYS', 7)) * 86400
+        self.prune_interval = 60  # Seconds between directory scans
+        self._pruned_at = 0.0
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tool-outputs")
+
+        self.stats = {
+            'fits': 0,
+            'results_truncated': 0,
+            'results_compressed': 0,
+            'turns_dropped': 0,
+            'over_budget': 0,
+            'max_prompt_tokens': 0,
+            'outputs_written': 0,
+            'outputs_pruned': 0
+        }
+
+    def prompt_limit(self, budget: int) -> int:
+        """Tokens available to the prompt once the reply reserve is set aside"""
+        return max(budget - self.reserve_tokens, budget // 2)
+
+    def _spill(self, tool_name: str, text: str) -> str:
+        """Queue a full tool output for writing; returns its path relative to the project root"""
+        digest = hashlib.sha1(text.encode('utf-8', 'replace')).hexdigest()[:12]
+        safe_name = re.sub(r'[^\w.-]', '_', tool_name or 'tool')
+        path = self.outputs_dir / f"{safe_name}_{digest}.txt"
+        self._writer.submit(self._write_output, path, text)
+        return str(path.relative_to(self.project_root))
+
+    def _write_output(self, path: Path, text: str):
+        """Write one spill file (writer thread), pruning the directory now and then"""
+        try:
+            if path.exists():
+                os.utime(path)  # Referenced again; keep it as long as a fresh one
+            else:
+                self.outputs_dir.mkdir(parents=True, exist_ok=True)
+                partial = path.with_suffix('.tmp')
+                partial.write_text(text, encoding='utf-8')
+                os.replace(partial, path)  # read_file never sees half a file
+                self.stats['outputs_written'] += 1
+        except OSError as e:
+            print(f"Warning: Failed to save tool output {path.name}: {e}")
+
+        if time.time() - self._pruned_at >= self.prune_interval:
+            self.prune_outputs()
+
+    def prune_outputs(self) -> int:
+        """
+        Delete spilled outputs older than PKN_TOOL_OUTPUTS_DAYS, then the oldest
+        ones until the directory is under PKN_TOOL_OUTPUTS_MB.
+
+        Returns:
+            Number of files removed
+        """
+        self._pruned_at = time.time()
+        try:
+            files = []
+            for path in self.outputs_dir.glob('*.txt'):
+                st = path.stat()
+                files.append((st.st_mtime, st.st_size, path))
+        except OSError:
+            return 0
+
+        files.sort()  # Oldest first
+        total = sum(size for _, size, _ in files)
+        cutoff = time.time() - self.outputs_max_age
+        removed = 0
+        for mtime, size, path in files:
+            if mtime >= cutoff and total <= self.outputs_max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+
+        self.stats['outputs_pruned'] += removed
+        return removed
+
+    def flush(self):
+        """Block until queued spill files are written"""
+        self._writer.submit(lambda: None).result()
+
+    def _pointer(self, pointer: str, text: str) -> str:
+        lines = text.count('\n') + 1
+        return (f"[Full output ({len(text)} chars, {lines} lines) saved to {pointer}; "
+                f"use read_file with offset/limit to see more]")
+
+    def cap_tool_result(self, tool_name: str, result: Any, budget: Optional[int] = None,
+                        endpoint: Optional[str] = None) -> str:
+        """
+        Truncate one tool result to its share of the budget.
+
+        Args:
+            tool_name: Tool that produced the result (names the spill file)
+            result: Tool output
+            budget: Agent's context budget in tokens
+            endpoint: Backend base URL (for the chars/token ratio)
+
+        Returns:
+            The result, or its head and tail with a pointer to the full output
+        """
+        text = str(result)
+        max_tokens = int((budget or self.default_budget) * self.result_share)
+        if self.counter.estimate(text, endpoint) <= max_tokens:
+            return text
+
+        max_chars = self.counter.chars_for(max_tokens, endpoint)
+        pointer = self._pointer(self._spill(tool_name, text), text)
+
+        # Keep whole lines from both ends; the middle is what the pointer is for
+        head = text[:int(max_chars * 0.7)].rsplit('\n', 1)[0]
+        tail = text[len(text) - int(max_chars * 0.2):].split('\n', 1)[-1]
+        self.stats['results_truncated'] += 1
+        return f"{head}\n…\n{pointer}\n…\n{tail}"
+
+    def _compress(self, content: str) -> str:
+        """Shrink a tool-result message to an excerpt per result plus pointers"""
+        sections = re.split(r'(?m)^(?=TOOL RESULT)', content)
+        compressed = []
+        for section in sections:
+            if not section.strip():
+                continue
+            header, _, body = section.partition('\n')
+            # Results truncated on the way in already point at their full output
+            existing = re.search(r'\[Full output [^\]]*\]', body)
+            if existing:
+                pointer = existing.group(0)
+            else:
+                tool_name = re.search(r'\((\w+)\)', header)
+                pointer = self._pointer(self._spill(tool_name.group(1) if tool_name else 'tool', body), body)
+            excerpt = body[:self.compressed_chars].rsplit('\n', 1)[0] if len(body) > self.compressed_chars else body
+            compressed.append(f"{header} {COMPRESSED_MARKER}\n{excerpt}\n…\n{pointer}")
+        return "\n\n".join(compressed)
+
+    async def fit(self, messages: List[Dict[str, str]], budget: Optional[int] = None,
+                  endpoint: Optional[str] = None, model: Optional[str] = None,
+                  protected: int = 2) -> Dict[str, Any]:
+        """
+        Bring a ReAct conversation under budget, editing `messages` in place.
+
+        The leading `protected` messages (system prompt, history, task) and the
+        latest turn are never touched.
+
+        Args:
+            messages: Conversation (protected prefix, then assistant/tool-result pairs)
+            budget: Agent's context budget in tokens
+            endpoint: Backend base URL (for exact token counts)
+            model: Model identifier
+            protected: Number of leading messages to leave alone
+
+        Returns:
+            {'prompt_tokens': int, 'limit': int, 'compressed': int, 'dropped': int}
+        """
+        limit = self.prompt_limit(budget or self.default_budget)
+        counts = [await self.counter.count(m.get('content') or '', endpoint, model) + MESSAGE_OVERHEAD_TOKENS
+                  for m in messages]
+        total = sum(counts)
+        compressed = dropped = 0
+        self.stats['fits'] += 1
+
+        if total > limit:
+            target = int(limit * self.compress_target)
+
+            # Oldest tool results first; the latest one is what the model is reasoning about
+            for i in range(protected, len(messages) - 1):
+                if total <= target:
+                    break
+                content = messages[i].get('content') or ''
+                if messages[i].get('role') != 'user' or not content.startswith(TOOL_RESULT_PREFIX) \
+                        or COMPRESSED_MARKER in content.split('\n', 1)[0]:
+                    continue
+                new_content = self._compress(content)
+                new_count = await self.counter.count(new_content, endpoint, model) + MESSAGE_OVERHEAD_TOKENS
+                if new_count >= counts[i]:
+                    continue
+                messages[i] = {**messages[i], 'content': new_content}
+                total -= counts[i] - new_count
+                counts[i] = new_count
+                compressed += 1
+
+            # Still over: drop whole assistant/tool-result turns, oldest first
+            while total > limit and len(messages) > protected + 2:
+                total -= counts[protected] + counts[protected + 1]
+                del messages[protected:protected + 2]
+                del counts[protected:protected + 2]
+                dropped += 1
+
+            if total > limit:
+                self.stats['over_budget'] += 1
+
+        self.stats['results_compressed'] += compressed
+        self.stats['turns_dropped'] += dropped
+        self.stats['max_prompt_tokens'] = max(self.stats['max_prompt_tokens'], total)
+        return {'prompt_tokens': total, 'limit': limit, 'compressed': compressed, 'dropped': dropped}
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'default_budget': self.default_budget,
+            'reserve_tokens': self.reserve_tokens,
+            'tokens': self.counter.get_stats()
+        }
+
+
+# Global counter shared by all agents (per-endpoint calibration and count cache)
+token_counter = TokenCounter()
+
+
+if __name__ == '__main__':
+    import json
+    import asyncio
+    import tempfile
+
+    print("=" * 60)
+    print("CONTEXT BUDGET TEST")
+    print("=" * 60)
+
+    async def main():
+        budget = ContextBudget(tempfile.mkdtemp(), counter=TokenCounter(), default_budget=4096,
+                               reserve_tokens=512)
+        messages = [
+            {'role': 'system', 'content': 'You are a coding agent with tools. ' * 40},
+            {'role': 'user', 'content': 'Summarize the docs and the source.'}
+        ]
+
+        page = "\n".join(f"line {n}: " + "lorem ipsum dolor sit amet " * 6 for n in range(400))
+        for iteration in range(5):
+            stats = await budget.fit(messages, endpoint=None)
+            print(f"Iteration {iteration}: prompt {stats['prompt_tokens']:>5}/{stats['limit']} tokens "
+                  f"(compressed {stats['compressed']}, dropped {stats['dropped']})")
+            messages.append({'role': 'assistant', 'content': f'TOOL: fetch_url\nARGS: {{"url": "doc{iteration}"}}'})
+            messages.append({'role': 'user', 'content': "TOOL RESULT:\n" + budget.cap_tool_result(
+                'fetch_url', f"doc{iteration}\n{page}")})
+
+        budget.flush()
+        print(json.dumps(budget.get_stats(), indent=2))
+
+        # Size cap: keep only what fits in ~1.5 spill files
+        spilled = sorted(budget.outputs_dir.glob('*.txt'))
+        budget.outputs_max_bytes = int(spilled[0].stat().st_size * 1.5)
+        print(f"Pruned {budget.prune_outputs()} of {len(spilled)} spill files to fit "
+              f"{budget.outputs_max_bytes} bytes")
+
+    asyncio.run(main())
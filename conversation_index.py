@@ -0,0 +1,522 @@
+#!/usr/bin/env python3
+"""
+Conversation Search Index
+Embeds completed exchanges in the background and searches them across sessions
+"""
+
+import os
+import json
+import time
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+
+# Each side of an exchange is clipped to this many characters before embedding
+MAX_EXCHANGE_CHARS = 2000
+
+# Vectors read per request when loading the index from the collection
+LOAD_PAGE_SIZE = 5000
+
+
+class ConversationIndex:
+    """
+    Semantic search over every stored conversation.
+
+    Completed exchanges (an assistant reply and the user message before
+    it) are read from ConversationMemory's database by a worker thread,
+    embedded in batches with RAGMemory's shared encoder and upserted into
+    its persistent conversation collection. Replies never wait on
+    embedding: ConversationMemory only notifies the worker that new
+    messages exist. The worker resumes from the last indexed message id, so
+    exchanges stored while it was down (or before the index existed) are
+    backfilled on start. When ConversationMemory deletes sessions, the same
+    worker removes their vectors from the collection and the matrix.
+
+    The vectors are also kept in memory as one normalized matrix with
+    per-row session, agent and time columns. A search is a single matrix
+    product with the filters applied as masks, so it is exact and stays
+    fast however selective the filters are. Until that matrix is loaded (or
+    without numpy/an encoder) searches go to the collection instead.
+    """
+
+    def __init__(self, rag_memory, project_root: str = "/home/gh0st/pkn", memory=None,
+                 batch_size: Optional[int] = None, flush_seconds: Optional[float] = None):
+        """
+        Args:
+            rag_memory: RAGMemory whose conversation collection and encoder are used
+            project_root: Project root; the indexing watermark lives in memory/
+            memory: ConversationMemory (default: the global instance, imported on start)
+            batch_size: Exchanges per embedding batch
+            flush_seconds: Longest a stored exchange waits before it is indexed
+        """
+        self.rag_memory = rag_memory
+        self.memory = memory
+        self.enabled = os.environ.get('PKN_CONVERSATION_INDEX', '1') != '0'
+        self.available = self.enabled and rag_memory is not None and \
+            getattr(rag_memory, 'conversation_collection', None) is not None
+        self.encoder = getattr(rag_memory, 'encoder', None)
+        self.batch_size = batch_size or int(os.environ.get('PKN_INDEX_BATCH', 32))
+        self.flush_seconds = flush_seconds or float(os.environ.get('PKN_INDEX_FLUSH_SECONDS', 2.0))
+
+        self.state_file = Path(project_root) / "memory" / "conversation_index.json"
+        self.indexed_id = self._load_watermark()
+
+        self._pending = 0
+        self._deleted: List[str] = []  # Sessions whose vectors are waiting to be removed
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+        # In-memory matrix: rows [0, _count) are live; arrays grow by doubling
+        self._matrix_lock = threading.Lock()
+        self._loaded = False
+        self._count = 0
+        self._vectors = None
+        self._message_ids = None
+        self._timestamps = None
+        self._session_codes = None
+        self._agent_codes = None
+        self._row_of: Dict[int, int] = {}  # message_id -> row
+        self._sessions: List[str] = []
+        self._session_code: Dict[str, int] = {}
+        self._agent_code: Dict[str, int] = {}
+
+        self.stats = {'indexed': 0, 'batches': 0, 'index_errors': 0, 'index_ms': 0.0,
+                      'searches': 0, 'search_ms': 0.0, 'fallback_searches': 0, 'sessions_purged': 0}
+
+    def _load_watermark(self) -> int:
+        try:
+            with open(self.state_file, 'r') as f:
+                return int(json.load(f).get('indexed_id', 0))
+        except (OSError, ValueError):
+            return 0
+
+    def _save_watermark(self):
+        try:
+            tmp = self.state_file.with_suffix('.tmp')
+            with open(tmp, 'w') as f:
+                json.dump({'indexed_id': self.indexed_id}, f)
+            os.replace(tmp, self.state_file)
+        except OSError as e:
+            print(f"Warning: Could not save conversation index state: {e}")
+
+    def start(self) -> bool:
+        """Subscribe to new messages and start the indexing worker (returns False if unavailable)"""
+        if not self.available:
+            return False
+        if self._thread is not None:
+            return True
+
+        if self.memory is None:
+            try:
+                from conversation_memory import conversation_memory
+                self.memory = conversation_memory
+            except Exception as e:
+                print(f"Warning: Conversation index unavailable: {e}")
+                self.available = False
+                return False
+
+        self.memory.add_listener(self._on_message)
+        self.memory.add_delete_listener(self._on_delete)
+        self._thread = threading.Thread(target=self._run, name='pkn-conversation-index', daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _on_message(self, session_id: str, message, total_messages: int):
+        """ConversationMemory listener: wake the worker once a batch is waiting"""
+        if message.role == 'assistant':
+            self._pending += 1
+            if self._pending >= self.batch_size:
+                self._wake.set()
+
+    def _on_delete(self, session_ids: List[str]):
+        """ConversationMemory delete listener: hand the sessions to the worker"""
+        with self._matrix_lock:
+            self._deleted.extend(session_ids)
+        self._wake.set()
+
+    def _run(self):
+        try:
+            self._load_matrix()
+        except Exception as e:
+            print(f"Warning: Could not load conversation vectors (searches use the collection): {e}")
+
+        # Backfill first, then index new exchanges every flush_seconds (or sooner if a batch fills)
+        while not self._stop.is_set():
+            try:
+                self.purge()
+                while self.flush() >= self.batch_size and not self._stop.is_set():
+                    pass
+            except Exception as e:
+                self.stats['index_errors'] += 1
+                print(f"Warning: Conversation indexing failed: {e}")
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+
+    def _load_matrix(self):
+        """Read the stored vectors from the collection into the in-memory matrix"""
+        if not NUMPY_AVAILABLE or self.encoder is None:
+            return
+
+        collection = self.rag_memory.conversation_collection
+        offset = 0
+        while True:
+            page = collection.get(include=['embeddings', 'metadatas'], limit=LOAD_PAGE_SIZE, offset=offset)
+            if not page['ids']:
+                break
+            self._append_rows(page['metadatas'], np.asarray(page['embeddings'], dtype=np.float32))
+            offset += len(page['ids'])
+        self._loaded = True
+
+    def _append_rows(self, metadatas: List[Dict[str, Any]], vectors):
+        """Add (or replace) rows in the in-memory matrix"""
+        with self._matrix_lock:
+            needed = self._count + len(metadatas)
+            if self._vectors is None or needed > len(self._vectors):
+                capacity = max(1024, needed, 2 * (len(self._vectors) if self._vectors is not None else 0))
+                self._grow(capacity, vectors.shape[1])
+
+            for metadata, vector in zip(metadatas, vectors):
+                message_id = int(metadata.get('message_id', -1))
+                row = self._row_of.get(message_id) if message_id >= 0 else None
+                if row is None:
+                    row = self._count
+                    self._count += 1
+                    if message_id >= 0:
+                        self._row_of[message_id] = row
+
+                session_id = metadata['session_id']
+                if session_id not in self._session_code:
+                    self._session_code[session_id] = len(self._sessions)
+                    self._sessions.append(session_id)
+                agent = metadata.get('agent_type') or ''
+                if agent not in self._agent_code:
+                    self._agent_code[agent] = len(self._agent_code)
+
+                self._vectors[row] = vector
+                self._message_ids[row] = message_id
+                self._timestamps[row] = metadata.get('timestamp') or 0.0
+                self._session_codes[row] = self._session_code[session_id]
+                self._agent_codes[row] = self._agent_code[agent]
+
+    def _grow(self, capacity: int, dim: int):
+        """Reallocate the matrix columns with room for capacity rows (lock held)"""
+        def resized(array, dtype, shape):
+            grown = np.zeros(shape, dtype=dtype)
+            if array is not None:
+                grown[:self._count] = array[:self._count]
+            return grown
+
+        self._vectors = resized(self._vectors, np.float32, (capacity, dim))
+        self._message_ids = resized(self._message_ids, np.int64, capacity)
+        self._timestamps = resized(self._timestamps, np.float64, capacity)
+        self._session_codes = resized(self._session_codes, np.int32, capacity)
+        self._agent_codes = resized(self._agent_codes, np.int32, capacity)
+
+    def purge(self) -> int:
+        """
+        Remove the vectors of sessions deleted since the last call.
+
+        Returns:
+            Number of sessions purged
+        """
+        with self._flush_lock:
+            with self._matrix_lock:
+                session_ids, self._deleted = self._deleted, []
+            if not session_ids:
+                return 0
+
+            result = self.rag_memory.delete_conversation_memories(session_ids)
+            if not result.get('success'):
+                with self._matrix_lock:
+                    self._deleted.extend(session_ids)  # Retried on the next pass
+                self.stats['index_errors'] += 1
+                print(f"Warning: Could not remove conversation vectors: {result.get('error')}")
+                return 0
+
+            self._drop_rows(session_ids)
+            self.stats['sessions_purged'] += len(session_ids)
+            return len(session_ids)
+
+    def _drop_rows(self, session_ids: List[str]):
+        """Remove the sessions' rows from the in-memory matrix"""
+        with self._matrix_lock:
+            codes = [self._session_code.pop(sid) for sid in session_ids if sid in self._session_code]
+            if not codes or self._vectors is None:
+                return
+
+            keep = np.flatnonzero(~np.isin(self._session_codes[:self._count], codes))
+            if len(keep) == self._count:
+                return
+
+            # Fresh arrays: searches may still be reading the old ones outside the lock
+            def compacted(array):
+                kept = np.zeros_like(array)
+                kept[:len(keep)] = array[keep]
+                return kept
+
+            self._vectors = compacted(self._vectors)
+            self._message_ids = compacted(self._message_ids)
+            self._timestamps = compacted(self._timestamps)
+            self._session_codes = compacted(self._session_codes)
+            self._agent_codes = compacted(self._agent_codes)
+            self._count = len(keep)
+            self._row_of = {message_id: row for row, message_id in enumerate(self._message_ids[:self._count].tolist())
+                            if message_id >= 0}
+
+    def flush(self) -> int:
+        """
+        Index the next batch of stored exchanges.
+
+        Returns:
+            Number of exchanges indexed (0 when caught up or on error)
+        """
+        with self._flush_lock:
+            self._pending = 0
+            exchanges = self.memory.get_exchanges(self.indexed_id, self.batch_size)
+            if not exchanges:
+                return 0
+
+            for exchange in exchanges:
+                exchange['user_message'] = exchange['user_message'][:MAX_EXCHANGE_CHARS]
+                exchange['agent_response'] = exchange['agent_response'][:MAX_EXCHANGE_CHARS]
+
+            start = time.perf_counter()
+            vectors = None
+            if self.encoder is not None:
+                docs = [self.rag_memory.conversation_document(exchange) for exchange in exchanges]
+                vectors = self.encoder.encode(docs, batch_size=len(docs), normalize_embeddings=True)
+            result = self.rag_memory.add_conversation_memories(exchanges, embeddings=vectors)
+            if not result.get('success'):
+                # Left in place; the next flush retries from the same watermark
+                self.stats['index_errors'] += 1
+                print(f"Warning: Could not index conversations: {result.get('error')}")
+                return 0
+
+            if self._loaded:
+                self._append_rows(
+                    [{**exchange, 'agent_type': exchange['agent_type'] or ''} for exchange in exchanges],
+                    np.asarray(vectors, dtype=np.float32)
+                )
+
+            self.indexed_id = exchanges[-1]['message_id']
+            self._save_watermark()
+            self.stats['indexed'] += len(exchanges)
+            self.stats['batches'] += 1
+            self.stats['index_ms'] += (time.perf_counter() - start) * 1000
+            return len(exchanges)
+
+    def search(self, query: str, k: int = 5, session_id: Optional[str] = None,
+               agent_type: Optional[str] = None, since: Optional[float] = None,
+               until: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Most similar past exchanges across sessions.
+
+        Args:
+            query: What to look for
+            k: Number of exchanges to return
+            session_id: Only this session
+            agent_type: Only exchanges answered by this agent
+            since: Only exchanges at or after this Unix time
+            until: Only exchanges at or before this Unix time
+
+        Returns:
+            {'success': bool, 'results': [{'content', 'session_id', 'agent_type', 'message_id',
+             'timestamp', 'relevance_score'}], 'search_ms': float}
+        """
+        if not self.available:
+            return {'success': False, 'error': 'Conversation index not available'}
+
+        start = time.perf_counter()
+        if self._loaded:
+            result = self._search_matrix(query, k, session_id, agent_type, since, until)
+        else:
+            self.stats['fallback_searches'] += 1
+            result = self.rag_memory.search_conversation_history(
+                query, n_results=k, session_id=session_id, agent_type=agent_type, since=since, until=until
+            )
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        result['search_ms'] = round(elapsed_ms, 2)
+
+        self.stats['searches'] += 1
+        self.stats['search_ms'] += elapsed_ms
+        return result
+
+    def _search_matrix(self, query: str, k: int, session_id: Optional[str], agent_type: Optional[str],
+                       since: Optional[float], until: Optional[float]) -> Dict[str, Any]:
+        """Exact filtered top-k over the in-memory matrix"""
+        query_vector = np.asarray(self.encoder.encode([query], normalize_embeddings=True)[0], dtype=np.float32)
+
+        with self._matrix_lock:
+            count = self._count
+            vectors, message_ids, timestamps = self._vectors, self._message_ids, self._timestamps
+            session_codes, agent_codes = self._session_codes, self._agent_codes
+            session_code = self._session_code.get(session_id, -1) if session_id else None
+            agent_code = self._agent_code.get(agent_type, -1) if agent_type else None
+            sessions = self._sessions
+        if count == 0:
+            return {'success': True, 'results': [], 'query': query}
+
+        mask = None
+        for column, keep in ((session_codes, session_code), (agent_codes, agent_code)):
+            if keep is not None:
+                selected = column[:count] == keep
+                mask = selected if mask is None else mask & selected
+        if since is not None:
+            selected = timestamps[:count] >= since
+            mask = selected if mask is None else mask & selected
+        if until is not None:
+            selected = timestamps[:count] <= until
+            mask = selected if mask is None else mask & selected
+
+        if mask is None:
+            sims = vectors[:count] @ query_vector
+            rows = np.arange(count)
+        else:
+            rows = np.flatnonzero(mask)
+            if len(rows) == 0:
+                return {'success': True, 'results': [], 'query': query}
+            # Selective filters touch only their rows; broad ones are cheaper as a full product
+            sims = vectors[rows] @ query_vector if len(rows) < count // 4 else (vectors[:count] @ query_vector)[rows]
+
+        k = min(k, len(rows))
+        top = np.argpartition(sims, -k)[-k:]
+        top = top[np.argsort(sims[top])[::-1]]
+
+        ids = [self.rag_memory.conversation_id(sessions[session_codes[rows[i]]], int(message_ids[rows[i]]))
+               for i in top]
+        stored = self.rag_memory.conversation_collection.get(ids=ids, include=['documents', 'metadatas'])
+        by_id = dict(zip(stored['ids'], zip(stored['documents'], stored['metadatas'])))
+
+        results = []
+        for doc_id, i in zip(ids, top):
+            if doc_id not in by_id:
+                continue
+            doc, metadata = by_id[doc_id]
+            results.append({
+                'content': doc,
+                'session_id': metadata['session_id'],
+                'agent_type': metadata['agent_type'],
+                'message_id': metadata.get('message_id'),
+                'timestamp': metadata.get('timestamp'),
+                'relevance_score': round(float(sims[i]), 4)
+            })
+        return {'success': True, 'results': results, 'query': query}
+
+    def get_stats(self) -> Dict[str, Any]:
+        searches = self.stats['searches']
+        batches = self.stats['batches']
+        return {
+            'available': self.available,
+            'running': self._thread is not None and self._thread.is_alive(),
+            'matrix_loaded': self._loaded,
+            'vectors': self._count,
+            'indexed_id': self.indexed_id,
+            'indexed': self.stats['indexed'],
+            'batches': batches,
+            'index_errors': self.stats['index_errors'],
+            'avg_batch_ms': round(self.stats['index_ms'] / batches, 2) if batches else 0.0,
+            'searches': searches,
+            'fallback_searches': self.stats['fallback_searches'],
+            'sessions_purged': self.stats['sessions_purged'],
+            'avg_search_ms': round(self.stats['search_ms'] / searches, 2) if searches else 0.0,
+            'batch_size': self.batch_size,
+            'flush_seconds': self.flush_seconds
+        }
+
+
+if __name__ == '__main__':
+    # Synthetic search benchmark: random unit vectors stand in for embeddings,
+    # so it runs anywhere numpy does and gives the same numbers on every run
+    import tempfile
+
+    print("=" * 60)
+    print("CONVERSATION INDEX SEARCH BENCHMARK")
+    print("=" * 60)
+
+    EXCHANGES = 100_000
+    SESSIONS = 2_000
+    DIM = 384  # all-MiniLM-L6-v2
+    AGENTS = ['coder', 'reasoner', 'general', 'researcher', 'executor']
+    rng = np.random.default_rng(0)
+
+    def unit(rows):
+        vectors = rng.standard_normal((rows, DIM)).astype(np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    class SyntheticEncoder:
+        """Deterministic vector per text"""
+        def encode(self, texts, batch_size=None, normalize_embeddings=True):
+            vectors = [np.random.default_rng(abs(hash(text)) % 2 ** 32).standard_normal(DIM) for text in texts]
+            return np.asarray([v / np.linalg.norm(v) for v in vectors], dtype=np.float32)
+
+    class SyntheticCollection:
+        """Serves documents and metadata for ids, like the chroma collection"""
+        def get(self, ids, include=None):
+            metadatas = []
+            for doc_id in ids:
+                session_id, message_id = doc_id[len('conv_'):].rsplit('_', 1)
+                metadatas.append({'session_id': session_id, 'agent_type': AGENTS[int(message_id) % len(AGENTS)],
+                                  'message_id': int(message_id), 'timestamp': float(message_id)})
+            return {'ids': ids, 'documents': [f"exchange {doc_id}" for doc_id in ids], 'metadatas': metadatas}
+
+    class SyntheticCorpus:
+        encoder = SyntheticEncoder()
+        conversation_collection = SyntheticCollection()
+        conversation_id = staticmethod(lambda session_id, message_id: f"conv_{session_id}_{message_id}")
+
+        def delete_conversation_memories(self, session_ids):
+            return {'success': True}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        (Path(tmp) / "memory").mkdir()
+        index = ConversationIndex(SyntheticCorpus(), tmp)
+
+        start = time.perf_counter()
+        message_ids = np.arange(1, EXCHANGES + 1) * 2  # Assistant replies are every other message
+        metadatas = [{'session_id': f"s{int(mid) % SESSIONS}", 'agent_type': AGENTS[int(mid) % len(AGENTS)],
+                      'message_id': int(mid), 'timestamp': float(mid)} for mid in message_ids]
+        index._append_rows(metadatas, unit(EXCHANGES))
+        index._loaded = True
+        print(f"\nLoaded {EXCHANGES:,} exchanges ({2 * EXCHANGES:,} messages, {SESSIONS:,} sessions) "
+              f"in {time.perf_counter() - start:.2f}s")
+
+        cases = [
+            ('no filter', {}),
+            ('one session', {'session_id': 's42'}),
+            ('one agent', {'agent_type': 'coder'}),
+            ('last 10% of time', {'since': float(message_ids[-EXCHANGES // 10])}),
+            ('session + agent + time', {'session_id': 's42', 'agent_type': 'general',
+                                        'since': 0.0, 'until': float(message_ids[EXCHANGES // 2])}),
+        ]
+        print(f"\n{'filter':<24}{'p50 ms':>10}{'max ms':>10}{'hits':>6}")
+        worst = 0.0
+        for name, filters in cases:
+            timings = []
+            for i in range(50):
+                result = index.search(f"query {i}", k=5, **filters)
+                timings.append(result['search_ms'])
+            timings.sort()
+            worst = max(worst, timings[-1])
+            print(f"{name:<24}{timings[len(timings) // 2]:>10.2f}{timings[-1]:>10.2f}{len(result['results']):>6}")
+
+        start = time.perf_counter()
+        index._on_delete(['s42', 's43'])
+        purged = index.purge()
+        print(f"\nPurged {purged} sessions in {(time.perf_counter() - start) * 1000:.1f} ms "
+              f"({index._count:,} vectors left)")
+        assert index.search("query", k=5, session_id='s42')['results'] == []
+
+        print(f"\n{'✓' if worst < 50 else '✗'} Slowest search {worst:.2f} ms (target < 50 ms)")
@@ -5,67 +5,317 @@ Manages conversation context, history, and session persistence
 """
 
 import os
+import sys
 import json
 import time
 import uuid
+import sqlite3
+import threading
 from pathlib import Path
-from typing import Dict, Any, List, Optional
-from collections import defaultdict
+from typing import Dict, Any, List, Optional, Callable
+from collections import defaultdict, OrderedDict
+
+from message_records import Message, NameSet
 
 
 class ConversationMemory:
     """
     Manages conversation history and context for multi-agent interactions.
-    Provides both in-memory (session) and persistent (file-based) storage.
+
+    Every session lives in a SQLite database (WAL mode) under memory/, so
+    sessions survive restarts and are loaded lazily by id. Messages are
+    append-only rows: add_message is one INSERT plus a counter UPDATE no
+    matter how long the history is. Saving a session just marks it as saved.
+
+    Sessions in use are cached in memory (self.sessions) up to a session
+    count and byte budget. The least recently used ones are evicted when
+    either is exceeded, and a background sweeper evicts sessions that have
+    been idle too long. Everything is already on disk, so eviction only
+    drops the cached copy and get_session rehydrates it transparently.
+
+    Messages are compact Message records (see message_records) and the
+    per-session agent/tool sets are bitsets, keeping long sessions small.
     """
 
-    def __init__(self, project_root: str = "/home/gh0st/pkn"):
+    def __init__(self, project_root: str = "/home/gh0st/pkn", max_sessions: Optional[int] = None,
+                 max_bytes: Optional[int] = None, idle_seconds: Optional[float] = None,
+                 sweep_interval: Optional[float] = None):
         self.project_root = Path(project_root)
         self.memory_dir = self.project_root / "memory"
         self.memory_dir.mkdir(exist_ok=True)
 
-        # Session memory (in-memory, cleared on restart)
-        self.sessions = {}  # {session_id: session_data}
+        # Session cache (LRU order, loaded from the database on demand)
+        self.sessions = OrderedDict()  # {session_id: session_data}
         self.active_files = defaultdict(set)  # {session_id: set of file paths}
-
-        # Persistent memory paths
+        self.max_sessions = max_sessions or int(os.environ.get('PKN_SESSION_CACHE_SESSIONS', 256))
+        self.max_bytes = max_bytes or int(float(os.environ.get('PKN_SESSION_CACHE_MB', 64)) * 1024 * 1024)
+        self.idle_seconds = idle_seconds or float(os.environ.get('PKN_SESSION_IDLE_SECONDS', 1800))
+        self.sweep_interval = sweep_interval if sweep_interval is not None else \
+            float(os.environ.get('PKN_SESSION_SWEEP_SECONDS', 60))
+        self._session_bytes = {}  # {session_id: approximate bytes held by the cached copy}
+        self._cached_bytes = 0
+        self.cache_stats = {'hits': 0, 'rehydrations': 0, 'evictions': 0, 'idle_evictions': 0, 'sweeps': 0}
+        self._listeners: List[Callable[[str, Message, int], None]] = []
+        self._delete_listeners: List[Callable[[List[str]], None]] = []
+
+        # Persistent storage (legacy JSON files are migrated into the database once)
+        self.db_path = self.memory_dir / "conversations.db"
         self.conversations_file = self.memory_dir / "conversations.json"
         self.workspace_file = self.memory_dir / "workspace_state.json"
+        self._lock = threading.RLock()
 
-        # Load persistent data
+        self._init_database()
+        self._migrate_json_files()
         self._load_persistent_data()
 
-    def _load_persistent_data(self):
-        """Load persistent conversation data from disk"""
+        self._stop_sweeper = threading.Event()
+        if self.sweep_interval > 0:
+            threading.Thread(target=self._sweep_loop, name='pkn-session-sweeper', daemon=True).start()
+
+    def _init_database(self):
+        """Open (or create) the conversation database"""
+        # Shared by Flask request threads and the event loop thread (access serialized by _lock)
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                user_id TEXT,
+                name TEXT,
+                saved INTEGER NOT NULL DEFAULT 0,
+                created_at REAL,
+                last_active REAL,
+                message_count INTEGER NOT NULL DEFAULT 0,
+                context TEXT,
+                metadata TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_sessions_saved ON sessions(saved, last_active);
+
+            CREATE TABLE IF NOT EXISTS messages (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                message_id TEXT,
+                role TEXT,
+                content TEXT,
+                timestamp REAL,
+                agent TEXT,
+                tools_used TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_messages_session ON messages(session_id, seq);
+
+            CREATE TABLE IF NOT EXISTS workspace (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+        """)
+        self.conn.commit()
+
+    def _migrate_json_files(self):
+        """Import conversations.json / workspace_state.json from older versions, then set them aside"""
         try:
-            if self.conversations_file.exists():
-                with open(self.conversations_file, 'r') as f:
-                    self.persistent_conversations = json.load(f)
-            else:
-                self.persistent_conversations = {}
-
-            if self.workspace_file.exists():
-                with open(self.workspace_file, 'r') as f:
-                    self.workspace_state = json.load(f)
-            else:
-                self.workspace_state = {}
+            with self._lock:
+                if self.conversations_file.exists():
+                    with open(self.conversations_file, 'r') as f:
+                        conversations = json.load(f)
+                    for session in conversations.values():
+                        self._import_session(session)
+                    self.conn.commit()
+                    self.conversations_file.rename(self.conversations_file.with_suffix('.json.migrated'))
+
+                if self.workspace_file.exists():
+                    with open(self.workspace_file, 'r') as f:
+                        workspace = json.load(f)
+                    self.conn.executemany(
+                        "INSERT OR IGNORE INTO workspace (key, value) VALUES (?, ?)",
+                        [(key, json.dumps(value)) for key, value in workspace.items()]
+                    )
+                    self.conn.commit()
+                    self.workspace_file.rename(self.workspace_file.with_suffix('.json.migrated'))
+
+        except Exception as e:
+            self.conn.rollback()
+            print(f"Warning: Could not migrate JSON conversation data: {e}")
+
+    def _import_session(self, session: Dict[str, Any]):
+        """Insert one saved session from the JSON format (skipped if already present)"""
+        messages = session.get('messages', [])
+        metadata = session.get('metadata', {})
+        cursor = self.conn.execute(
+            "INSERT OR IGNORE INTO sessions (session_id, user_id, name, saved, created_at, last_active, "
+            "message_count, context, metadata) VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?)",
+            (
+                session['session_id'], session.get('user_id', 'default'),
+                session.get('name'), session.get('created_at'), session.get('last_active'),
+                len(messages), json.dumps(session.get('context', {})),
+                json.dumps({
+                    'agents_used': list(metadata.get('agents_used', [])),
+                    'tools_used': list(metadata.get('tools_used', []))
+                })
+            )
+        )
+        if cursor.rowcount:
+            self.conn.executemany(
+                "INSERT INTO messages (session_id, message_id, role, content, timestamp, agent, tools_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (session['session_id'], m.get('id'), m.get('role'), m.get('content'),
+                     m.get('timestamp'), m.get('agent'), json.dumps(m.get('tools_used') or []))
+                    for m in messages
+                ]
+            )
 
+    def _load_persistent_data(self):
+        """Load workspace state (sessions are loaded lazily)"""
+        try:
+            with self._lock:
+                rows = self.conn.execute("SELECT key, value FROM workspace").fetchall()
+            self.workspace_state = {row['key']: json.loads(row['value']) for row in rows}
         except Exception as e:
             print(f"Warning: Could not load persistent data: {e}")
-            self.persistent_conversations = {}
             self.workspace_state = {}
 
-    def _save_persistent_data(self):
-        """Save persistent conversation data to disk"""
-        try:
-            with open(self.conversations_file, 'w') as f:
-                json.dump(self.persistent_conversations, f, indent=2)
+    def _load_from_db(self, session_id: str, saved_only: bool = False) -> Optional[Dict[str, Any]]:
+        """Read a session and its messages from the database into the cache"""
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            if row is None or (saved_only and not row['saved']):
+                return None
+            messages = self.conn.execute(
+                "SELECT seq, role, content, timestamp, agent, tools_used FROM messages "
+                "WHERE session_id = ? ORDER BY seq", (session_id,)
+            ).fetchall()
+
+        metadata = json.loads(row['metadata'] or '{}')
+        records = [Message.from_row(m) for m in messages]
+        user_messages = sum(1 for m in records if m.role == 'user')
+        assistant_messages = sum(1 for m in records if m.role == 'assistant')
+        session = {
+            'session_id': session_id,
+            'user_id': row['user_id'],
+            'created_at': row['created_at'],
+            'last_active': row['last_active'],
+            'messages': records,
+            'context': json.loads(row['context'] or '{}'),
+            'metadata': {
+                'total_messages': row['message_count'],
+                'user_messages': user_messages,
+                'assistant_messages': assistant_messages,
+                'agents_used': NameSet(metadata.get('agents_used', [])),
+                'tools_used': NameSet(metadata.get('tools_used', []))
+            }
+        }
+        if row['saved']:
+            session['name'] = row['name']
+
+        with self._lock:
+            if session_id in self.sessions:
+                # Another thread loaded it first; keep a single copy
+                return self.sessions[session_id]
+            self.active_files[session_id] = set(session['context'].get('active_files', []))
+            self._cache(session_id, session)
+            self.cache_stats['rehydrations'] += 1
+        return session
+
+    def _cache(self, session_id: str, session: Dict[str, Any]):
+        """Add a session to the cache and evict others if over budget (lock held)"""
+        size = sys.getsizeof(session) + sum(m.nbytes() for m in session['messages'])
+        self.sessions[session_id] = session
+        self.sessions.move_to_end(session_id)
+        self._session_bytes[session_id] = size
+        self._cached_bytes += size
+        self._enforce_budget(keep=session_id)
+
+    def _uncache(self, session_id: str) -> bool:
+        """Drop a session's cached copy; its data stays in the database (lock held)"""
+        if self.sessions.pop(session_id, None) is None:
+            return False
+        self._cached_bytes -= self._session_bytes.pop(session_id, 0)
+        self.active_files.pop(session_id, None)
+        return True
 
-            with open(self.workspace_file, 'w') as f:
-                json.dump(self.workspace_state, f, indent=2)
+    def _enforce_budget(self, keep: Optional[str] = None):
+        """Evict least recently used sessions until within the session and byte budgets (lock held)"""
+        while len(self.sessions) > self.max_sessions or self._cached_bytes > self.max_bytes:
+            victim = next(iter(self.sessions))
+            if victim == keep:
+                if len(self.sessions) == 1:
+                    break
+                # The session being used goes back to the hot end
+                self.sessions.move_to_end(victim)
+                continue
+            self._uncache(victim)
+            self.cache_stats['evictions'] += 1
+
+    def evict_session(self, session_id: str) -> bool:
+        """Drop a session from the in-memory cache (it is reloaded on next use)"""
+        with self._lock:
+            evicted = self._uncache(session_id)
+            if evicted:
+                self.cache_stats['evictions'] += 1
+        return evicted
+
+    def sweep(self) -> int:
+        """
+        Evict sessions idle for longer than idle_seconds and enforce the budgets.
 
-        except Exception as e:
-            print(f"Warning: Could not save persistent data: {e}")
+        Returns:
+            Number of sessions evicted for being idle
+        """
+        cutoff = time.time() - self.idle_seconds
+        with self._lock:
+            idle = [sid for sid, session in self.sessions.items() if session['last_active'] < cutoff]
+            for session_id in idle:
+                self._uncache(session_id)
+            self.cache_stats['idle_evictions'] += len(idle)
+            self.cache_stats['sweeps'] += 1
+            self._enforce_budget()
+        return len(idle)
+
+    def _sweep_loop(self):
+        while not self._stop_sweeper.wait(self.sweep_interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Warning: Session sweep failed: {e}")
+
+    def close(self):
+        """Stop the sweeper and close the database"""
+        self._stop_sweeper.set()
+        with self._lock:
+            self.conn.close()
+
+    def get_memory_stats(self) -> Dict[str, Any]:
+        """Size of the in-memory session cache and its hit/eviction counters"""
+        with self._lock:
+            cached_messages = sum(len(session['messages']) for session in self.sessions.values())
+            return {
+                'cached_sessions': len(self.sessions),
+                'cached_messages': cached_messages,
+                'cached_bytes': self._cached_bytes,
+                'max_sessions': self.max_sessions,
+                'max_bytes': self.max_bytes,
+                'idle_seconds': self.idle_seconds,
+                'sweep_interval': self.sweep_interval,
+                **self.cache_stats
+            }
+
+    def _write_session_fields(self, session_id: str, **fields):
+        """UPDATE a few columns of a session row"""
+        columns = ", ".join(f"{column} = ?" for column in fields)
+        with self._lock:
+            self.conn.execute(f"UPDATE sessions SET {columns} WHERE session_id = ?",
+                              (*fields.values(), session_id))
+            self.conn.commit()
+
+    @staticmethod
+    def _metadata_json(metadata: Dict[str, Any]) -> str:
+        """Stored form of a session's metadata (name sets become sorted lists)"""
+        return json.dumps({
+            'agents_used': sorted(metadata['agents_used']),
+            'tools_used': sorted(metadata['tools_used'])
+        })
 
     def create_session(self, user_id: str = "default") -> str:
         """
@@ -78,12 +328,13 @@ class ConversationMemory:
             session_id: Unique session identifier
         """
         session_id = str(uuid.uuid4())
+        now = time.time()
 
-        self.sessions[session_id] = {
+        session = {
             'session_id': session_id,
             'user_id': user_id,
-            'created_at': time.time(),
-            'last_active': time.time(),
+            'created_at': now,
+            'last_active': now,
             'messages': [],
             'context': {
                 'current_project': None,
@@ -93,16 +344,36 @@ class ConversationMemory:
             },
             'metadata': {
                 'total_messages': 0,
-                'agents_used': set(),
-                'tools_used': set()
+                'user_messages': 0,
+                'assistant_messages': 0,
+                'agents_used': NameSet(),
+                'tools_used': NameSet()
             }
         }
 
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO sessions (session_id, user_id, created_at, last_active, context, metadata) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (session_id, user_id, now, now, json.dumps(session['context']),
+                 json.dumps({'agents_used': [], 'tools_used': []}))
+            )
+            self.conn.commit()
+            self._cache(session_id, session)
+
         return session_id
 
     def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
-        """Get session data by ID"""
-        return self.sessions.get(session_id)
+        """Get session data by ID (loaded from the database if it isn't cached)"""
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is not None:
+                self.sessions.move_to_end(session_id)
+                self.cache_stats['hits'] += 1
+                return session
+        if not session_id:
+            return None
+        return self._load_from_db(session_id)
 
     def add_message(self, session_id: str, role: str, content: str,
                     agent: str = None, tools_used: List[str] = None) -> bool:
@@ -119,33 +390,89 @@ class ConversationMemory:
         Returns:
             success: True if message was added
         """
-        if session_id not in self.sessions:
+        session = self.get_session(session_id)
+        if session is None:
             return False
 
-        session = self.sessions[session_id]
-
-        message = {
-            'id': str(uuid.uuid4()),
-            'role': role,
-            'content': content,
-            'timestamp': time.time(),
-            'agent': agent,
-            'tools_used': tools_used or []
-        }
-
-        session['messages'].append(message)
-        session['last_active'] = time.time()
-        session['metadata']['total_messages'] += 1
+        timestamp = time.time()
+        metadata = session['metadata']
+        new_names = (agent and agent not in metadata['agents_used']) or \
+            (tools_used and not metadata['tools_used'].issuperset(tools_used))
 
         if agent:
-            session['metadata']['agents_used'].add(agent)
+            metadata['agents_used'].add(agent)
             session['context']['last_agent'] = agent
 
         if tools_used:
-            session['metadata']['tools_used'].update(tools_used)
+            metadata['tools_used'].update(tools_used)
+
+        # Append-only write: one row plus counters, independent of history length
+        with self._lock:
+            cursor = self.conn.execute(
+                "INSERT INTO messages (session_id, role, content, timestamp, agent, tools_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (session_id, role, content, timestamp, agent, json.dumps(tools_used or []))
+            )
+            # The row number doubles as the message id
+            message = Message(cursor.lastrowid, role, content, timestamp, agent, tools_used)
+            session['messages'].append(message)
+            session['last_active'] = timestamp
+            metadata['total_messages'] += 1
+            if role in ('user', 'assistant'):
+                metadata[f'{role}_messages'] += 1
+
+            self.conn.execute(
+                "UPDATE sessions SET last_active = ?, message_count = message_count + 1 WHERE session_id = ?",
+                (timestamp, session_id)
+            )
+            if agent:
+                self.conn.execute("UPDATE sessions SET context = ? WHERE session_id = ?",
+                                  (json.dumps(session['context']), session_id))
+            if new_names:
+                self.conn.execute("UPDATE sessions SET metadata = ? WHERE session_id = ?",
+                                  (self._metadata_json(metadata), session_id))
+            self.conn.commit()
+
+            if session_id in self._session_bytes:
+                size = message.nbytes()
+                self._session_bytes[session_id] += size
+                self._cached_bytes += size
+                self._enforce_budget(keep=session_id)
+
+        for listener in self._listeners:
+            try:
+                listener(session_id, message, metadata['total_messages'])
+            except Exception as e:
+                print(f"Warning: Message listener failed: {e}")
 
         return True
 
+    def add_listener(self, callback: Callable[[str, Message, int], None]):
+        """
+        Call back after every stored message.
+
+        Args:
+            callback: (session_id, message, total_messages) -> None, called on the
+                thread that added the message; must not block
+        """
+        self._listeners.append(callback)
+
+    def add_delete_listener(self, callback: Callable[[List[str]], None]):
+        """
+        Call back after sessions are deleted from the database (not after cache evictions).
+
+        Args:
+            callback: (session_ids) -> None, called on the thread that deleted them; must not block
+        """
+        self._delete_listeners.append(callback)
+
+    def _notify_deleted(self, session_ids: List[str]):
+        for listener in self._delete_listeners:
+            try:
+                listener(session_ids)
+            except Exception as e:
+                print(f"Warning: Delete listener failed: {e}")
+
     def get_conversation_history(self, session_id: str,
                                  limit: int = None) -> List[Dict[str, Any]]:
         """
@@ -156,23 +483,57 @@ class ConversationMemory:
             limit: Maximum number of messages to return (most recent)
 
         Returns:
-            messages: List of messages
+            messages: List of Message records (read like dicts; to_dict() for JSON)
         """
-        if session_id not in self.sessions:
+        session = self.get_session(session_id)
+        if session is None:
             return []
 
-        messages = self.sessions[session_id]['messages']
+        messages = session['messages']
 
         if limit:
             return messages[-limit:]
         return messages
 
+    def get_exchanges(self, after_id: int = 0, limit: int = 256) -> List[Dict[str, Any]]:
+        """
+        Stored user/assistant exchanges across all sessions, oldest first.
+
+        Args:
+            after_id: Only exchanges whose assistant message id is greater
+            limit: Maximum number of exchanges
+
+        Returns:
+            [{'session_id', 'message_id', 'user_message', 'agent_response', 'agent_type', 'timestamp'}]
+        """
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT a.seq, a.session_id, a.content, a.agent, a.timestamp, "
+                "(SELECT u.content FROM messages u WHERE u.session_id = a.session_id AND u.seq < a.seq "
+                "AND u.role = 'user' ORDER BY u.seq DESC LIMIT 1) AS user_content "
+                "FROM messages a WHERE a.role = 'assistant' AND a.seq > ? ORDER BY a.seq LIMIT ?",
+                (after_id, limit)
+            ).fetchall()
+
+        return [
+            {
+                'session_id': row['session_id'],
+                'message_id': row['seq'],
+                'user_message': row['user_content'] or '',
+                'agent_response': row['content'] or '',
+                'agent_type': row['agent'],
+                'timestamp': row['timestamp']
+            }
+            for row in rows
+        ]
+
     def get_context(self, session_id: str) -> Dict[str, Any]:
         """Get current context for a session"""
-        if session_id not in self.sessions:
+        session = self.get_session(session_id)
+        if session is None:
             return {}
 
-        return self.sessions[session_id]['context']
+        return session['context']
 
     def update_context(self, session_id: str, updates: Dict[str, Any]) -> bool:
         """
@@ -185,34 +546,43 @@ class ConversationMemory:
         Returns:
             success: True if context was updated
         """
-        if session_id not in self.sessions:
+        session = self.get_session(session_id)
+        if session is None:
             return False
 
-        self.sessions[session_id]['context'].update(updates)
-        self.sessions[session_id]['last_active'] = time.time()
+        session['context'].update(updates)
+        session['last_active'] = time.time()
+        self._write_session_fields(session_id, context=json.dumps(session['context']),
+                                   last_active=session['last_active'])
 
         return True
 
     def add_active_file(self, session_id: str, file_path: str):
         """Track a file that's being worked on in this session"""
-        if session_id in self.sessions:
-            context = self.sessions[session_id]['context']
+        session = self.get_session(session_id)
+        if session is not None:
+            context = session['context']
             if 'active_files' not in context:
                 context['active_files'] = []
             if file_path not in context['active_files']:
                 context['active_files'].append(file_path)
                 self.active_files[session_id].add(file_path)
+                self._write_session_fields(session_id, context=json.dumps(context))
 
     def get_active_files(self, session_id: str) -> List[str]:
         """Get list of files being worked on in this session"""
-        if session_id in self.sessions:
-            return self.sessions[session_id]['context'].get('active_files', [])
+        session = self.get_session(session_id)
+        if session is not None:
+            return session['context'].get('active_files', [])
         return []
 
     def save_session(self, session_id: str, name: str = None) -> bool:
         """
         Save session to persistent storage.
 
+        Messages are already stored as they arrive, so this only names the
+        session and marks it as saved.
+
         Args:
             session_id: Session identifier
             name: Optional name for the saved session
@@ -220,23 +590,19 @@ class ConversationMemory:
         Returns:
             success: True if session was saved
         """
-        if session_id not in self.sessions:
+        session = self.get_session(session_id)
+        if session is None:
             return False
 
-        session = self.sessions[session_id].copy()
-
-        # Convert sets to lists for JSON serialization
-        session['metadata']['agents_used'] = list(session['metadata']['agents_used'])
-        session['metadata']['tools_used'] = list(session['metadata']['tools_used'])
-
-        # Add name if provided
-        if name:
-            session['name'] = name
-        else:
-            session['name'] = f"Session {session_id[:8]}"
-
-        self.persistent_conversations[session_id] = session
-        self._save_persistent_data()
+        session['name'] = name or f"Session {session_id[:8]}"
+        with self._lock:
+            self.conn.execute(
+                "UPDATE sessions SET saved = 1, name = ?, last_active = ?, context = ?, metadata = ? "
+                "WHERE session_id = ?",
+                (session['name'], session['last_active'], json.dumps(session['context']),
+                 self._metadata_json(session['metadata']), session_id)
+            )
+            self.conn.commit()
 
         return True
 
@@ -250,86 +616,114 @@ class ConversationMemory:
         Returns:
             success: True if session was loaded
         """
-        if session_id not in self.persistent_conversations:
-            return False
-
-        session = self.persistent_conversations[session_id].copy()
-
-        # Convert lists back to sets
-        session['metadata']['agents_used'] = set(session['metadata']['agents_used'])
-        session['metadata']['tools_used'] = set(session['metadata']['tools_used'])
-
-        self.sessions[session_id] = session
-
-        return True
+        return self._load_from_db(session_id, saved_only=True) is not None
 
     def list_saved_sessions(self) -> List[Dict[str, Any]]:
-        """Get list of all saved sessions"""
+        """Get list of all saved sessions (most recently active first)"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT session_id, name, created_at, message_count, last_active FROM sessions "
+                "WHERE saved = 1 ORDER BY last_active DESC"
+            ).fetchall()
+
         return [
             {
-                'session_id': sid,
-                'name': data.get('name', f"Session {sid[:8]}"),
-                'created_at': data.get('created_at'),
-                'message_count': len(data.get('messages', [])),
-                'last_active': data.get('last_active')
+                'session_id': row['session_id'],
+                'name': row['name'] or f"Session {row['session_id'][:8]}",
+                'created_at': row['created_at'],
+                'message_count': row['message_count'],
+                'last_active': row['last_active']
             }
-            for sid, data in self.persistent_conversations.items()
+            for row in rows
         ]
 
     def get_session_summary(self, session_id: str) -> Dict[str, Any]:
-        """Get a summary of a session"""
-        if session_id not in self.sessions:
+        """Get a summary of a session (from running counters, independent of history length)"""
+        session = self.get_session(session_id)
+        if session is None:
             return {}
 
-        session = self.sessions[session_id]
-        messages = session['messages']
+        metadata = session['metadata']
+        # Rolling summary text, when SessionHistory has written one
+        rolling_summary = session['context'].get('rolling_summary') or {}
 
         return {
             'session_id': session_id,
             'created_at': session['created_at'],
             'last_active': session['last_active'],
             'duration': session['last_active'] - session['created_at'],
-            'total_messages': len(messages),
-            'user_messages': sum(1 for m in messages if m['role'] == 'user'),
-            'assistant_messages': sum(1 for m in messages if m['role'] == 'assistant'),
-            'agents_used': list(session['metadata']['agents_used']),
-            'tools_used': list(session['metadata']['tools_used']),
-            'active_files': session['context'].get('active_files', [])
+            'total_messages': metadata['total_messages'],
+            'user_messages': metadata['user_messages'],
+            'assistant_messages': metadata['assistant_messages'],
+            'agents_used': list(metadata['agents_used']),
+            'tools_used': list(metadata['tools_used']),
+            'active_files': session['context'].get('active_files', []),
+            'summary': rolling_summary.get('text'),
+            'summary_covers': rolling_summary.get('covered', 0)
         }
 
     def clear_session(self, session_id: str) -> bool:
-        """Clear a session from memory (does not delete saved sessions)"""
-        if session_id in self.sessions:
-            del self.sessions[session_id]
-            if session_id in self.active_files:
-                del self.active_files[session_id]
-            return True
-        return False
+        """
+        Clear a session, cached or not (saved sessions stay in the database; unsaved ones are deleted).
+
+        Returns:
+            True if the session was cached or deleted
+        """
+        with self._lock:
+            cached = self._uncache(session_id)
+            deleted = self.conn.execute(
+                "DELETE FROM sessions WHERE session_id = ? AND saved = 0", (session_id,)
+            ).rowcount
+            if deleted:
+                self.conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            self.conn.commit()
+
+        if deleted:
+            self._notify_deleted([session_id])
+        return cached or deleted > 0
 
     def get_workspace_state(self) -> Dict[str, Any]:
         """Get current workspace state (open files, cursor positions, etc.)"""
         return self.workspace_state.copy()
 
     def update_workspace_state(self, updates: Dict[str, Any]):
-        """Update workspace state"""
+        """Update workspace state (only the changed keys are written)"""
         self.workspace_state.update(updates)
-        self._save_persistent_data()
-
-    def cleanup_old_sessions(self, max_age_hours: int = 24):
-        """Clean up sessions older than max_age_hours"""
-        current_time = time.time()
-        max_age_seconds = max_age_hours * 3600
-
-        to_remove = []
-        for session_id, session in self.sessions.items():
-            age = current_time - session['last_active']
-            if age > max_age_seconds:
-                to_remove.append(session_id)
-
-        for session_id in to_remove:
-            self.clear_session(session_id)
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO workspace (key, value) VALUES (?, ?)",
+                [(key, json.dumps(value)) for key, value in updates.items()]
+            )
+            self.conn.commit()
+
+    def cleanup_old_sessions(self, max_age_hours: int = 24) -> int:
+        """
+        Delete unsaved sessions inactive for longer than max_age_hours, cached or not.
 
-        return len(to_remove)
+        Returns:
+            Number of sessions deleted
+        """
+        cutoff = time.time() - max_age_hours * 3600
+
+        with self._lock:
+            stale = [row['session_id'] for row in self.conn.execute(
+                "SELECT session_id FROM sessions WHERE saved = 0 AND last_active < ?", (cutoff,)
+            )]
+            if not stale:
+                return 0
+
+            self.conn.execute(
+                "DELETE FROM messages WHERE session_id IN "
+                "(SELECT session_id FROM sessions WHERE saved = 0 AND last_active < ?)", (cutoff,)
+            )
+            self.conn.execute("DELETE FROM sessions WHERE saved = 0 AND last_active < ?", (cutoff,))
+            self.conn.commit()
+
+            for session_id in stale:
+                self._uncache(session_id)
+
+        self._notify_deleted(stale)
+        return len(stale)
 
 
 # Global instance for API use
@@ -36,6 +36,7 @@ import subprocess
 import socket
 import json
 import time
+import math
 import os
 import contextlib
 import uuid
@@ -45,6 +46,11 @@ from pathlib import Path
 # Local image generation
 import local_image_gen
 
+# Shared event loop for all multi-agent coroutines
+import atexit
+from async_runner import async_runner
+atexit.register(async_runner.stop)
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -70,6 +76,52 @@ def _join_url(base: str, *parts: str) -> str:
         return base
     return base + '/' + '/'.join(paths)
 
+
+def _cache_bypassed() -> bool:
+    """True when the client asked to skip the agent response cache."""
+    if request.headers.get('X-PKN-Cache', '').lower() == 'bypass':
+        return True
+    return 'no-cache' in request.headers.get('Cache-Control', '').lower()
+
+
+def _vote_params(data: dict, known_voters: set):
+    """
+    Validate and coerce the optional voters/quorum/deadline of a vote request.
+
+    Returns:
+        (voters or None, quorum or None, deadline or None)
+
+    Raises:
+        ValueError: With a message suitable for a 400 response
+    """
+    voters = data.get('voters')
+    if voters is not None:
+        if not isinstance(voters, list) or not voters or not all(isinstance(v, str) for v in voters):
+            raise ValueError('voters must be a non-empty list of agent names')
+        unknown = [v for v in voters if v not in known_voters]
+        if unknown:
+            raise ValueError(f"Unknown voters: {', '.join(unknown)}")
+
+    quorum = data.get('quorum')
+    if quorum is not None:
+        if isinstance(quorum, str) and quorum.strip().isdigit():
+            quorum = int(quorum)
+        if isinstance(quorum, bool) or not isinstance(quorum, int) or quorum < 1:
+            raise ValueError('quorum must be a positive integer')
+
+    deadline = data.get('deadline')
+    if deadline is not None:
+        try:
+            if isinstance(deadline, bool):
+                raise ValueError
+            deadline = float(deadline)
+        except (TypeError, ValueError):
+            raise ValueError('deadline must be a number of seconds')
+        if not math.isfinite(deadline) or deadline <= 0:
+            raise ValueError('deadline must be a positive number of seconds')
+
+    return voters, quorum, deadline
+
 @app.route('/')
 @app.route('/pkn.html')
 def index():
@@ -1480,6 +1532,9 @@ def api_multi_agent_chat():
         "user_id": "optional-user-id"
     }
 
+    Headers:
+        X-PKN-Cache: bypass   (or Cache-Control: no-cache) skips the response cache
+
     Returns:
     {
         "response": "Agent's response",
@@ -1502,7 +1557,6 @@ def api_multi_agent_chat():
         try:
             from conversation_memory import conversation_memory
             from agent_manager import agent_manager
-            import asyncio
 
             # Create or get session
             if not session_id or not conversation_memory.get_session(session_id):
@@ -1516,7 +1570,21 @@ def api_multi_agent_chat():
 
             # Route and execute task
             app.logger.debug(f'Routing task: {message[:50]}...')
-            result = asyncio.run(agent_manager.execute_task(message, session_id))
+            result = async_runner.run(agent_manager.execute_task(
+                message, session_id, use_cache=not _cache_bypassed()
+            ))
+
+            if result.get('overloaded'):
+                # Backend scheduler shed the request; tell the client when to retry
+                response = jsonify({
+                    'error': 'LLM backend is overloaded, please retry shortly',
+                    'details': result.get('error'),
+                    'session_id': session_id,
+                    'retry_after': result['retry_after'],
+                    'status': 'error'
+                })
+                response.headers['Retry-After'] = str(int(result['retry_after'] + 0.999))
+                return response, 503
 
             # Add assistant response to history
             if result['status'] == 'success':
@@ -1577,10 +1645,18 @@ def api_multi_agent_chat_stream():
         "user_id": "optional-user-id"
     }
 
+    Headers:
+        X-PKN-Cache: bypass   (or Cache-Control: no-cache) skips the response cache
+
     Returns: SSE stream with events:
     - start: {"agent": "coder", "routing": {...}}
     - chunk: {"content": "token text"}
-    - done: {"execution_time": 1.23, "tools_used": [...]}
+    - tool_call: {"tool": "glob", "args": {...}}   (tool-using agents)
+    - tool_result: {"tool": "glob", "result": "..."}
+    - draft: {"content": "token text"}   (fast General draft while a slow specialist works)
+    - confirm: {"similarity": 0.93}      (specialist agrees with the draft)
+    - replace: {"content": "full answer", "similarity": 0.41}
+    - done: {"execution_time": 1.23, "tools_used": [...], "ttft": 0.4, "tokens_per_second": 18.5}
     - error: {"content": "error message"}
     """
     # IMPORTANT: Parse request data OUTSIDE the generator to avoid Flask context error
@@ -1589,6 +1665,7 @@ def api_multi_agent_chat_stream():
         message = data.get('message', '')
         session_id = data.get('session_id')
         user_id = data.get('user_id', 'default')
+        use_cache = not _cache_bypassed()
     except Exception as e:
         app.logger.error(f'Failed to parse request: {e}')
         return jsonify({'error': 'Invalid request data'}), 400
@@ -1596,13 +1673,12 @@ def api_multi_agent_chat_stream():
     if not message:
         return jsonify({'error': 'No message provided'}), 400
 
-    def generate(message, session_id, user_id):
+    def generate(message, session_id, user_id, use_cache):
         try:
 
             try:
                 from conversation_memory import conversation_memory
                 from agent_manager import agent_manager
-                import asyncio
 
                 # Create or get session
                 if not session_id or not conversation_memory.get_session(session_id):
@@ -1614,52 +1690,41 @@ def api_multi_agent_chat_stream():
                 # Add user message to history
                 conversation_memory.add_message(session_id, 'user', message)
 
-                # Stream the response - run async code in sync context
+                # Stream the response
                 full_response = ""
                 agent_used = None
                 tools_used = []
                 execution_time = 0
 
-                # Create new event loop for this generator
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
+                # Drive the async generator on the shared event loop
+                async_gen = agent_manager.execute_task_streaming(message, session_id, use_cache=use_cache)
 
-                try:
-                    # Get the async generator
-                    async_gen = agent_manager.execute_task_streaming(message, session_id)
-
-                    # Consume it synchronously
-                    while True:
-                        try:
-                            # Get next event from async generator
-                            event = loop.run_until_complete(async_gen.__anext__())
-                            event_type = event.get('type')
+                for event in async_runner.iterate(async_gen):
+                    event_type = event.get('type')
 
-                            if event_type == 'start':
-                                agent_used = event.get('agent')
-                                # Send start event with session info
-                                yield f"event: start\ndata: {json.dumps({**event, 'session_id': session_id})}\n\n"
+                    if event_type == 'start':
+                        agent_used = event.get('agent')
+                        # Send start event with session info
+                        yield f"event: start\ndata: {json.dumps({**event, 'session_id': session_id})}\n\n"
 
-                            elif event_type == 'chunk':
-                                full_response += event.get('content', '')
-                                yield f"event: chunk\ndata: {json.dumps(event)}\n\n"
+                    elif event_type == 'chunk':
+                        full_response += event.get('content', '')
+                        yield f"event: chunk\ndata: {json.dumps(event)}\n\n"
 
-                            elif event_type == 'done':
-                                execution_time = event.get('execution_time', 0)
-                                tools_used = event.get('tools_used', [])
-                                agent_used = event.get('agent_used', agent_used)
-                                yield f"event: done\ndata: {json.dumps(event)}\n\n"
+                    elif event_type in ('tool_call', 'tool_result', 'draft', 'confirm', 'replace'):
+                        yield f"event: {event_type}\ndata: {json.dumps(event)}\n\n"
 
-                            elif event_type == 'error':
-                                yield f"event: error\ndata: {json.dumps(event)}\n\n"
-                                break
+                    elif event_type == 'done':
+                        # Tool-using agents stream every ReAct turn; keep only the final answer
+                        full_response = event.get('response', full_response)
+                        execution_time = event.get('execution_time', 0)
+                        tools_used = event.get('tools_used', [])
+                        agent_used = event.get('agent_used', agent_used)
+                        yield f"event: done\ndata: {json.dumps(event)}\n\n"
 
-                        except StopAsyncIteration:
-                            # Generator finished normally
-                            break
-
-                finally:
-                    loop.close()
+                    elif event_type == 'error':
+                        yield f"event: error\ndata: {json.dumps(event)}\n\n"
+                        break
 
                 # Add assistant response to conversation history
                 if full_response:
@@ -1683,7 +1748,7 @@ def api_multi_agent_chat_stream():
             yield f"event: error\ndata: {json.dumps({'content': str(e)})}\n\n"
 
     return app.response_class(
-        generate(message, session_id, user_id),
+        generate(message, session_id, user_id, use_cache),
         mimetype='text/event-stream',
         headers={
             'Cache-Control': 'no-cache',
@@ -1691,15 +1756,6 @@ def api_multi_agent_chat_stream():
         }
     )
 
-async def _async_generator_to_sync(async_gen):
-    """Helper to convert async generator to sync for Flask"""
-    try:
-        while True:
-            item = await async_gen.__anext__()
-            yield item
-    except StopAsyncIteration:
-        pass
-
 @app.route('/api/multi-agent/classify', methods=['POST'])
 def api_classify_task():
     """
@@ -1799,6 +1855,40 @@ def api_list_agents():
             'status': 'error'
         }), 500
 
+@app.route('/api/multi-agent/tools/reload', methods=['POST'])
+def api_reload_tools():
+    """
+    Reload edited tool modules and recompile agent tool prompts (admin).
+
+    Returns:
+    {
+        "reloaded": bool,
+        "tool_registry": {...},
+        "status": "success"
+    }
+    """
+    try:
+        from agent_manager import agent_manager
+
+        reloaded = agent_manager.refresh_tool_registry(reload=True)
+
+        return jsonify({
+            'reloaded': reloaded,
+            'tool_registry': agent_manager.tool_registry_stats,
+            'status': 'success'
+        }), 200
+
+    except ImportError as e:
+        return jsonify({
+            'error': 'Agent manager not available',
+            'status': 'error'
+        }), 503
+    except Exception as e:
+        return jsonify({
+            'error': str(e),
+            'status': 'error'
+        }), 500
+
 @app.route('/api/multi-agent/vote', methods=['POST'])
 def api_vote_on_decision():
     """
@@ -1810,9 +1900,15 @@ def api_vote_on_decision():
         "question": "Which approach is best?",
         "options": ["Option 1", "Option 2", "Option 3"],
         "context": "Additional context...",
-        "use_external": true
+        "use_external": true,
+        "voters": ["consultant", "reasoner", "coder"],   (optional)
+        "quorum": 2,                                     (optional, votes needed to close early)
+        "deadline": 20                                   (optional, seconds to wait for votes)
     }
 
+    Headers:
+        X-PKN-Cache: bypass   (or Cache-Control: no-cache) skips the response cache
+
     Returns:
     {
         "choice": "Option 2",
@@ -1820,6 +1916,7 @@ def api_vote_on_decision():
         "reasoning": {...},
         "consensus": 1.0,
         "final_reasoning": "...",
+        "voters": [...], "failed": {...}, "cancelled": [...], "elapsed": 3.2,
         "status": "success"
     }
     """
@@ -1833,19 +1930,32 @@ def api_vote_on_decision():
         if not question:
             return jsonify({'error': 'No question provided', 'status': 'error'}), 400
 
-        if not options or len(options) < 2:
+        if not isinstance(options, list) or len(options) < 2:
             return jsonify({'error': 'At least 2 options required', 'status': 'error'}), 400
 
+        if not all(isinstance(opt, str) for opt in options):
+            return jsonify({'error': 'Options must be strings', 'status': 'error'}), 400
+
         try:
-            from agent_manager import agent_manager
-            import asyncio
+            from agent_manager import agent_manager, AgentType
+
+            try:
+                voters, quorum, deadline = _vote_params(
+                    data, {agent.value for agent in AgentType} | {'consultant'}
+                )
+            except ValueError as e:
+                return jsonify({'error': str(e), 'status': 'error'}), 400
 
             # Run voting
-            result = asyncio.run(agent_manager.vote_on_decision(
+            result = async_runner.run(agent_manager.vote_on_decision(
                 question=question,
                 options=options,
                 context=context,
-                use_external=use_external
+                use_external=use_external,
+                use_cache=not _cache_bypassed(),
+                voters=voters,
+                quorum=quorum,
+                deadline=deadline
             ))
 
             return jsonify({
@@ -1854,6 +1964,10 @@ def api_vote_on_decision():
                 'reasoning': result['reasoning'],
                 'consensus': result['consensus'],
                 'final_reasoning': result['final_reasoning'],
+                'voters': result['voters'],
+                'failed': result['failed'],
+                'cancelled': result['cancelled'],
+                'elapsed': result['elapsed'],
                 'status': 'success'
             }), 200
 
@@ -1902,9 +2016,8 @@ def api_rag_search():
 
         try:
             from agent_manager import agent_manager
-            import asyncio
 
-            result = asyncio.run(agent_manager.search_codebase_with_rag(query, n_results))
+            result = async_runner.run(agent_manager.search_codebase_with_rag(query, n_results))
 
             return jsonify({
                 **result,
@@ -1950,9 +2063,8 @@ def api_create_plan():
 
         try:
             from agent_manager import agent_manager
-            import asyncio
 
-            result = asyncio.run(agent_manager.create_task_plan(task, context))
+            result = async_runner.run(agent_manager.create_task_plan(task, context))
 
             return jsonify({
                 **result,
@@ -1991,9 +2103,50 @@ def api_execute_plan(plan_id):
 
         try:
             from agent_manager import agent_manager
-            import asyncio
 
-            result = asyncio.run(agent_manager.execute_plan(plan_id, session_id))
+            result = async_runner.run(agent_manager.execute_plan(plan_id, session_id))
+
+            return jsonify({
+                **result,
+                'status': 'success' if result.get('success') else 'error'
+            }), 200
+
+        except ImportError as e:
+            return jsonify({
+                'error': 'Planning system not available',
+                'status': 'error'
+            }), 503
+
+    except Exception as e:
+        return jsonify({'error': str(e), 'status': 'error'}), 500
+
+@app.route('/api/planning/resume/<plan_id>', methods=['POST'])
+def api_resume_plan(plan_id):
+    """
+    Resume an interrupted or failed plan from its checkpoints.
+    Completed steps are not re-run; their saved results are reused.
+
+    Request body:
+    {
+        "session_id": "optional-session-id"
+    }
+
+    Returns:
+    {
+        "success": true,
+        "steps_completed": 2,
+        "steps_reused": 3,
+        "status": "success"
+    }
+    """
+    try:
+        data = request.get_json() or {}
+        session_id = data.get('session_id', str(uuid.uuid4()))
+
+        try:
+            from agent_manager import agent_manager
+
+            result = async_runner.run(agent_manager.resume_plan(plan_id, session_id))
 
             return jsonify({
                 **result,
@@ -2047,9 +2200,8 @@ def api_delegate_task():
 
         try:
             from agent_manager import agent_manager
-            import asyncio
 
-            result = asyncio.run(agent_manager.delegate_to_agent(
+            result = async_runner.run(agent_manager.delegate_to_agent(
                 from_agent, to_agent, task, context, parent_task_id
             ))
 
@@ -2077,12 +2229,15 @@ def api_collaborate():
         "agents": ["reasoner", "researcher", "coder"],
         "task": "Design and implement API",
         "session_id": "optional-session-id",
-        "coordinator": "reasoner"
+        "coordinator": "reasoner",
+        "max_parallel": 3          (optional, agents running at once)
     }
 
     Returns:
     {
         "success": true,
+        "dependencies": {"coder": ["researcher"], ...},
+        "agent_results": [...],
         "final_result": "...",
         "status": "success"
     }
@@ -2093,6 +2248,7 @@ def api_collaborate():
         task = data.get('task', '')
         session_id = data.get('session_id', str(uuid.uuid4()))
         coordinator = data.get('coordinator', 'reasoner')
+        max_parallel = data.get('max_parallel')
 
         if not agents or not task:
             return jsonify({
@@ -2102,10 +2258,9 @@ def api_collaborate():
 
         try:
             from agent_manager import agent_manager
-            import asyncio
 
-            result = asyncio.run(agent_manager.collaborate_agents(
-                agents, task, session_id, coordinator
+            result = async_runner.run(agent_manager.collaborate_agents(
+                agents, task, session_id, coordinator, max_parallel
             ))
 
             return jsonify({
@@ -2122,6 +2277,56 @@ def api_collaborate():
     except Exception as e:
         return jsonify({'error': str(e), 'status': 'error'}), 500
 
+@app.route('/api/delegation/collaborate/stream', methods=['POST'])
+def api_collaborate_stream():
+    """
+    Collaboration with Server-Sent Events: each agent's result is sent as soon as it finishes.
+
+    Request body: same as /api/delegation/collaborate
+
+    Returns: SSE stream with events:
+    - plan: {"plan": "...", "dependencies": {...}}
+    - agent_result: {"agent": "coder", "result": {...}, "success": true, ...}
+    - complete: {"results": {...}}
+    - error: {"content": "error message"}
+    """
+    try:
+        data = request.get_json() or {}
+        agents = data.get('agents', [])
+        task = data.get('task', '')
+        session_id = data.get('session_id', str(uuid.uuid4()))
+        coordinator = data.get('coordinator', 'reasoner')
+        max_parallel = data.get('max_parallel')
+    except Exception as e:
+        app.logger.error(f'Failed to parse request: {e}')
+        return jsonify({'error': 'Invalid request data'}), 400
+
+    if not agents or not task:
+        return jsonify({'error': 'agents and task are required', 'status': 'error'}), 400
+
+    def generate():
+        try:
+            from agent_manager import agent_manager
+
+            async_gen = agent_manager.delegation_manager.collaborate_stream(
+                agents, task, session_id, coordinator, max_parallel
+            )
+            for event in async_runner.iterate(async_gen):
+                yield f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+        except Exception as e:
+            app.logger.error(f'Collaboration streaming error: {e}')
+            yield f"event: error\ndata: {json.dumps({'content': str(e)})}\n\n"
+
+    return app.response_class(
+        generate(),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
 @app.route('/api/sandbox/execute', methods=['POST'])
 def api_sandbox_execute():
     """
@@ -2152,9 +2357,8 @@ def api_sandbox_execute():
 
         try:
             from agent_manager import agent_manager
-            import asyncio
 
-            result = asyncio.run(agent_manager.execute_code_safely(
+            result = async_runner.run(agent_manager.execute_code_safely(
                 code, language, timeout
             ))
 
@@ -2247,6 +2451,61 @@ def api_get_metrics_report():
     except Exception as e:
         return jsonify({'error': str(e), 'status': 'error'}), 500
 
+@app.route('/api/session/stats', methods=['GET'])
+def api_session_memory_stats():
+    """Get size and eviction counters of the in-memory session cache"""
+    try:
+        from conversation_memory import conversation_memory
+
+        return jsonify({
+            'memory': conversation_memory.get_memory_stats(),
+            'status': 'success'
+        }), 200
+
+    except ImportError as e:
+        return jsonify({'error': 'Conversation memory not available', 'status': 'error'}), 503
+    except Exception as e:
+        return jsonify({'error': str(e), 'status': 'error'}), 500
+
+@app.route('/api/session/search', methods=['GET'])
+def api_session_search():
+    """
+    Semantic search over past exchanges across sessions.
+
+    Query parameters: q (required), k (default 5, max 50), session_id,
+    agent, since/until (Unix timestamps).
+    """
+    try:
+        from agent_manager import agent_manager
+
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'error': 'No query provided', 'status': 'error'}), 400
+
+        k = max(1, min(request.args.get('k', 5, type=int), 50))
+        result = agent_manager.conversation_index.search(
+            query, k=k,
+            session_id=request.args.get('session_id') or None,
+            agent_type=request.args.get('agent') or None,
+            since=request.args.get('since', type=float),
+            until=request.args.get('until', type=float)
+        )
+        if not result.get('success'):
+            return jsonify({'error': result.get('error'), 'status': 'error'}), 503
+
+        return jsonify({
+            'results': result['results'],
+            'count': len(result['results']),
+            'query': query,
+            'search_ms': result['search_ms'],
+            'status': 'success'
+        }), 200
+
+    except ImportError as e:
+        return jsonify({'error': 'Multi-agent system not available', 'status': 'error'}), 503
+    except Exception as e:
+        return jsonify({'error': str(e), 'status': 'error'}), 500
+
 @app.route('/api/session/<session_id>', methods=['GET'])
 def api_get_session(session_id):
     """Get session information"""
@@ -2280,7 +2539,7 @@ def api_get_session_history(session_id):
             return jsonify({'error': 'Session not found', 'status': 'error'}), 404
 
         return jsonify({
-            'history': history,
+            'history': [message.to_dict() for message in history],
             'count': len(history),
             'status': 'success'
         }), 200
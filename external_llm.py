@@ -6,6 +6,7 @@ Supports Claude (Anthropic API) and GPT (OpenAI API)
 import os
 import json
 import time
+import asyncio
 from typing import Dict, Any, List, Optional
 from pathlib import Path
 
@@ -87,7 +88,7 @@ class ExternalLLM:
                 if system_prompt:
                     kwargs["system"] = system_prompt
 
-                response = client.messages.create(**kwargs)
+                response = await asyncio.to_thread(client.messages.create, **kwargs)
 
                 return {
                     'provider': 'claude',
@@ -120,7 +121,7 @@ class ExternalLLM:
                 if system_prompt:
                     data["system"] = system_prompt
 
-                response = requests.post(url, headers=headers, json=data, timeout=120)
+                response = await asyncio.to_thread(requests.post, url, headers=headers, json=data, timeout=120)
                 response.raise_for_status()
 
                 result = response.json()
@@ -161,7 +162,8 @@ class ExternalLLM:
                     messages.append({"role": "system", "content": system_prompt})
                 messages.append({"role": "user", "content": prompt})
 
-                response = client.chat.completions.create(
+                response = await asyncio.to_thread(
+                    client.chat.completions.create,
                     model=model,
                     messages=messages,
                     max_tokens=4096
@@ -200,7 +202,7 @@ class ExternalLLM:
                     "max_tokens": 4096
                 }
 
-                response = requests.post(url, headers=headers, json=data, timeout=120)
+                response = await asyncio.to_thread(requests.post, url, headers=headers, json=data, timeout=120)
                 response.raise_for_status()
 
                 result = response.json()
@@ -263,6 +263,8 @@ class MultiAgentUI {
             const decoder = new TextDecoder();
             let buffer = '';
             let fullResponse = '';
+            let toolLog = '';  // Progress lines for tool-using agents
+            let draftResponse = '';  // Speculative draft shown until the specialist answers
             let eventData = {
                 agent: null,
                 routing: null,
@@ -296,6 +298,46 @@ class MultiAgentUI {
                             this.updateAgentDisplay(data.agent, data.agent_name);
                         }
 
+                        if (data.type === 'tool_call' || data.type === 'tool_result') {
+                            // Replace this turn's raw TOOL/ARGS text with a progress line
+                            if (data.type === 'tool_call') {
+                                toolLog += `🔧 ${data.tool}…\n\n`;
+                                fullResponse = '';
+                            } else {
+                                toolLog = toolLog.replace(`🔧 ${data.tool}…`, `🔧 ${data.tool} ✓`);
+                            }
+
+                            if (!currentMessageDiv) {
+                                currentMessageDiv = this.addStreamingMessage('assistant', '', {
+                                    agent: eventData.agent
+                                });
+                            }
+                            this.updateStreamingMessage(currentMessageDiv, toolLog + fullResponse);
+                            continue;
+                        }
+
+                        if (data.type === 'draft' || data.type === 'confirm' || data.type === 'replace') {
+                            // Speculative draft from the fast model, then the specialist's verdict
+                            if (data.type === 'draft') {
+                                draftResponse += data.content || '';
+                            } else {
+                                // Confirm or replace: show the answer the server keeps, not the draft
+                                draftResponse = '';
+                                fullResponse = data.content || '';
+                            }
+
+                            if (!currentMessageDiv) {
+                                currentMessageDiv = this.addStreamingMessage('assistant', '', {
+                                    agent: eventData.agent
+                                });
+                            }
+                            const display = draftResponse
+                                ? `⚡ Draft — ${eventData.agent || 'specialist'} is checking…\n\n${draftResponse}`
+                                : fullResponse;
+                            this.updateStreamingMessage(currentMessageDiv, toolLog + display);
+                            continue;
+                        }
+
                         if (data.type === 'chunk' || data.content) {
                             const chunk = data.content || '';
                             fullResponse += chunk;
@@ -308,13 +350,19 @@ class MultiAgentUI {
                             }
 
                             // Update with new content
-                            this.updateStreamingMessage(currentMessageDiv, fullResponse);
+                            this.updateStreamingMessage(currentMessageDiv, toolLog + fullResponse);
                         }
 
                         if (data.type === 'done') {
                             eventData.executionTime = data.execution_time;
                             eventData.toolsUsed = data.tools_used || [];
 
+                            // Final answer only (tool turns are summarized in metadata)
+                            if (data.response && currentMessageDiv) {
+                                fullResponse = data.response;
+                                this.updateStreamingMessage(currentMessageDiv, fullResponse);
+                            }
+
                             // Track success metrics
                             if (window.agentQualityMonitor) {
                                 const perfRating = window.agentQualityMonitor.trackRequest(selectedAgent, startTime);
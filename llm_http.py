@@ -0,0 +1,487 @@
+#!/usr/bin/env python3
+"""
+Pooled Async HTTP Transport for LLM Backends
+Shared keep-alive connection pools for llama.cpp, vision and Ollama endpoints
+"""
+
+import os
+import json
+import asyncio
+import threading
+import contextlib
+import concurrent.futures
+from typing import Dict, Any, Optional, AsyncIterator
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+    print("Warning: aiohttp not installed. Run: pip install aiohttp (using threaded requests fallback)")
+
+
+@dataclass
+class EndpointConfig:
+    """Connection settings for a single backend origin"""
+    max_connections: int
+    connect_timeout: float
+    read_timeout: float
+    slots: Optional[int] = None  # Parallel slots reported by the backend (None: unknown)
+
+
+class LLMHttpPool:
+    """
+    Shared HTTP transport used by every agent backend.
+
+    Keeps one keep-alive connection pool per endpoint origin so that
+    concurrent agent calls overlap instead of each paying TCP setup and
+    blocking the event loop. Uses aiohttp when installed, otherwise runs a
+    pooled requests.Session in worker threads.
+    """
+
+    # Per-origin connection limits used until the backend reports its slot count
+    # (llama-server /props). The launchers don't pass --parallel, so these are
+    # only upper bounds; extra connections wait server-side.
+    DEFAULT_LIMITS = {
+        'http://127.0.0.1:8000': 4,    # llama.cpp (coder, reasoner, security)
+        'http://127.0.0.1:8001': 2,    # llama.cpp vision (LLaVA)
+        'http://127.0.0.1:11434': 2,   # Ollama (general)
+    }
+
+    def __init__(self):
+        self.default_max_connections = int(os.environ.get('PKN_HTTP_MAX_CONNECTIONS', 4))
+        self.default_connect_timeout = float(os.environ.get('PKN_HTTP_CONNECT_TIMEOUT', 10))
+        self.default_read_timeout = float(os.environ.get('PKN_HTTP_READ_TIMEOUT', 120))
+
+        # aiohttp sessions are bound to the loop that created them
+        self._sessions: Dict[tuple, Any] = {}  # {(loop_id, origin): (loop, session)}
+        self._in_use: Dict[Any, int] = {}  # {session: requests using it}
+        self._retired: Dict[Any, Any] = {}  # {session: loop}, replaced but still draining
+        self._lock = threading.RLock()
+
+        self.endpoints: Dict[str, EndpointConfig] = {}
+        for origin, limit in self.DEFAULT_LIMITS.items():
+            self.configure_endpoint(origin, max_connections=limit)
+
+        # PKN_HTTP_LIMITS="http://127.0.0.1:8000=2,http://127.0.0.1:8001=1" fixes limits;
+        # those origins are not resized from the backend's slot count
+        self._fixed_limits = set()
+        for entry in filter(None, os.environ.get('PKN_HTTP_LIMITS', '').split(',')):
+            origin, _, limit = entry.strip().rpartition('=')
+            try:
+                self.configure_endpoint(origin, max_connections=int(limit))
+                self._fixed_limits.add(self._origin(origin))
+            except ValueError:
+                print(f"Warning: Ignoring bad PKN_HTTP_LIMITS entry: {entry}")
+
+        self._probed: Dict[str, Optional[int]] = {}  # {origin: slots reported by /props}
+        self._probes: Dict[tuple, asyncio.Task] = {}  # {(loop_id, origin): probe in progress}
+
+        # Fallback transport (also pooled, keep-alive)
+        self._requests_session = None
+
+        self.stats = {
+            'requests': 0,
+            'streams': 0,
+            'errors': 0,
+            'sessions_created': 0
+        }
+
+    def configure_endpoint(self, base_url: str, max_connections: Optional[int] = None,
+                           connect_timeout: Optional[float] = None,
+                           read_timeout: Optional[float] = None) -> EndpointConfig:
+        """
+        Set connection limit and timeouts for a backend origin.
+
+        Args:
+            base_url: Any URL on the backend (path is ignored)
+            max_connections: Maximum simultaneous connections to this origin
+            connect_timeout: Seconds allowed to establish a connection
+            read_timeout: Seconds allowed between bytes of a response
+
+        Returns:
+            The resulting EndpointConfig
+        """
+        origin = self._origin(base_url)
+        current = self.endpoints.get(origin)
+
+        config = EndpointConfig(
+            max_connections=max_connections or (current.max_connections if current else self.default_max_connections),
+            connect_timeout=connect_timeout or (current.connect_timeout if current else self.default_connect_timeout),
+            read_timeout=read_timeout or (current.read_timeout if current else self.default_read_timeout),
+            slots=current.slots if current else None
+        )
+        self.endpoints[origin] = config
+
+        # New requests get a pool with the new limits; old pools drain, then close
+        with self._lock:
+            stale = [key for key in self._sessions if key[1] == origin]
+            for key in stale:
+                loop, session = self._sessions.pop(key)
+                if session in self._in_use:
+                    self._retired[session] = loop  # Closed by the last request using it
+                elif not loop.is_closed():
+                    loop.call_soon_threadsafe(lambda s=session: asyncio.ensure_future(s.close()))
+
+        return config
+
+    def _origin(self, url: str) -> str:
+        """Reduce a URL to scheme://host:port"""
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def get_endpoint_config(self, url: str) -> EndpointConfig:
+        """Get config for the origin of a URL, creating defaults if unknown"""
+        origin = self._origin(url)
+        if origin not in self.endpoints:
+            self.configure_endpoint(origin)
+        return self.endpoints[origin]
+
+    def _get_session(self, url: str):
+        """Get (or create) the aiohttp session for this URL's origin on the running loop"""
+        loop = asyncio.get_running_loop()
+        origin = self._origin(url)
+        key = (id(loop), origin)
+
+        with self._lock:
+            self._prune_closed_loops()
+
+            entry = self._sessions.get(key)
+            if entry and not entry[1].closed:
+                return entry[1]
+
+            config = self.get_endpoint_config(url)
+            connector = aiohttp.TCPConnector(
+                limit=config.max_connections,
+                limit_per_host=config.max_connections,
+                keepalive_timeout=60
+            )
+            session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(
+                    total=None,
+                    sock_connect=config.connect_timeout,
+                    sock_read=config.read_timeout
+                )
+            )
+            self._sessions[key] = (loop, session)
+            self.stats['sessions_created'] += 1
+            return session
+
+    @contextlib.asynccontextmanager
+    async def _use_session(self, url: str):
+        """Borrow the origin's session; a session retired meanwhile is closed once its last user is done"""
+        session = self._get_session(url)
+        with self._lock:
+            self._in_use[session] = self._in_use.get(session, 0) + 1
+        try:
+            yield session
+        finally:
+            with self._lock:
+                self._in_use[session] -= 1
+                drained = self._in_use[session] == 0
+                if drained:
+                    del self._in_use[session]
+                retired = drained and self._retired.pop(session, None) is not None
+            if retired:
+                await session.close()
+
+    def _prune_closed_loops(self):
+        """
+        Forget sessions whose event loop has already been closed.
+
+        Loop owners should await close() before closing their loop (the
+        shared runner does); a session left behind can no longer be closed
+        on its loop, so its sockets are released when it is collected.
+        """
+        dead = [key for key, (loop, _) in self._sessions.items() if loop.is_closed()]
+        for key in dead:
+            self._sessions.pop(key)
+        for session in [s for s, loop in self._retired.items() if loop.is_closed()]:
+            self._retired.pop(session)
+
+    def _get_requests_session(self) -> requests.Session:
+        """Get the shared requests.Session used by the threaded fallback"""
+        with self._lock:
+            if self._requests_session is None:
+                session = requests.Session()
+                for origin, config in self.endpoints.items():
+                    session.mount(origin, HTTPAdapter(
+                        pool_connections=1,
+                        pool_maxsize=config.max_connections,
+                        pool_block=True
+                    ))
+                self._requests_session = session
+            return self._requests_session
+
+    async def post_json(self, url: str, payload: Dict[str, Any],
+                        timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        POST a JSON payload and return the decoded JSON response.
+
+        Args:
+            url: Full endpoint URL
+            payload: JSON body
+            timeout: Optional read timeout override (seconds)
+
+        Returns:
+            Parsed JSON response body
+        """
+        config = self.get_endpoint_config(url)
+        read_timeout = timeout or config.read_timeout
+        self.stats['requests'] += 1
+
+        try:
+            if AIOHTTP_AVAILABLE:
+                async with self._use_session(url) as session, session.post(
+                    url,
+                    json=payload,
+                    timeout=aiohttp.ClientTimeout(
+                        total=None,
+                        sock_connect=config.connect_timeout,
+                        sock_read=read_timeout
+                    )
+                ) as response:
+                    response.raise_for_status()
+                    return await response.json(content_type=None)
+
+            def _post():
+                response = self._get_requests_session().post(
+                    url, json=payload, timeout=(config.connect_timeout, read_timeout)
+                )
+                response.raise_for_status()
+                return response.json()
+
+            return await asyncio.to_thread(_post)
+
+        except Exception:
+            self.stats['errors'] += 1
+            raise
+
+    async def get_json(self, url: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        GET a URL and return the decoded JSON response.
+
+        Args:
+            url: Full endpoint URL
+            timeout: Optional read timeout override (seconds)
+
+        Returns:
+            Parsed JSON response body
+        """
+        config = self.get_endpoint_config(url)
+        read_timeout = timeout or config.read_timeout
+        self.stats['requests'] += 1
+
+        try:
+            if AIOHTTP_AVAILABLE:
+                async with self._use_session(url) as session, session.get(
+                    url,
+                    timeout=aiohttp.ClientTimeout(
+                        total=None,
+                        sock_connect=config.connect_timeout,
+                        sock_read=read_timeout
+                    )
+                ) as response:
+                    response.raise_for_status()
+                    return await response.json(content_type=None)
+
+            def _get():
+                response = self._get_requests_session().get(url, timeout=(config.connect_timeout, read_timeout))
+                response.raise_for_status()
+                return response.json()
+
+            return await asyncio.to_thread(_get)
+
+        except Exception:
+            self.stats['errors'] += 1
+            raise
+
+    async def discover_slots(self, url: str) -> Optional[int]:
+        """
+        Ask a llama.cpp server how many parallel slots it runs (once per origin).
+
+        The origin's connection limit is set to the reported count unless it
+        was fixed with PKN_HTTP_LIMITS. Servers without /props (Ollama,
+        llama-cpp-python) leave the slot count unknown.
+
+        Args:
+            url: Any URL on the backend
+
+        Returns:
+            Number of slots, or None if the backend doesn't report it
+        """
+        origin = self._origin(url)
+        if origin in self._probed:
+            return self._probed[origin]
+
+        # Every caller waits for the one probe, so nobody starts on a pool about to be resized
+        key = (id(asyncio.get_running_loop()), origin)
+        probe = self._probes.get(key)
+        if probe is None:
+            probe = self._probes[key] = asyncio.ensure_future(self._probe_slots(origin))
+            probe.add_done_callback(lambda _: self._probes.pop(key, None))
+        return await asyncio.shield(probe)
+
+    async def _probe_slots(self, origin: str) -> Optional[int]:
+        """GET /props once and apply the reported slot count"""
+        slots = None
+        try:
+            props = await self.get_json(f"{origin}/props", timeout=5)
+            reported = props.get('total_slots') if isinstance(props, dict) else None
+            if isinstance(reported, int) and reported > 0:
+                slots = reported
+        except Exception:
+            pass  # Not llama-server (or not up yet): slot count stays unknown
+
+        self._probed[origin] = slots
+        if slots:
+            config = self.get_endpoint_config(origin)
+            config.slots = slots
+            if origin not in self._fixed_limits and config.max_connections != slots:
+                self.configure_endpoint(origin, max_connections=slots)
+        return slots
+
+    async def stream_lines(self, url: str, payload: Dict[str, Any],
+                           timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        POST a JSON payload and yield non-empty response lines as they arrive.
+
+        Closing the iterator early closes the connection, which makes
+        llama.cpp/Ollama stop generating.
+
+        Args:
+            url: Full endpoint URL
+            payload: JSON body (should request streaming)
+            timeout: Optional read timeout override (seconds)
+
+        Yields:
+            Decoded response lines (SSE 'data: ' prefixes are kept)
+        """
+        config = self.get_endpoint_config(url)
+        read_timeout = timeout or config.read_timeout
+        self.stats['streams'] += 1
+
+        try:
+            if AIOHTTP_AVAILABLE:
+                async with self._use_session(url) as session, session.post(
+                    url,
+                    json=payload,
+                    timeout=aiohttp.ClientTimeout(
+                        total=None,
+                        sock_connect=config.connect_timeout,
+                        sock_read=read_timeout
+                    )
+                ) as response:
+                    response.raise_for_status()
+                    async for raw_line in response.content:
+                        line = raw_line.decode('utf-8').strip()
+                        if line:
+                            yield line
+                return
+
+            async for line in self._stream_lines_threaded(url, payload, config.connect_timeout, read_timeout):
+                yield line
+
+        except Exception:
+            self.stats['errors'] += 1
+            raise
+
+    async def _stream_lines_threaded(self, url: str, payload: Dict[str, Any],
+                                     connect_timeout: float, read_timeout: float) -> AsyncIterator[str]:
+        """Fallback streaming: read a requests stream in a worker thread"""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=256)
+        stop = threading.Event()
+        done = object()
+
+        def _put(item):
+            # Block the reader thread (not the loop) while the queue is full
+            while not stop.is_set():
+                future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+                try:
+                    future.result(timeout=1)
+                    return
+                except concurrent.futures.TimeoutError:
+                    future.cancel()
+
+        def _reader():
+            try:
+                with self._get_requests_session().post(
+                    url, json=payload, timeout=(connect_timeout, read_timeout), stream=True
+                ) as response:
+                    response.raise_for_status()
+                    for raw_line in response.iter_lines():
+                        if stop.is_set():
+                            break
+                        if raw_line:
+                            _put(raw_line.decode('utf-8').strip())
+                _put(done)
+            except Exception as e:
+                if not stop.is_set():
+                    _put(e)
+
+        reader = loop.run_in_executor(None, _reader)
+
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            reader.cancel()
+
+    async def close(self):
+        """Close every pool owned by the running event loop"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            keys = [key for key, (owner, _) in self._sessions.items() if owner is loop]
+            sessions = [self._sessions.pop(key)[1] for key in keys]
+            retired = [session for session, owner in self._retired.items() if owner is loop]
+            for session in retired:
+                self._retired.pop(session)
+            sessions.extend(retired)
+
+        for session in sessions:
+            await session.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get transport statistics and endpoint configuration"""
+        with self._lock:
+            open_pools = len(self._sessions)
+
+        return {
+            **self.stats,
+            'backend': 'aiohttp' if AIOHTTP_AVAILABLE else 'requests',
+            'open_pools': open_pools,
+            'endpoints': {
+                origin: {
+                    'max_connections': config.max_connections,
+                    'slots': config.slots,
+                    'connect_timeout': config.connect_timeout,
+                    'read_timeout': config.read_timeout
+                }
+                for origin, config in self.endpoints.items()
+            }
+        }
+
+
+# Global instance shared by all agents
+llm_http_pool = LLMHttpPool()
+
+
+if __name__ == '__main__':
+    # Show transport configuration
+    print("=" * 60)
+    print("LLM HTTP POOL")
+    print("=" * 60)
+    print(json.dumps(llm_http_pool.get_stats(), indent=2))
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Compact Message Records
+Slotted message records, interned agent/tool names and bitset name sets for conversation history
+"""
+
+import sys
+import json
+import threading
+from collections.abc import Mapping
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+
+
+class NameTable:
+    """
+    Interns agent and tool names and assigns each one a bit.
+
+    Names repeat across every message of every session, so each distinct
+    name is stored once and messages share it. The bit numbers exist only
+    in this process (stored forms always use the names), so bitsets built
+    here never need to be migrated.
+    """
+
+    def __init__(self):
+        self._bits: Dict[str, int] = {}
+        self._names: List[str] = []
+        self._tuples: Dict[Tuple[str, ...], Tuple[str, ...]] = {(): ()}
+        self._lock = threading.Lock()
+
+    def intern(self, name: Optional[str]) -> Optional[str]:
+        """Shared copy of a name (None stays None)"""
+        if name is None:
+            return None
+        return sys.intern(name)
+
+    def bit(self, name: str) -> int:
+        """Bit mask for a name (a new bit the first time it is seen)"""
+        index = self._bits.get(name)
+        if index is None:
+            with self._lock:
+                index = self._bits.get(name)
+                if index is None:
+                    index = len(self._names)
+                    self._names.append(sys.intern(name))
+                    self._bits[self._names[index]] = index
+        return 1 << index
+
+    def known(self, name: str) -> int:
+        """Bit mask for a name, or 0 if it has never been seen (never registers)"""
+        index = self._bits.get(name)
+        return 0 if index is None else 1 << index
+
+    def mask(self, names: Iterable[str]) -> int:
+        """Bitset of several names"""
+        mask = 0
+        for name in names:
+            mask |= self.bit(name)
+        return mask
+
+    def names(self, mask: int) -> List[str]:
+        """Names whose bits are set, in the order they were first seen"""
+        result = []
+        index = 0
+        while mask:
+            if mask & 1:
+                result.append(self._names[index])
+            mask >>= 1
+            index += 1
+        return result
+
+    def tools(self, tools_used: Optional[Iterable[str]]) -> Tuple[str, ...]:
+        """Shared tuple for a message's tool list (order and repeats kept)"""
+        if not tools_used:
+            return ()
+        key = tuple(tools_used)
+        shared = self._tuples.get(key)
+        if shared is None:
+            shared = self._tuples.setdefault(key, tuple(sys.intern(name) for name in key))
+        return shared
+
+
+# Process-wide table shared by every session
+name_table = NameTable()
+
+
+class NameSet:
+    """
+    Set of agent or tool names stored as a bitset over name_table.
+
+    Supports the set operations ConversationMemory uses on session metadata
+    (add, update, issuperset, membership, iteration).
+    """
+
+    __slots__ = ('mask',)
+
+    def __init__(self, names: Iterable[str] = ()):
+        self.mask = name_table.mask(names)
+
+    def add(self, name: str):
+        self.mask |= name_table.bit(name)
+
+    def update(self, names: Iterable[str]):
+        self.mask |= name_table.mask(names)
+
+    def issuperset(self, names: Iterable[str]) -> bool:
+        for name in names:
+            bit = name_table.known(name)
+            if not bit or not self.mask & bit:
+                return False
+        return True
+
+    def __contains__(self, name: str) -> bool:
+        return bool(self.mask & name_table.known(name))
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(name_table.names(self.mask))
+
+    def __len__(self) -> int:
+        return bin(self.mask).count('1')
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, NameSet):
+            return self.mask == other.mask
+        if isinstance(other, (set, frozenset)):
+            return set(self) == other
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"NameSet({sorted(self)!r})"
+
+
+class Message(Mapping):
+    """
+    One conversation message.
+
+    Reads like the dict messages used to be (message['content'],
+    message.get('agent')), but holds its fields in slots: the id is the
+    message's row number in the database, the role and agent are interned,
+    and tools_used is a shared tuple. to_dict()/from_dict() convert to and
+    from the JSON form without loss.
+    """
+
+    __slots__ = ('id', 'role', 'content', 'timestamp', 'agent', 'tools')
+
+    KEYS = ('id', 'role', 'content', 'timestamp', 'agent', 'tools_used')
+
+    def __init__(self, id: Optional[int], role: str, content: str, timestamp: float,
+                 agent: Optional[str] = None, tools_used: Optional[Iterable[str]] = None):
+        self.id = id
+        self.role = name_table.intern(role)
+        self.content = content
+        self.timestamp = timestamp
+        self.agent = name_table.intern(agent)
+        self.tools = name_table.tools(tools_used)
+
+    @property
+    def tools_used(self) -> List[str]:
+        return list(self.tools)
+
+    def __getitem__(self, key: str) -> Any:
+        if key == 'tools_used':
+            return list(self.tools)
+        if key in self.KEYS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.KEYS)
+
+    def __len__(self) -> int:
+        return len(self.KEYS)
+
+    def __repr__(self) -> str:
+        return f"Message({self.to_dict()!r})"
+
+    def nbytes(self) -> int:
+        """Approximate memory held by this record (shared names and tool tuples not counted)"""
+        return (sys.getsizeof(self) + sys.getsizeof(self.content) +
+                sys.getsizeof(self.timestamp) + sys.getsizeof(self.id))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON form: {'id', 'role', 'content', 'timestamp', 'agent', 'tools_used'}"""
+        return {
+            'id': self.id,
+            'role': self.role,
+            'content': self.content,
+            'timestamp': self.timestamp,
+            'agent': self.agent,
+            'tools_used': list(self.tools)
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Message':
+        """Inverse of to_dict"""
+        return cls(data.get('id'), data.get('role'), data.get('content'), data.get('timestamp'),
+                   data.get('agent'), data.get('tools_used'))
+
+    @classmethod
+    def from_row(cls, row) -> 'Message':
+        """Build from a messages table row (seq, role, content, timestamp, agent, tools_used JSON)"""
+        tools = row['tools_used']
+        return cls(row['seq'], row['role'], row['content'], row['timestamp'], row['agent'],
+                   json.loads(tools) if tools and tools != '[]' else None)
+
+
+if __name__ == '__main__':
+    import time
+    import uuid
+    import tracemalloc
+
+    print("=" * 60)
+    print("MESSAGE RECORD MEMORY BENCHMARK")
+    print("=" * 60)
+
+    COUNT = 100_000
+    agents = ['coder', 'reasoner', 'general', None]
+    tool_lists = [[], ['read_file'], ['read_file', 'write_file'], []]
+    contents = [f"message body {i % 50}" for i in range(50)]  # shared, so only overhead is measured
+
+    def measure(build):
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        messages = build()
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return messages, (after - before) / COUNT
+
+    def legacy():
+        return [
+            {
+                'id': str(uuid.uuid4()),
+                'role': 'assistant' if i % 2 else 'user',
+                'content': contents[i % 50],
+                'timestamp': time.time(),
+                'agent': agents[i % 4],
+                'tools_used': list(tool_lists[i % 4])
+            }
+            for i in range(COUNT)
+        ]
+
+    def compact():
+        return [
+            Message(i + 1, 'assistant' if i % 2 else 'user', contents[i % 50], time.time(),
+                    agents[i % 4], tool_lists[i % 4])
+            for i in range(COUNT)
+        ]
+
+    old_messages, old_bytes = measure(legacy)
+    new_messages, new_bytes = measure(compact)
+    print(f"\n{COUNT:,} messages (content excluded):")
+    print(f"  dict + uuid + list: {old_bytes:6.1f} bytes/message")
+    print(f"  Message record:     {new_bytes:6.1f} bytes/message ({old_bytes / new_bytes:.1f}x smaller)")
+
+    # Round trips
+    assert all(Message.from_dict(json.loads(json.dumps(m.to_dict()))) == m for m in new_messages[:1000])
+    assert dict(new_messages[2]) == new_messages[2].to_dict()
+    used = NameSet(['read_file'])
+    used.update(['write_file', 'read_file'])
+    assert NameSet(json.loads(json.dumps(sorted(used)))) == used == {'read_file', 'write_file'}
+    print("\n✓ JSON round trips are lossless")
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Response Cache for Deterministic Agent Queries
+Two-tier (in-memory LRU + SQLite) cache of LLM answers with per-agent TTLs
+"""
+
+import os
+import re
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+
+class ResponseCache:
+    """
+    Caches final LLM answers for repeated queries.
+
+    Keys are built from the agent type, model, a hash of the system prompt,
+    the whitespace/case-normalized conversation and any sampling params, so
+    "What is X?" and "what is  x?" share an entry. Hot entries live in an
+    in-memory LRU; everything is also written to SQLite so the cache
+    survives restarts. Disabled unless PKN_RESPONSE_CACHE=1.
+
+    Coroutines should use lookup()/store(): they answer memory hits inline
+    and move SQLite work to a worker thread. Every use of the shared
+    connection holds _lock.
+    """
+
+    # Seconds an answer stays valid, per agent type / scope
+    DEFAULT_TTLS = {
+        'general': 24 * 3600,
+        'vote': 24 * 3600,
+        'vision': 3600,
+        'coder': 3600,
+        'reasoner': 3600,
+    }
+
+    def __init__(self, project_root: str = "/home/gh0st/pkn", enabled: Optional[bool] = None,
+                 max_entries: Optional[int] = None, default_ttl: Optional[float] = None):
+        self.project_root = Path(project_root)
+        self.enabled = enabled if enabled is not None else os.environ.get('PKN_RESPONSE_CACHE', '0') == '1'
+        self.max_entries = max_entries or int(os.environ.get('PKN_RESPONSE_CACHE_ENTRIES', 512))
+        self.default_ttl = default_ttl or float(os.environ.get('PKN_RESPONSE_CACHE_TTL', 3600))
+        self.ttls = dict(self.DEFAULT_TTLS)
+
+        self._memory: OrderedDict = OrderedDict()  # {key: (expires_at, response)}
+        self._lock = threading.Lock()
+        self.conn = None
+
+        self.stats = {
+            'hits': 0,
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'bypassed': 0,
+            'stores': 0,
+            'expired': 0
+        }
+
+        if self.enabled:
+            self._init_database()
+
+    def _init_database(self):
+        """Open (or create) the on-disk tier"""
+        self.db_path = self.project_root / "memory" / "response_cache.db"
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Shared across the event loop thread and its workers (sqlite is serialized)
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                scope TEXT,
+                response TEXT NOT NULL,
+                created_at REAL,
+                expires_at REAL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_expires ON responses(expires_at)")
+        self.conn.commit()
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        """Collapse whitespace and case so near-identical prompts share a key"""
+        return re.sub(r'\s+', ' ', text or '').strip().casefold()
+
+    def make_key(self, scope: str, model: str, messages: List[Dict[str, str]],
+                 params: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Build a cache key for a chat request.
+
+        Args:
+            scope: Agent type (or feature name, e.g. 'vote')
+            model: Model identifier
+            messages: Chat messages (system messages are hashed verbatim)
+            params: Sampling parameters that change the answer (temperature, ...)
+
+        Returns:
+            Hex digest identifying the request
+        """
+        system_prompt = "\n".join(m['content'] for m in messages if m.get('role') == 'system')
+        conversation = [
+            [m.get('role'), self._normalize(m.get('content', ''))]
+            for m in messages if m.get('role') != 'system'
+        ]
+
+        material = json.dumps({
+            'scope': scope,
+            'model': model,
+            'system': hashlib.sha256(system_prompt.encode('utf-8')).hexdigest(),
+            'messages': conversation,
+            'params': params or {}
+        }, sort_keys=True)
+
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a cached response (memory first, then SQLite).
+
+        Returns:
+            The cached response, or None on a miss/expired entry
+        """
+        response = self._get_memory(key)
+        if response is None:
+            response = self._get_disk(key)
+        return response
+
+    async def lookup(self, key: str) -> Optional[str]:
+        """get() for coroutines: the SQLite tier is read on a worker thread"""
+        response = self._get_memory(key)
+        if response is None:
+            response = await asyncio.to_thread(self._get_disk, key)
+        return response
+
+    def _get_memory(self, key: str) -> Optional[str]:
+        """In-memory tier only (no miss is counted; the disk tier decides that)"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry:
+                expires_at, response = entry
+                if expires_at > time.time():
+                    self._memory.move_to_end(key)
+                    self.stats['hits'] += 1
+                    self.stats['memory_hits'] += 1
+                    return response
+                del self._memory[key]
+                self.stats['expired'] += 1
+        return None
+
+    def _get_disk(self, key: str) -> Optional[str]:
+        """SQLite tier; a hit is promoted to memory"""
+        with self._lock:
+            row = None
+            if self.conn is not None:
+                row = self.conn.execute(
+                    "SELECT response, expires_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+
+            if row and row[1] > time.time():
+                self._remember(key, row[0], row[1])
+                self.stats['hits'] += 1
+                self.stats['disk_hits'] += 1
+                return row[0]
+
+            self.stats['misses'] += 1
+            return None
+
+    def put(self, key: str, response: str, scope: Optional[str] = None, ttl: Optional[float] = None):
+        """
+        Store a response in both tiers.
+
+        Args:
+            key: Key from make_key()
+            response: Final answer text
+            scope: Agent type / feature, used to pick the TTL
+            ttl: Explicit TTL in seconds (overrides the per-scope default)
+        """
+        if not response:
+            return
+
+        now = time.time()
+        expires_at = now + (ttl or self.ttls.get(scope, self.default_ttl))
+        with self._lock:
+            self._remember(key, response, expires_at)
+            self.stats['stores'] += 1
+        self._put_disk(key, response, scope, now, expires_at)
+
+    async def store(self, key: str, response: str, scope: Optional[str] = None, ttl: Optional[float] = None):
+        """put() for coroutines: memory is updated at once, the SQLite write runs on a worker thread"""
+        if not response:
+            return
+
+        now = time.time()
+        expires_at = now + (ttl or self.ttls.get(scope, self.default_ttl))
+        with self._lock:
+            self._remember(key, response, expires_at)
+            self.stats['stores'] += 1
+        if self.conn is not None:
+            await asyncio.to_thread(self._put_disk, key, response, scope, now, expires_at)
+
+    def _put_disk(self, key: str, response: str, scope: Optional[str], created_at: float, expires_at: float):
+        """Write one entry to the SQLite tier"""
+        with self._lock:
+            if self.conn is None:
+                return
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, scope, response, created_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (key, scope, response, created_at, expires_at)
+            )
+            self.conn.commit()
+
+    def _remember(self, key: str, response: str, expires_at: float):
+        """Insert into the in-memory LRU, evicting the least recently used entries (caller holds _lock)"""
+        self._memory[key] = (expires_at, response)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def record_bypass(self):
+        """Count a request that skipped the lookup (bypass header)"""
+        with self._lock:
+            self.stats['bypassed'] += 1
+
+    def purge_expired(self) -> int:
+        """Delete expired entries from both tiers. Returns number of disk rows removed."""
+        now = time.time()
+
+        with self._lock:
+            stale = [key for key, (expires_at, _) in self._memory.items() if expires_at <= now]
+            for key in stale:
+                del self._memory[key]
+
+            if self.conn is None:
+                return 0
+
+            cursor = self.conn.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+            self.conn.commit()
+            return cursor.rowcount
+
+    def clear(self):
+        """Drop every cached response"""
+        with self._lock:
+            self._memory.clear()
+            if self.conn is not None:
+                self.conn.execute("DELETE FROM responses")
+                self.conn.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and tier sizes"""
+        with self._lock:
+            stats = dict(self.stats)
+            memory_entries = len(self._memory)
+            disk_entries = 0
+            if self.conn is not None:
+                disk_entries = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+        lookups = stats['hits'] + stats['misses']
+
+        return {
+            **stats,
+            'enabled': self.enabled,
+            'hit_rate': stats['hits'] / lookups if lookups else 0.0,
+            'memory_entries': memory_entries,
+            'disk_entries': disk_entries,
+            'max_entries': self.max_entries
+        }
+
+
+if __name__ == '__main__':
+    # Test the response cache
+    import tempfile
+
+    print("=" * 60)
+    print("RESPONSE CACHE TEST")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ResponseCache(tmp, enabled=True, max_entries=2)
+        messages = [
+            {'role': 'system', 'content': 'You are a helpful general assistant.'},
+            {'role': 'user', 'content': 'What is   Python?'}
+        ]
+        key = cache.make_key('general', 'ollama:qwen', messages)
+        near = cache.make_key('general', 'ollama:qwen', [messages[0], {'role': 'user', 'content': 'what is python?'}])
+        print(f"Near-identical prompts share key: {key == near}")
+
+        print(f"Cold lookup: {cache.get(key)}")
+        cache.put(key, 'Python is a programming language.', scope='general')
+
+        start = time.perf_counter()
+        print(f"Warm lookup: {cache.get(key)} ({(time.perf_counter() - start) * 1000:.3f} ms)")
+
+        # Evict from memory, then hit the SQLite tier
+        for i in range(3):
+            cache.put(cache.make_key('general', 'm', [{'role': 'user', 'content': str(i)}]), str(i), scope='general')
+        start = time.perf_counter()
+        print(f"Disk lookup: {cache.get(key)} ({(time.perf_counter() - start) * 1000:.3f} ms)")
+
+        print(f"Stats: {cache.get_stats()}")
+        cache.conn.close()
+
+    print("=" * 60)
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Session History for Agent Prompts
+Recent conversation turns under a token budget plus a rolling per-session summary
+"""
+
+import os
+import time
+import asyncio
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+
+from context_budget import TokenCounter, token_counter, MESSAGE_OVERHEAD_TOKENS
+from backend_scheduler import RequestPriority, current_priority
+from async_runner import async_runner
+
+
+# Context key the rolling summary is stored under (saved with the session)
+SUMMARY_KEY = 'rolling_summary'
+
+
+class SessionHistory:
+    """
+    Supplies prior turns of a conversation to an agent prompt.
+
+    The newest messages from ConversationMemory are included until the
+    history budget (a share of the agent's context budget) is used up;
+    everything older is represented by a rolling summary kept in the
+    session's context. When enough messages have fallen out of the window
+    without being summarized, the summary is refreshed in the background at
+    BACKGROUND priority, so the request that noticed never waits on it.
+    Prompt size is therefore constant no matter how long the session runs.
+
+    With summary_every set, the summary is also refreshed in the background
+    every N stored messages, so the session summary stays current even for
+    sessions whose history never overflows the window.
+    """
+
+    def __init__(self, summarize: Callable[[str, List[Dict[str, Any]]], Awaitable[str]],
+                 memory=None, counter: Optional[TokenCounter] = None,
+                 history_share: Optional[float] = None, summary_tokens: Optional[int] = None,
+                 summary_batch: Optional[int] = None, summary_every: Optional[int] = None):
+        """
+        Args:
+            summarize: async (previous_summary, messages) -> new summary
+            memory: ConversationMemory (default: the global instance, imported on first use)
+            counter: Token counter (default: the shared one)
+            history_share: Fraction of the agent's context budget for history
+            summary_tokens: Cap on the rolling summary's size
+            summary_batch: Unsummarized messages outside the window before a refresh
+            summary_every: Also refresh every N stored messages (0: off)
+        """
+        self.summarize = summarize
+        self.memory = memory
+        self.counter = counter or token_counter
+        self.enabled = os.environ.get('PKN_SESSION_HISTORY', '1') != '0'
+        self.history_share = history_share or float(os.environ.get('PKN_HISTORY_SHARE', 0.25))
+        self.summary_tokens = summary_tokens or int(os.environ.get('PKN_SUMMARY_TOKENS', 300))
+        self.summary_batch = summary_batch or int(os.environ.get('PKN_SUMMARY_BATCH', 4))
+        self.summary_every = summary_every if summary_every is not None else \
+            int(os.environ.get('PKN_SUMMARY_EVERY', 0))
+
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self.stats = {'builds': 0, 'messages_included': 0, 'summaries': 0, 'summary_errors': 0,
+                      'periodic_refreshes': 0}
+
+        if self.enabled and self.summary_every > 0:
+            memory = self._get_memory()
+            if memory is not None:
+                memory.add_listener(self._on_message)
+
+    def _get_memory(self):
+        if self.memory is None:
+            try:
+                from conversation_memory import conversation_memory
+                self.memory = conversation_memory
+            except Exception as e:
+                print(f"Warning: Session history unavailable: {e}")
+                self.enabled = False
+        return self.memory
+
+    def _on_message(self, session_id: str, message, total_messages: int):
+        """ConversationMemory listener: refresh the summary every summary_every messages"""
+        if total_messages % self.summary_every == 0:
+            self.stats['periodic_refreshes'] += 1
+            # Messages arrive on request threads; the refresh runs on the shared loop
+            async_runner.start().call_soon_threadsafe(self._schedule_refresh, session_id, None)
+
+    def get_summary(self, session_id: str) -> Dict[str, Any]:
+        """Current rolling summary: {'text': str, 'covered': messages summarized, 'updated_at': float}"""
+        memory = self._get_memory()
+        if memory is None:
+            return {}
+        return memory.get_context(session_id).get(SUMMARY_KEY) or {}
+
+    async def build(self, session_id: Optional[str], instruction: str, budget: int,
+                    endpoint: Optional[str] = None, model: Optional[str] = None) -> List[Dict[str, str]]:
+        """
+        Chat messages to place between the system prompt and the current request.
+
+        Args:
+            session_id: Conversation to draw from
+            instruction: Current request (dropped from the history if already recorded)
+            budget: Agent's context budget in tokens
+            endpoint: Backend base URL (for token counts)
+            model: Model identifier
+
+        Returns:
+            [summary system message?, user/assistant turns...] (empty without a session)
+        """
+        if not session_id or not self.enabled or self._get_memory() is None:
+            return []
+
+        # Only the newest messages are visited, so cost doesn't grow with the session
+        history = self.memory.get_conversation_history(session_id)
+        end = len(history)
+        # The server records the user's message before running the task
+        if end and history[end - 1].get('role') == 'user' and history[end - 1].get('content') == instruction:
+            end -= 1
+        if not end:
+            return []
+
+        window_tokens = int(budget * self.history_share)
+        message_cap = max(window_tokens // 2, 1)
+        used = 0
+        window = []
+        start = end
+        for index in range(end - 1, -1, -1):
+            message = history[index]
+            if message.get('role') not in ('user', 'assistant') or not message.get('content'):
+                start = index
+                continue
+            content = self._clip(message['content'], message_cap, endpoint)
+            tokens = await self.counter.count(content, endpoint, model) + MESSAGE_OVERHEAD_TOKENS
+            if used + tokens > window_tokens:
+                break
+            used += tokens
+            window.append({'role': message['role'], 'content': content})
+            start = index
+        window.reverse()
+
+        # A window can't start with a dangling assistant reply
+        while window and window[0]['role'] == 'assistant':
+            window.pop(0)
+            start += 1
+
+        summary = self.get_summary(session_id)
+        covered = summary.get('covered', 0)
+        if start - covered >= self.summary_batch:
+            self._schedule_refresh(session_id, start)
+
+        messages = []
+        if summary.get('text'):
+            messages.append({
+                'role': 'system',
+                'content': f"Summary of the earlier conversation:\n{summary['text']}"
+            })
+        messages.extend(window)
+
+        self.stats['builds'] += 1
+        self.stats['messages_included'] += len(window)
+        return messages
+
+    def _clip(self, text: str, max_tokens: int, endpoint: Optional[str]) -> str:
+        """Shorten one oversized message, keeping its beginning and end"""
+        if self.counter.estimate(text, endpoint) <= max_tokens:
+            return text
+        max_chars = self.counter.chars_for(max_tokens, endpoint)
+        return f"{text[:int(max_chars * 0.7)]}\n…[trimmed]…\n{text[-int(max_chars * 0.2):]}"
+
+    def _schedule_refresh(self, session_id: str, upto: Optional[int]):
+        """Fold messages [covered, upto) into the summary without blocking the caller"""
+        task = self._refreshing.get(session_id)
+        if task is not None and not task.done():
+            return
+        self._refreshing = {sid: t for sid, t in self._refreshing.items() if not t.done()}
+        self._refreshing[session_id] = asyncio.ensure_future(self.refresh(session_id, upto))
+
+    async def refresh(self, session_id: str, upto: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Update a session's rolling summary with messages that left the window.
+
+        Args:
+            session_id: Conversation to summarize
+            upto: Summarize messages before this index (default: all of them)
+
+        Returns:
+            The stored summary
+        """
+        memory = self._get_memory()
+        summary = self.get_summary(session_id)
+        covered = summary.get('covered', 0)
+        history = memory.get_conversation_history(session_id)
+        upto = len(history) if upto is None else min(upto, len(history))
+        pending = [m for m in history[covered:upto] if m.get('role') in ('user', 'assistant')]
+        if not pending:
+            return summary
+
+        priority_token = current_priority.set(RequestPriority.BACKGROUND)
+        try:
+            text = await self.summarize(summary.get('text', ''), pending)
+        except Exception as e:
+            self.stats['summary_errors'] += 1
+            print(f"Warning: Could not update summary for session {session_id[:8]}: {e}")
+            return summary
+        finally:
+            current_priority.reset(priority_token)
+
+        text = self._clip((text or '').strip(), self.summary_tokens, None)
+        summary = {'text': text, 'covered': upto, 'updated_at': time.time()}
+        memory.update_context(session_id, {SUMMARY_KEY: summary})
+        self.stats['summaries'] += 1
+        return summary
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'enabled': self.enabled,
+            'history_share': self.history_share,
+            'summary_every': self.summary_every,
+            'refreshing': sum(1 for task in self._refreshing.values() if not task.done())
+        }
@@ -4,14 +4,20 @@ Agent-to-Agent Delegation System
 Allows agents to collaborate and delegate subtasks to specialized agents
 """
 
+import os
+import re
 import time
 import uuid
 import json
+import asyncio
+import contextlib
 from typing import Dict, Any, List, Optional
 from dataclasses import dataclass, asdict
 from enum import Enum
 from pathlib import Path
 
+from tools.routing_tools import KeywordMatcher
+
 
 class MessageType(Enum):
     """Types of inter-agent messages"""
@@ -131,6 +137,12 @@ class AgentDelegationManager:
                 'summarize text'
             ]
         }
+        # One category per (agent, capability); a capability hits if any of its words occur
+        self.capability_matcher = KeywordMatcher({
+            (agent, capability): capability.split()
+            for agent, capabilities in self.agent_capabilities.items()
+            for capability in capabilities
+        })
 
     def delegate_task(self, from_agent: str, to_agent: str, task: str,
                       context: Dict[str, Any], parent_task_id: str,
@@ -173,7 +185,7 @@ class AgentDelegationManager:
 
         return delegation
 
-    def execute_delegation(self, delegation_id: str, session_id: str) -> Dict[str, Any]:
+    async def execute_delegation(self, delegation_id: str, session_id: str) -> Dict[str, Any]:
         """Execute a delegated task"""
 
         delegation = self.active_delegations.get(delegation_id)
@@ -185,12 +197,15 @@ class AgentDelegationManager:
 
         try:
             # Execute task with the target agent
-            result = self.agent_manager.execute_task(
+            result = await self.agent_manager.execute_task(
+                self._delegation_instruction(delegation),
+                session_id,
                 agent_type=delegation.to_agent,
-                task=delegation.task_description,
-                session_id=session_id,
-                context=delegation.context
+                priority='delegation',
+                include_history=False  # The instruction carries the context this step needs
             )
+            if result.get('status') == 'error':
+                raise RuntimeError(result.get('error', 'Agent execution failed'))
 
             delegation.status = "completed"
             delegation.completed_at = time.time()
@@ -222,6 +237,15 @@ class AgentDelegationManager:
                 'error': str(e)
             }
 
+    def _delegation_instruction(self, delegation: DelegationTask) -> str:
+        """Task text for the target agent, with any caller-supplied context appended"""
+        context = {k: v for k, v in delegation.context.items() if k not in ('collaboration_id', 'depends_on')}
+        if not context:
+            return delegation.task_description
+
+        context_text = json.dumps(context, indent=2, default=str)[:4000]
+        return f"{delegation.task_description}\n\nContext:\n{context_text}"
+
     def request_help(self, requesting_agent: str, help_needed: str,
                      context: Dict[str, Any], task_id: str) -> Dict[str, Any]:
         """Request help from the most appropriate agent"""
@@ -255,20 +279,19 @@ class AgentDelegationManager:
     def _select_helper_agent(self, task: str, exclude_agent: str) -> Optional[str]:
         """Select the best agent to help with a task"""
 
-        task_lower = task.lower()
         best_match = None
         best_score = 0
 
-        for agent, capabilities in self.agent_capabilities.items():
+        # Score based on keyword matching (one pass over the task)
+        scores = dict.fromkeys(self.agent_capabilities, 0)
+        for (agent, _), hits in self.capability_matcher.counts(task).items():
+            if hits:
+                scores[agent] += 1
+
+        for agent, score in scores.items():
             if agent == exclude_agent:
                 continue
 
-            # Score based on keyword matching
-            score = 0
-            for capability in capabilities:
-                if any(word in task_lower for word in capability.split()):
-                    score += 1
-
             if score > best_score:
                 best_score = score
                 best_match = agent
@@ -279,11 +302,46 @@ class AgentDelegationManager:
 
         return best_match
 
-    def collaborate(self, agents: List[str], task: str, session_id: str,
-                    coordinator: str = 'reasoner') -> Dict[str, Any]:
+    async def collaborate(self, agents: List[str], task: str, session_id: str,
+                          coordinator: str = 'reasoner', max_parallel: Optional[int] = None) -> Dict[str, Any]:
         """Multiple agents collaborate on a complex task"""
 
+        results = {}
+        stream = self.collaborate_stream(agents, task, session_id, coordinator, max_parallel)
+        async with contextlib.aclosing(stream):
+            async for event in stream:
+                if event['type'] == 'complete':
+                    results = event['results']
+
+        return results
+
+    async def collaborate_stream(self, agents: List[str], task: str, session_id: str,
+                                 coordinator: str = 'reasoner', max_parallel: Optional[int] = None):
+        """
+        Run a collaboration and yield progress as it happens.
+
+        The coordinator's plan is turned into a dependency DAG. Agents whose
+        dependencies are satisfied run concurrently (at most max_parallel at a
+        time) and each one sees the results of the agents it depends on.
+        Finished results are yielded as they arrive; the coordinator
+        synthesizes once every agent has finished.
+
+        Args:
+            agents: Participating agent types
+            task: The overall task
+            session_id: Session the delegations run under
+            coordinator: Agent that plans and synthesizes
+            max_parallel: Concurrent agents (default: PKN_COLLAB_CONCURRENCY or 3)
+
+        Yields:
+            dict: Events:
+                - {'type': 'plan', 'plan': str, 'dependencies': {agent: [agents]}}
+                - {'type': 'agent_result', 'agent': str, 'result': dict, 'success': bool, ...}
+                - {'type': 'complete', 'results': dict}
+        """
         collaboration_id = str(uuid.uuid4())
+        max_parallel = max_parallel or int(os.environ.get('PKN_COLLAB_CONCURRENCY', 3))
+        agents = list(dict.fromkeys(agents))  # One role per agent
 
         # Step 1: Coordinator creates plan
         plan_request = f"""Create a collaboration plan for this task involving these agents: {', '.join(agents)}
@@ -295,75 +353,186 @@ For each agent, specify:
 2. What information they need from other agents
 3. In what order they should work
 
-Format as JSON with agent roles and dependencies."""
+Format as JSON: {{"agents": [{{"agent": "name", "task": "what to do", "depends_on": ["other agent names"]}}]}}
+Only list a dependency when the agent really needs that agent's output; independent agents work in parallel."""
 
-        plan_result = self.agent_manager.execute_task(
-            agent_type=coordinator,
-            task=plan_request,
-            session_id=session_id,
-            context={'collaboration_id': collaboration_id}
-        )
+        plan_result = await self.agent_manager.execute_task(plan_request, session_id, agent_type=coordinator,
+                                                           include_history=False)
+        plan_text = plan_result.get('response', '')
+        roles, dependencies = self._parse_collaboration_plan(plan_text, agents)
+
+        yield {'type': 'plan', 'plan': plan_text, 'dependencies': dependencies}
 
-        # Step 2: Execute plan with each agent
         results = {
             'collaboration_id': collaboration_id,
             'coordinator': coordinator,
             'participants': agents,
             'task': task,
+            'dependencies': dependencies,
             'agent_results': []
         }
 
-        for agent in agents:
-            # Build context from previous agent results
-            agent_context = {
-                'collaboration_id': collaboration_id,
-                'previous_results': results['agent_results'],
-                'full_task': task
-            }
+        # Step 2: Execute the DAG, streaming each result to the caller as it finishes
+        stream = self._run_collaboration_dag(
+            agents, roles, dependencies, task, plan_text,
+            coordinator, collaboration_id, session_id, max_parallel
+        )
+        async with contextlib.aclosing(stream):
+            async for entry in stream:
+                results['agent_results'].append(entry)
+                yield {'type': 'agent_result', **entry}
+
+        # Step 3: Coordinator synthesizes results (one call, once every agent is done)
+        results['final_result'] = await self._synthesize(results['agent_results'], task, coordinator, session_id)
 
-            # Delegate specific subtask to this agent
-            subtask = f"Your part in this collaboration: {task}\n\nCoordinator's plan: {plan_result}"
+        results['success'] = True
+        yield {'type': 'complete', 'results': results}
+
+    async def _run_collaboration_dag(self, agents: List[str], roles: Dict[str, str],
+                                     dependencies: Dict[str, List[str]], task: str, plan_text: str,
+                                     coordinator: str, collaboration_id: str, session_id: str,
+                                     max_parallel: int):
+        """Run each agent once its dependencies are done; yields result entries in completion order"""
+        semaphore = asyncio.Semaphore(max_parallel)
+        finished: Dict[str, Dict[str, Any]] = {}
+        waiting = list(agents)
+        running: Dict[asyncio.Future, str] = {}
+
+        async def run_agent(agent: str) -> Dict[str, Any]:
+            # Results of the agents this one depends on
+            upstream = [finished[dep] for dep in dependencies[agent]]
+            subtask = f"Your part in this collaboration: {roles.get(agent) or task}\n\nFull task: {task}\n\nCoordinator's plan: {plan_text}"
+            if upstream:
+                upstream_text = "\n\n".join(
+                    f"[{entry['agent']}]\n{self._result_text(entry['result'])}" for entry in upstream
+                )
+                subtask += f"\n\nResults from agents you depend on:\n{upstream_text}"
 
             delegation = self.delegate_task(
                 from_agent=coordinator,
                 to_agent=agent,
                 task=subtask,
-                context=agent_context,
+                context={'collaboration_id': collaboration_id, 'depends_on': dependencies[agent]},
                 parent_task_id=collaboration_id,
                 priority=DelegationPriority.HIGH
             )
 
-            # Execute delegation
-            agent_result = self.execute_delegation(delegation.id, session_id)
+            async with semaphore:
+                agent_result = await self.execute_delegation(delegation.id, session_id)
 
-            results['agent_results'].append({
+            return {
                 'agent': agent,
                 'delegation_id': delegation.id,
+                'depends_on': dependencies[agent],
                 'result': agent_result.get('result'),
-                'success': agent_result.get('success', False)
-            })
+                'error': agent_result.get('error'),
+                'success': agent_result.get('success', False),
+                'duration': agent_result.get('duration')
+            }
+
+        try:
+            while waiting or running:
+                # Start every agent whose dependencies have all finished
+                for agent in [a for a in waiting if all(dep in finished for dep in dependencies[a])]:
+                    waiting.remove(agent)
+                    running[asyncio.ensure_future(run_agent(agent))] = agent
+
+                if not running:
+                    break  # Unsatisfiable dependencies (plan parsing guarantees a DAG)
+
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    agent = running.pop(future)
+                    finished[agent] = future.result()
+                    yield finished[agent]
+        finally:
+            for future in running:
+                future.cancel()
+
+    async def _synthesize(self, entries: List[Dict[str, Any]], task: str, coordinator: str,
+                          session_id: str) -> Dict[str, Any]:
+        """Have the coordinator combine every agent's result"""
+        sections = []
+        for entry in entries:
+            status = "" if entry['success'] else f" (failed: {entry.get('error')})"
+            sections.append(f"### {entry['agent']}{status}\n{self._result_text(entry['result'])}")
 
-        # Step 3: Coordinator synthesizes results
         synthesis_task = f"""Synthesize these collaboration results into a final answer:
 
 Original task: {task}
 
 Agent results:
-{json.dumps(results['agent_results'], indent=2)}
+{chr(10).join(sections)}
 
 Provide a unified, coherent response that combines the best of each agent's contribution."""
 
-        final_result = self.agent_manager.execute_task(
-            agent_type=coordinator,
-            task=synthesis_task,
-            session_id=session_id,
-            context={'collaboration_id': collaboration_id}
-        )
+        return await self.agent_manager.execute_task(synthesis_task, session_id, agent_type=coordinator,
+                                                     include_history=False)
 
-        results['final_result'] = final_result
-        results['success'] = True
+    def _result_text(self, result: Any) -> str:
+        """Response text of an execute_task result"""
+        if isinstance(result, dict):
+            return str(result.get('response', ''))
+        return str(result or '')
 
-        return results
+    def _parse_collaboration_plan(self, plan_text: str, agents: List[str]) -> tuple[Dict[str, str], Dict[str, List[str]]]:
+        """
+        Extract per-agent roles and dependencies from the coordinator's plan.
+
+        Accepts {"agents": [{"agent", "task", "depends_on"}]} (or "steps"/"roles"
+        lists, or a dict keyed by agent). Unknown agents, self-dependencies and
+        edges that would create a cycle are dropped, so the result is a DAG.
+        Agents the plan doesn't mention have no dependencies.
+
+        Returns: (roles, dependencies)
+        """
+        roles = {agent: '' for agent in agents}
+        dependencies = {agent: [] for agent in agents}
+
+        match = re.search(r'\{.*\}', plan_text or '', re.DOTALL)
+        try:
+            plan = json.loads(match.group(0)) if match else {}
+        except (json.JSONDecodeError, ValueError):
+            plan = {}
+
+        entries = []
+        if isinstance(plan, dict):
+            listed = plan.get('agents') or plan.get('steps') or plan.get('roles')
+            if isinstance(listed, list):
+                entries = [e for e in listed if isinstance(e, dict)]
+            elif isinstance(listed, dict) or not listed:
+                source = listed if isinstance(listed, dict) else plan
+                entries = [{'agent': name, **spec} for name, spec in source.items() if isinstance(spec, dict)]
+
+        for entry in entries:
+            agent = str(entry.get('agent') or entry.get('name') or '').lower()
+            if agent not in dependencies:
+                continue
+
+            role = entry.get('task') or entry.get('role') or entry.get('description') or ''
+            roles[agent] = role if isinstance(role, str) else json.dumps(role)
+
+            deps = entry.get('depends_on') or entry.get('dependencies') or entry.get('needs') or []
+            if isinstance(deps, str):
+                deps = [deps]
+            for dep in deps:
+                dep = str(dep).lower()
+                if dep in dependencies and dep != agent and not self._reaches(dependencies, dep, agent):
+                    dependencies[agent].append(dep)
+
+        return roles, dependencies
+
+    def _reaches(self, dependencies: Dict[str, List[str]], start: str, target: str) -> bool:
+        """True if start (transitively) depends on target"""
+        stack, seen = [start], set()
+        while stack:
+            node = stack.pop()
+            if node == target:
+                return True
+            if node not in seen:
+                seen.add(node)
+                stack.extend(dependencies.get(node, []))
+        return False
 
     def _send_result_message(self, delegation: DelegationTask, result: Any):
         """Send result message back to requesting agent"""
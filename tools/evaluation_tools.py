@@ -5,14 +5,19 @@ Monitors agent performance, tracks metrics, and provides insights for improvemen
 """
 
 import sqlite3
+import threading
+import functools
 import time
 import json
 import statistics
+from collections import deque, defaultdict
 from pathlib import Path
 from typing import Dict, Any, List, Optional, Tuple
 from dataclasses import dataclass, asdict
 from datetime import datetime, timedelta
 
+from tools.routing_tools import KeywordMatcher
+
 
 @dataclass
 class ExecutionRecord:
@@ -37,6 +42,15 @@ class ExecutionRecord:
         return d
 
 
+def _locked(method):
+    """Run an AgentEvaluator method while holding its connection lock"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
 class AgentEvaluator:
     """
     Tracks and evaluates agent performance over time.
@@ -48,10 +62,14 @@ class AgentEvaluator:
         self.db_path = self.project_root / "memory" / "agent_performance.db"
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
 
-        self.conn = sqlite3.connect(str(self.db_path))
+        # Shared by the event loop thread, its workers and Flask threads; every use
+        # of the connection holds _lock (reentrant: report methods call each other)
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
         self.conn.row_factory = sqlite3.Row  # Enable dict-like access
+        self._lock = threading.RLock()
         self._init_database()
 
+    @_locked
     def _init_database(self):
         """Initialize database schema"""
 
@@ -116,7 +134,9 @@ class AgentEvaluator:
 
         # Add default task categories if not exists
         self._add_default_categories()
+        self._load_category_matcher()
 
+    @_locked
     def _add_default_categories(self):
         """Add default task categories"""
 
@@ -142,6 +162,16 @@ class AgentEvaluator:
 
         self.conn.commit()
 
+    @_locked
+    def _load_category_matcher(self):
+        """Compile the task category keywords once (instead of a SELECT per logged task)"""
+
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT name, keywords FROM task_categories WHERE keywords != '' ORDER BY id")
+        self.category_matcher = KeywordMatcher({
+            row['name']: row['keywords'].split(',') for row in cursor.fetchall()
+        })
+
     def log_execution(self, agent_type: str, task: str, response: str,
                       duration_ms: int, success: bool, error: Optional[str] = None,
                       tools_used: List[str] = None, session_id: str = "",
@@ -152,46 +182,38 @@ class AgentEvaluator:
         # Classify task
         task_category = self._classify_task(task)
 
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            INSERT INTO executions
-            (agent_type, task, task_category, response, duration_ms, success, error,
-             tools_used, user_feedback_rating, user_feedback_text, session_id, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            agent_type, task, task_category, response, duration_ms, success, error,
-            json.dumps(tools_used or []), user_feedback_rating, user_feedback_text,
-            session_id, time.time()
-        ))
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                INSERT INTO executions
+                (agent_type, task, task_category, response, duration_ms, success, error,
+                 tools_used, user_feedback_rating, user_feedback_text, session_id, timestamp)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                agent_type, task, task_category, response, duration_ms, success, error,
+                json.dumps(tools_used or []), user_feedback_rating, user_feedback_text,
+                session_id, time.time()
+            ))
 
-        self.conn.commit()
+            self.conn.commit()
 
-        # Update metrics cache
-        self._update_metrics_cache(agent_type)
+            # Update metrics cache
+            self._update_metrics_cache(agent_type)
 
     def _classify_task(self, task: str) -> str:
         """Classify task into a category"""
 
-        task_lower = task.lower()
-
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT name, keywords FROM task_categories WHERE keywords != ''")
-
         best_match = 'other'
         best_score = 0
 
-        for row in cursor.fetchall():
-            category = row['name']
-            keywords = row['keywords'].split(',')
-
-            score = sum(1 for keyword in keywords if keyword in task_lower)
-
+        for category, score in self.category_matcher.counts(task).items():
             if score > best_score:
                 best_score = score
                 best_match = category
 
         return best_match
 
+    @_locked
     def _update_metrics_cache(self, agent_type: str):
         """Update cached metrics for an agent"""
 
@@ -225,6 +247,7 @@ class AgentEvaluator:
 
         self.conn.commit()
 
+    @_locked
     def get_agent_metrics(self, agent_type: str, days: int = 30) -> Dict[str, Any]:
         """Get performance metrics for an agent"""
 
@@ -304,6 +327,7 @@ class AgentEvaluator:
 
         return metrics
 
+    @_locked
     def get_weak_areas(self, agent_type: str, min_failures: int = 3) -> List[Dict[str, Any]]:
         """Identify areas where agent struggles"""
 
@@ -350,6 +374,7 @@ class AgentEvaluator:
 
         return weak_areas
 
+    @_locked
     def compare_agents(self, metric: str = 'success_rate', days: int = 30) -> List[Dict[str, Any]]:
         """Compare all agents on a specific metric"""
 
@@ -442,6 +467,7 @@ class AgentEvaluator:
 
         return suggestions
 
+    @_locked
     def export_metrics(self, output_file: Optional[str] = None) -> str:
         """Export all metrics to JSON file"""
 
@@ -473,6 +499,7 @@ class AgentEvaluator:
 
         return str(output_file)
 
+    @_locked
     def get_summary_report(self, days: int = 7) -> str:
         """Generate a human-readable summary report"""
 
@@ -534,11 +561,101 @@ Agent Performance:
 
         return report
 
+    @_locked
+    def get_recent_executions(self, agent_type: str, limit: int = 100) -> List[Tuple[int, bool]]:
+        """Get (duration_ms, success) for an agent's most recent executions, oldest first"""
+
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT duration_ms, success
+            FROM executions
+            WHERE agent_type = ?
+            ORDER BY id DESC
+            LIMIT ?
+        """, (agent_type, limit))
+
+        return [(row['duration_ms'] or 0, bool(row['success'])) for row in reversed(cursor.fetchall())]
+
+    @_locked
     def close(self):
         """Close database connection"""
         self.conn.close()
 
 
+class LiveAgentMetrics:
+    """
+    In-memory rolling performance window for routing decisions.
+
+    Keeps the last `window` durations and outcomes per agent, plus the number
+    of requests currently in flight per agent and per backend, so the router
+    can read p50/p95 latency, success rate and load without touching SQLite.
+    Seed it from AgentEvaluator history on startup.
+    """
+
+    def __init__(self, window: int = 100):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples: Dict[str, deque] = defaultdict(lambda: deque(maxlen=self.window))
+        self.in_flight: Dict[str, int] = defaultdict(int)           # agent -> running
+        self.backend_in_flight: Dict[str, int] = defaultdict(int)   # backend -> running
+
+    def seed(self, agent_type: str, executions: List[Tuple[int, bool]]):
+        """Load historical (duration_ms, success) samples"""
+        with self._lock:
+            samples = self._samples[agent_type]
+            for duration_ms, success in executions:
+                samples.append((duration_ms / 1000.0, success))
+
+    def begin(self, agent_type: str, backend: str):
+        """Mark a request as started"""
+        with self._lock:
+            self.in_flight[agent_type] += 1
+            self.backend_in_flight[backend] += 1
+
+    def end(self, agent_type: str, backend: str, duration: float, success: Optional[bool]):
+        """
+        Mark a request as finished.
+
+        Args:
+            duration: Seconds
+            success: Outcome; None (e.g. cancelled) releases the slot without recording a sample
+        """
+        with self._lock:
+            self.in_flight[agent_type] = max(0, self.in_flight[agent_type] - 1)
+            self.backend_in_flight[backend] = max(0, self.backend_in_flight[backend] - 1)
+            if success is not None:
+                self._samples[agent_type].append((duration, success))
+
+    def profile(self, agent_type: str) -> Dict[str, Any]:
+        """Latency percentiles (seconds), success rate and load for an agent"""
+        with self._lock:
+            samples = list(self._samples.get(agent_type, ()))
+            in_flight = self.in_flight.get(agent_type, 0)
+
+        if not samples:
+            return {'samples': 0, 'p50': None, 'p95': None, 'success_rate': None, 'in_flight': in_flight}
+
+        durations = sorted(duration for duration, success in samples if success) or \
+            sorted(duration for duration, _ in samples)
+        return {
+            'samples': len(samples),
+            'p50': durations[len(durations) // 2],
+            'p95': durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+            'success_rate': sum(1 for _, success in samples if success) / len(samples),
+            'in_flight': in_flight
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Profiles for every agent seen so far, plus backend load"""
+        with self._lock:
+            agents = list(self._samples) + [a for a in self.in_flight if a not in self._samples]
+            backends = dict(self.backend_in_flight)
+        return {
+            'agents': {agent: self.profile(agent) for agent in agents},
+            'backend_in_flight': backends
+        }
+
+
 if __name__ == "__main__":
     print("Agent Evaluation System loaded successfully!")
 
@@ -4,9 +4,14 @@ Planning and Execution Separation System
 Breaks complex tasks into structured plans before execution
 """
 
+import os
 import json
 import time
 import uuid
+import queue
+import asyncio
+import threading
+from collections import deque
 from typing import Dict, Any, List, Optional
 from dataclasses import dataclass, asdict
 from enum import Enum
@@ -75,6 +80,144 @@ class ExecutionPlan:
         return d
 
 
+class JournalWriter:
+    """
+    Background thread that appends and fsyncs journal lines.
+
+    Plans checkpoint from the event loop, where an fsync would stall every
+    other request. Lines are queued instead and written in order; lines
+    queued while a write is in progress share the next fsync.
+    """
+
+    def __init__(self):
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def write(self, path: Path, line: str):
+        """Queue one line for appending to path"""
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="plan-journal", daemon=True)
+                    self._thread.start()
+        self._queue.put((path, line))
+
+    def flush(self):
+        """Block until every queued line is on disk"""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            lines_by_path: Dict[Path, List[str]] = {}
+            for path, line in batch:
+                lines_by_path.setdefault(path, []).append(line)
+
+            for path, lines in lines_by_path.items():
+                try:
+                    with open(path, 'a') as f:
+                        f.write(''.join(lines))
+                        f.flush()
+                        os.fsync(f.fileno())
+                except OSError as e:
+                    print(f"Warning: Failed to write plan journal {path}: {e}")
+
+            for _ in batch:
+                self._queue.task_done()
+
+
+# Process-wide writer shared by every journal
+journal_writer = JournalWriter()
+
+
+class PlanJournal:
+    """
+    Append-only checkpoint log for plan execution.
+
+    Each plan keeps its definition in plan_{id}.json (written once, when the
+    plan is created) and a plan_{id}.jsonl journal with one line per finished
+    step or plan status change. Replaying the journal over the definition
+    restores every completed step's result after a crash.
+
+    Records are written by journal_writer off the calling thread; flush()
+    waits until they are durable.
+    """
+
+    def __init__(self, plans_dir: Path):
+        self.plans_dir = Path(plans_dir)
+        self.plans_dir.mkdir(parents=True, exist_ok=True)
+
+    def journal_path(self, plan_id: str) -> Path:
+        return self.plans_dir / f"plan_{plan_id}.jsonl"
+
+    def append(self, plan_id: str, record: Dict[str, Any]):
+        """Queue one checkpoint record (serialized now, appended and fsynced by the writer thread)"""
+        record = {'ts': time.time(), **record}
+        journal_writer.write(self.journal_path(plan_id), json.dumps(record, default=str) + "\n")
+
+    def flush(self):
+        """Block until every queued record is on disk"""
+        journal_writer.flush()
+
+    def record_step(self, plan: ExecutionPlan, step: PlanStep):
+        """Checkpoint a step that reached a final state"""
+        self.append(plan.id, {
+            'type': 'step',
+            'step_id': step.id,
+            'status': step.status.value,
+            'result': step.result,
+            'error': step.error,
+            'actual_duration': step.actual_duration
+        })
+
+    def record_plan(self, plan: ExecutionPlan):
+        """Checkpoint the plan-level status"""
+        self.append(plan.id, {
+            'type': 'plan',
+            'status': plan.status,
+            'started_at': plan.started_at,
+            'completed_at': plan.completed_at
+        })
+
+    def replay(self, plan: ExecutionPlan) -> ExecutionPlan:
+        """Apply journalled checkpoints to a freshly loaded plan"""
+        self.flush()  # Include records still queued in this process
+        path = self.journal_path(plan.id)
+        if not path.exists():
+            return plan
+
+        steps_by_id = {step.id: step for step in plan.steps}
+
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn write from a crash; everything before it is intact
+                    break
+
+                if record.get('type') == 'step':
+                    step = steps_by_id.get(record.get('step_id'))
+                    if step:
+                        step.status = StepStatus(record['status'])
+                        step.result = record.get('result')
+                        step.error = record.get('error')
+                        step.actual_duration = record.get('actual_duration')
+                elif record.get('type') == 'plan':
+                    plan.status = record['status']
+                    plan.started_at = record.get('started_at')
+                    plan.completed_at = record.get('completed_at')
+
+        return plan
+
+
 class TaskPlanner:
     """
     Creates structured execution plans for complex tasks.
@@ -85,16 +228,16 @@ class TaskPlanner:
         self.llm_client = llm_client
         self.project_root = Path(project_root)
         self.plans_dir = self.project_root / "memory" / "plans"
-        self.plans_dir.mkdir(parents=True, exist_ok=True)
+        self.journal = PlanJournal(self.plans_dir)
 
-    def create_plan(self, task: str, context: Optional[Dict] = None) -> ExecutionPlan:
+    async def create_plan(self, task: str, context: Optional[Dict] = None) -> ExecutionPlan:
         """Create a detailed execution plan for a task"""
 
         # Build planning prompt
         plan_prompt = self._build_planning_prompt(task, context)
 
         # Call LLM to create plan
-        response = self.llm_client.call(
+        response = await self.llm_client.call(
             prompt=plan_prompt,
             temperature=0.3,  # Lower temp for structured planning
             max_tokens=2000
@@ -276,14 +419,14 @@ Plan:"""
         }
 
     def _save_plan(self, plan: ExecutionPlan):
-        """Save plan to disk"""
+        """Save plan definition to disk (execution progress goes to the journal)"""
 
         plan_file = self.plans_dir / f"plan_{plan.id}.json"
         with open(plan_file, 'w') as f:
-            json.dump(plan.to_dict(), f, indent=2)
+            json.dump(plan.to_dict(), f, default=str)
 
     def load_plan(self, plan_id: str) -> Optional[ExecutionPlan]:
-        """Load a saved plan"""
+        """Load a saved plan, including checkpointed step results"""
 
         plan_file = self.plans_dir / f"plan_{plan_id}.json"
         if not plan_file.exists():
@@ -311,21 +454,48 @@ Plan:"""
             steps.append(step)
 
         data['steps'] = steps
-        return ExecutionPlan(**data)
+        return self.journal.replay(ExecutionPlan(**data))
 
 
 class PlanExecutor:
     """
-    Executes structured plans step-by-step.
-    Handles dependencies, error recovery, and progress tracking.
+    Executes structured plans as a dependency graph.
+    Independent steps run concurrently; handles error recovery and progress tracking.
     """
 
-    def __init__(self, agent_manager):
+    def __init__(self, agent_manager, project_root: str = "/home/gh0st/pkn",
+                 max_workers: Optional[int] = None):
         self.agent_manager = agent_manager
+        self.journal = PlanJournal(Path(project_root) / "memory" / "plans")
+        self.max_workers = max_workers or int(os.environ.get('PKN_PLAN_WORKERS', 3))
         self.active_plans = {}
 
-    def execute_plan(self, plan: ExecutionPlan, session_id: str) -> Dict[str, Any]:
-        """Execute a plan step by step"""
+    async def execute_plan(self, plan: ExecutionPlan, session_id: str,
+                           max_workers: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Execute a plan in dependency order.
+
+        Steps start as soon as every step they depend on has completed, with
+        at most max_workers running at once, so wall-clock time follows the
+        plan's critical path rather than its length. Steps that depend on a
+        failed step are skipped; a failed critical step aborts the plan and
+        cancels everything still pending or running.
+
+        Each finished step is checkpointed to the plan journal. Steps that are
+        already COMPLETED (e.g. restored by load_plan) are not re-run; their
+        results feed dependent steps as usual. Steps an earlier run left
+        FAILED, SKIPPED or IN_PROGRESS are reported as failed and the plan
+        fails; resume_plan is the way to run them again.
+
+        Args:
+            plan: Plan to execute
+            session_id: Session the steps run under
+            max_workers: Concurrent steps (default: PKN_PLAN_WORKERS or 3)
+
+        Returns:
+            Summary with per-step results (in completion order)
+        """
+        max_workers = max_workers or self.max_workers
 
         self.active_plans[plan.id] = plan
         plan.status = "in_progress"
@@ -336,39 +506,115 @@ class PlanExecutor:
             'task': plan.task,
             'steps_completed': 0,
             'steps_failed': 0,
+            'steps_reused': 0,
             'step_results': [],
             'success': False,
             'error': None
         }
 
+        index = {step.id: step for step in plan.steps}
+        dependents: Dict[str, List[PlanStep]] = {step.id: [] for step in plan.steps}
+        unmet: Dict[str, int] = {}
+        ready = deque()
+        running: Dict[asyncio.Future, PlanStep] = {}
+        spawned: List[asyncio.Future] = []
+        stale: List[PlanStep] = []
+
+        def skip(step: PlanStep, reason: str):
+            step.status = StepStatus.SKIPPED
+            step.error = reason
+            self.journal.record_step(plan, step)
+            results['step_results'].append({'step_id': step.id, 'status': 'skipped', 'reason': reason})
+
+        def skip_dependents(step: PlanStep, reason: str):
+            # Everything downstream of a failed step can never run
+            stack = list(dependents[step.id])
+            while stack:
+                dependent = stack.pop()
+                if dependent.status == StepStatus.PENDING:
+                    skip(dependent, reason)
+                    stack.extend(dependents[dependent.id])
+
         try:
-            # Execute steps in order, respecting dependencies
+            self.journal.record_plan(plan)
+
+            # Build the graph: id -> step index, reverse edges and unmet-dependency counts
             for step in plan.steps:
-                # Check if dependencies are met
-                if not self._dependencies_met(step, plan):
-                    step.status = StepStatus.SKIPPED
-                    results['step_results'].append({
-                        'step_id': step.id,
-                        'status': 'skipped',
-                        'reason': 'Dependencies not met'
-                    })
+                if step.status == StepStatus.COMPLETED:
+                    results['steps_reused'] += 1
                     continue
-
-                # Execute step
-                step_result = self._execute_step(step, session_id, plan)
-
-                results['step_results'].append(step_result)
-
-                if step_result['status'] == 'completed':
-                    results['steps_completed'] += 1
-                elif step_result['status'] == 'failed':
+                if step.status != StepStatus.PENDING:
+                    # Journalled by an earlier run; never silently left out
+                    step.error = f"Left {step.status.value} by an earlier run; resume the plan to retry it"
+                    step.status = StepStatus.FAILED
+                    self.journal.record_step(plan, step)
                     results['steps_failed'] += 1
+                    results['step_results'].append({'step_id': step.id, 'status': 'failed', 'error': step.error})
+                    stale.append(step)
+                    continue
+                missing = [dep for dep in step.depends_on if dep not in index]
+                if missing:
+                    skip(step, f"Unknown dependencies: {', '.join(missing)}")
+                    continue
+                for dep in step.depends_on:
+                    dependents[dep].append(step)
+                unmet[step.id] = sum(1 for dep in step.depends_on if index[dep].status != StepStatus.COMPLETED)
 
-                    # If critical step fails, abort plan
-                    if step.priority == StepPriority.CRITICAL:
-                        results['error'] = f"Critical step failed: {step.action}"
-                        plan.status = "failed"
-                        break
+            if stale:
+                for step in stale:
+                    skip_dependents(step, f"Dependency {step.id} failed")
+                results['error'] = f"{len(stale)} step(s) have state from an earlier run; use resume_plan"
+                plan.status = "failed"
+
+            for step in plan.steps:
+                if step.status == StepStatus.PENDING and unmet.get(step.id) == 0 and not stale:
+                    ready.append(step)
+
+            while ready or running:
+                # Fill free workers with ready steps (plan order)
+                while ready and len(running) < max_workers:
+                    step = ready.popleft()
+                    future = asyncio.ensure_future(self._execute_step(step, session_id, plan, index))
+                    spawned.append(future)
+                    running[future] = step
+
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+
+                for future in done:
+                    step = running.pop(future)
+                    step_result = future.result()
+                    self.journal.record_step(plan, step)
+                    results['step_results'].append(step_result)
+
+                    if step_result['status'] == 'completed':
+                        results['steps_completed'] += 1
+
+                        # Re-queue dependents whose last dependency just finished
+                        for dependent in dependents[step.id]:
+                            unmet[dependent.id] -= 1
+                            if unmet[dependent.id] == 0 and dependent.status == StepStatus.PENDING:
+                                ready.append(dependent)
+
+                    elif step_result['status'] == 'failed':
+                        results['steps_failed'] += 1
+                        skip_dependents(step, f"Dependency {step.id} failed")
+
+                        # If critical step fails, abort plan
+                        if step.priority == StepPriority.CRITICAL and plan.status != "failed":
+                            results['error'] = f"Critical step failed: {step.action}"
+                            plan.status = "failed"
+
+                if plan.status == "failed":
+                    for future, step in running.items():
+                        future.cancel()
+                        skip(step, 'Cancelled after critical step failure')
+                    running.clear()
+                    ready.clear()
+
+            # Steps never reached (dependency cycle or aborted plan)
+            for step in plan.steps:
+                if step.status == StepStatus.PENDING:
+                    skip(step, 'Plan aborted' if plan.status == "failed" else 'Dependencies not met')
 
             # Mark plan as complete if no critical failures
             if plan.status != "failed":
@@ -382,25 +628,42 @@ class PlanExecutor:
             plan.status = "failed"
 
         finally:
-            # Save updated plan
-            self._save_plan_state(plan)
+            # No step task outlives the plan (error, critical failure or this coroutine being cancelled)
+            leftovers = [future for future in spawned if not future.done()]
+            for future in leftovers:
+                future.cancel()
+            if leftovers:
+                await asyncio.gather(*leftovers, return_exceptions=True)
+            self.journal.record_plan(plan)
+            await asyncio.to_thread(self.journal.flush)
 
         return results
 
-    def _dependencies_met(self, step: PlanStep, plan: ExecutionPlan) -> bool:
-        """Check if all step dependencies have completed"""
+    async def resume_plan(self, plan: ExecutionPlan, session_id: str,
+                          max_workers: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Continue an interrupted or failed plan.
 
-        if not step.depends_on:
-            return True
+        Completed steps keep their checkpointed results; failed, skipped and
+        in-flight steps are reset to PENDING and scheduled again.
 
-        for dep_id in step.depends_on:
-            dep_step = next((s for s in plan.steps if s.id == dep_id), None)
-            if not dep_step or dep_step.status != StepStatus.COMPLETED:
-                return False
+        Args:
+            plan: Plan loaded via TaskPlanner.load_plan (journal replayed)
+            session_id: Session the remaining steps run under
+            max_workers: Concurrent steps (default: PKN_PLAN_WORKERS or 3)
 
-        return True
+        Returns:
+            Same summary as execute_plan; steps_reused counts skipped work
+        """
+        for step in plan.steps:
+            if step.status != StepStatus.COMPLETED:
+                step.status = StepStatus.PENDING
+                step.error = None
 
-    def _execute_step(self, step: PlanStep, session_id: str, plan: ExecutionPlan) -> Dict:
+        return await self.execute_plan(plan, session_id, max_workers)
+
+    async def _execute_step(self, step: PlanStep, session_id: str, plan: ExecutionPlan,
+                            index: Dict[str, PlanStep]) -> Dict:
         """Execute a single step"""
 
         step.status = StepStatus.IN_PROGRESS
@@ -408,18 +671,20 @@ class PlanExecutor:
 
         try:
             # Build context from previous steps
-            context = self._build_step_context(step, plan)
+            context = self._build_step_context(step, plan, index)
 
             # Select agent and execute
             agent_type = self._map_agent_type(step.agent_type)
 
-            result = self.agent_manager.execute_task(
+            result = await self.agent_manager.execute_task(
+                self._step_instruction(step, context),
+                session_id,
                 agent_type=agent_type,
-                task=step.action,
-                session_id=session_id,
-                context=context,
-                tools_hint=step.tools_required
+                priority='delegation',
+                include_history=False  # The instruction carries the context this step needs
             )
+            if result.get('status') == 'error':
+                raise RuntimeError(result.get('error', 'Agent execution failed'))
 
             step.status = StepStatus.COMPLETED
             step.result = result
@@ -447,7 +712,8 @@ class PlanExecutor:
                 'duration': step.actual_duration
             }
 
-    def _build_step_context(self, step: PlanStep, plan: ExecutionPlan) -> Dict:
+    def _build_step_context(self, step: PlanStep, plan: ExecutionPlan,
+                            index: Dict[str, PlanStep]) -> Dict:
         """Build context for step execution from previous steps"""
 
         context = {
@@ -458,7 +724,7 @@ class PlanExecutor:
 
         # Include results from dependency steps
         for dep_id in step.depends_on:
-            dep_step = next((s for s in plan.steps if s.id == dep_id), None)
+            dep_step = index.get(dep_id)
             if dep_step and dep_step.result:
                 context['previous_results'].append({
                     'step_id': dep_id,
@@ -468,6 +734,24 @@ class PlanExecutor:
 
         return context
 
+    def _step_instruction(self, step: PlanStep, context: Dict) -> str:
+        """Render a step and its context as the instruction for the agent"""
+
+        instruction = f"Plan goal: {context['plan_goal']}\n\nYour step ({step.id}): {step.action}"
+
+        if step.tools_required:
+            instruction += f"\n\nSuggested tools: {', '.join(step.tools_required)}"
+
+        if context['previous_results']:
+            previous = "\n\n".join(
+                f"[{prev['step_id']}] {prev['action']}\n"
+                f"{str(prev['result'].get('response', '') if isinstance(prev['result'], dict) else prev['result'])[:2000]}"
+                for prev in context['previous_results']
+            )
+            instruction += f"\n\nResults from earlier steps:\n{previous}"
+
+        return instruction
+
     def _map_agent_type(self, agent_str: str) -> str:
         """Map plan agent string to AgentType enum"""
 
@@ -482,13 +766,6 @@ class PlanExecutor:
 
         return mapping.get(agent_str.lower(), 'general')
 
-    def _save_plan_state(self, plan: ExecutionPlan):
-        """Save current plan state"""
-
-        plan_file = Path(f"/home/gh0st/pkn/memory/plans/plan_{plan.id}.json")
-        with open(plan_file, 'w') as f:
-            json.dump(plan.to_dict(), f, indent=2)
-
     def get_plan_status(self, plan_id: str) -> Optional[Dict]:
         """Get current status of a plan"""
 
@@ -511,4 +788,4 @@ class PlanExecutor:
 if __name__ == "__main__":
     print("Planning Tools module loaded successfully!")
     print("Use TaskPlanner to create execution plans")
-    print("Use PlanExecutor to execute plans step-by-step")
+    print("Use PlanExecutor to execute plans (independent steps run concurrently)")
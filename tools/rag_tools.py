@@ -6,6 +6,7 @@ Semantic search over codebase for enhanced agent context
 
 import os
 import json
+import time
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 import hashlib
@@ -260,37 +261,142 @@ class RAGMemory:
             }
 
     def add_conversation_memory(self, session_id: str, user_message: str,
-                                agent_response: str, agent_type: str):
+                                agent_response: str, agent_type: str,
+                                message_id: Optional[int] = None, timestamp: Optional[float] = None):
         """Store important conversation exchanges for future reference"""
 
-        # Create searchable document from exchange
-        doc = f"""User: {user_message}
-Agent ({agent_type}): {agent_response}"""
+        return self.add_conversation_memories([{
+            'session_id': session_id,
+            'message_id': message_id,
+            'user_message': user_message,
+            'agent_response': agent_response,
+            'agent_type': agent_type,
+            'timestamp': timestamp
+        }])
+
+    @staticmethod
+    def conversation_document(exchange: Dict[str, Any]) -> str:
+        """Searchable text of one exchange"""
+        return f"""User: {exchange['user_message']}
+Agent ({exchange['agent_type']}): {exchange['agent_response']}"""
+
+    def add_conversation_memories(self, exchanges: List[Dict[str, Any]], embeddings=None) -> Dict[str, Any]:
+        """
+        Store several exchanges with one embedding batch.
+
+        Args:
+            exchanges: [{'session_id', 'message_id', 'user_message', 'agent_response',
+                         'agent_type', 'timestamp'}]; an exchange with the same
+                         session_id and message_id replaces the stored one
+            embeddings: Precomputed normalized embeddings of conversation_document(exchange)
+
+        Returns:
+            {'success': bool, 'added': int}
+        """
+        if self.conversation_collection is None:
+            return {'success': False, 'error': 'Conversation memory not available'}
+        if not exchanges:
+            return {'success': True, 'added': 0}
+
+        docs, metadatas, ids = [], [], []
+        for exchange in exchanges:
+            # Create searchable document from exchange
+            docs.append(self.conversation_document(exchange))
+            timestamp = exchange.get('timestamp') or time.time()
+            message_id = exchange.get('message_id')
+            metadatas.append({
+                'session_id': exchange['session_id'],
+                'agent_type': exchange['agent_type'] or '',
+                'timestamp': timestamp,
+                'message_id': message_id if message_id is not None else -1
+            })
+            ids.append(self.conversation_id(exchange['session_id'],
+                                            message_id if message_id is not None else time.time_ns()))
+
+        try:
+            if embeddings is None and self.encoder is not None:
+                embeddings = self.encoder.encode(docs, batch_size=len(docs), normalize_embeddings=True)
+            if embeddings is not None:
+                self.conversation_collection.upsert(
+                    documents=docs, metadatas=metadatas, ids=ids,
+                    embeddings=[list(map(float, vector)) for vector in embeddings]
+                )
+            else:
+                self.conversation_collection.upsert(documents=docs, metadatas=metadatas, ids=ids)
+            return {'success': True, 'added': len(docs)}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
 
-        doc_id = f"conv_{session_id}_{int(time.time())}"
+    def delete_conversation_memories(self, session_ids: List[str]) -> Dict[str, Any]:
+        """
+        Remove every stored exchange of the given sessions.
+
+        Returns:
+            {'success': bool}
+        """
+        if self.conversation_collection is None:
+            return {'success': False, 'error': 'Conversation memory not available'}
+        if not session_ids:
+            return {'success': True}
 
         try:
-            self.conversation_collection.add(
-                documents=[doc],
-                metadatas=[{
-                    'session_id': session_id,
-                    'agent_type': agent_type,
-                    'timestamp': time.time()
-                }],
-                ids=[doc_id]
-            )
+            self.conversation_collection.delete(where={'session_id': {'$in': list(session_ids)}})
             return {'success': True}
         except Exception as e:
             return {'success': False, 'error': str(e)}
 
-    def search_conversation_history(self, query: str, n_results: int = 5) -> Dict[str, Any]:
-        """Search past conversations for relevant context"""
+    @staticmethod
+    def conversation_id(session_id: str, message_id: int) -> str:
+        """Document id of an exchange in the conversation collection"""
+        return f"conv_{session_id}_{message_id}"
+
+    def search_conversation_history(self, query: str, n_results: int = 5,
+                                    session_id: Optional[str] = None, agent_type: Optional[str] = None,
+                                    since: Optional[float] = None, until: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Search past conversations for relevant context.
+
+        Args:
+            query: What to look for
+            n_results: Number of exchanges to return
+            session_id: Only this session
+            agent_type: Only exchanges answered by this agent
+            since: Only exchanges at or after this Unix time
+            until: Only exchanges at or before this Unix time
+        """
+        if self.conversation_collection is None:
+            return {'success': False, 'error': 'Conversation memory not available'}
+
+        conditions = []
+        if session_id:
+            conditions.append({'session_id': session_id})
+        if agent_type:
+            conditions.append({'agent_type': agent_type})
+        if since is not None:
+            conditions.append({'timestamp': {'$gte': since}})
+        if until is not None:
+            conditions.append({'timestamp': {'$lte': until}})
+        where_filter = None
+        if len(conditions) == 1:
+            where_filter = conditions[0]
+        elif conditions:
+            where_filter = {'$and': conditions}
 
         try:
-            results = self.conversation_collection.query(
-                query_texts=[query],
-                n_results=n_results
-            )
+            if self.encoder is not None:
+                # Same embedding space as add_conversation_memories
+                embedding = self.encoder.encode([query], normalize_embeddings=True)[0]
+                results = self.conversation_collection.query(
+                    query_embeddings=[list(map(float, embedding))],
+                    n_results=n_results,
+                    where=where_filter
+                )
+            else:
+                results = self.conversation_collection.query(
+                    query_texts=[query],
+                    n_results=n_results,
+                    where=where_filter
+                )
 
             formatted = []
             for i, doc in enumerate(results['documents'][0]):
@@ -299,8 +405,9 @@ Agent ({agent_type}): {agent_response}"""
                     'content': doc,
                     'session_id': metadata['session_id'],
                     'agent_type': metadata['agent_type'],
+                    'message_id': metadata.get('message_id'),
                     'timestamp': metadata.get('timestamp'),
-                    'relevance_score': 1.0 - results['distances'][0][i] if 'distances' in results else None
+                    'relevance_score': 1.0 - results['distances'][0][i] if results.get('distances') else None
                 })
 
             return {
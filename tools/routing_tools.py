@@ -0,0 +1,496 @@
+#!/usr/bin/env python3
+"""
+Task Routing
+Routes instructions to agents by embedding similarity to labeled example tasks,
+with compiled keyword matching for the fast paths
+"""
+
+import os
+import re
+import json
+import time
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Iterable, Set
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+
+# Labeled example instructions per agent type (values of AgentType)
+DEFAULT_EXEMPLARS: Dict[str, List[str]] = {
+    'general': [
+        "Hi, how are you today?",
+        "What is 2+2?",
+        "Tell me a joke",
+        "Thanks, that was helpful",
+        "Summarize this paragraph in one sentence",
+        "Translate 'good morning' into Spanish",
+        "Write a short poem about autumn",
+        "What's a good name for a cat?",
+    ],
+    'coder': [
+        "Write a Python function to calculate fibonacci numbers",
+        "Fix the bug in this JavaScript loop",
+        "Refactor this class to use dependency injection",
+        "Why does this code raise a KeyError?",
+        "Implement a binary search in Rust",
+        "Add type hints to this module",
+        "Optimize this SQL query that joins three tables",
+        "Write unit tests for the parser",
+        "Convert this callback code to async/await",
+    ],
+    'researcher': [
+        "Search Wikipedia for quantum computing",
+        "Find the latest news about the Linux kernel release",
+        "Look up the documentation for the requests library",
+        "Who is the current CEO of Nvidia?",
+        "What are the newest features in Python 3.13?",
+        "Find GitHub projects that implement CRDTs",
+        "When did the first iPhone come out?",
+        "Research the history of the Rust programming language",
+    ],
+    'executor': [
+        "List all Python files in the current directory",
+        "Run the test suite and show me the output",
+        "Read the file config.json",
+        "Create a new file called notes.txt with my todo list",
+        "Delete the temporary build directory",
+        "Move logs/old.log into the archive folder",
+        "Check how much disk space is left",
+        "Execute the bash command git status",
+    ],
+    'reasoner': [
+        "Plan an implementation strategy for adding dark mode to the UI",
+        "Compare REST and GraphQL for our mobile backend",
+        "Analyze the trade-offs of microservices versus a monolith",
+        "Explain why this algorithm is O(n log n)",
+        "Break this migration down into ordered steps",
+        "What is the best way to structure a large Flask app?",
+        "Evaluate the pros and cons of self-hosting our database",
+        "Walk through the logic of this proof step by step",
+    ],
+    'consultant': [
+        "Help me decide between accepting the job offer or staying",
+        "I need an expert opinion on our long-term architecture",
+        "Vote on which of these three designs we should ship",
+        "Advise me on a critical choice for the company roadmap",
+        "What is the ethical way to handle this user data request?",
+        "Recommend a strategic direction for the product next year",
+        "Consult on whether we should rewrite the system from scratch",
+    ],
+    'security': [
+        "Scan this host for open ports with nmap",
+        "Explain how SQL injection works and how to exploit it",
+        "Write a payload for this buffer overflow",
+        "Perform OSINT reconnaissance on this domain",
+        "How do I escalate privileges on a Linux box?",
+        "Crack this password hash",
+        "Audit this web app for XSS and CSRF vulnerabilities",
+        "Set up a Metasploit listener for a reverse shell",
+        "Enumerate subdomains for a pentest",
+    ],
+    'vision': [
+        "What do you see in this screenshot?",
+        "Describe the image I uploaded",
+        "Extract the text from this picture",
+        "Analyze this chart and tell me the trend",
+        "Is the button visible in this UI screenshot?",
+        "Read the handwriting in this photo",
+        "What's in this diagram?",
+    ],
+}
+
+
+class KeywordMatcher:
+    """
+    Counts keyword hits for many categories in one pass over the text.
+
+    Every keyword of every category is compiled once into an Aho-Corasick
+    automaton (pyahocorasick) that reports all overlapping matches in a
+    single scan. Without pyahocorasick, the keywords become one trie-shaped
+    regex inside a lookahead: each position yields its longest keyword, and
+    shorter keywords that are prefixes of it come from a precomputed table.
+    Counts keep the `keyword in text` semantics of the loops this replaces:
+    each distinct keyword present counts once, for every category that
+    lists it.
+    """
+
+    def __init__(self, categories: Dict[Any, Iterable[str]]):
+        """
+        Args:
+            categories: {category: [keywords]} (matched case-insensitively)
+        """
+        self.categories = {
+            name: list(dict.fromkeys(kw.lower() for kw in keywords if kw))
+            for name, keywords in categories.items()
+        }
+
+        self._owners: Dict[str, List[str]] = {}
+        for name, keywords in self.categories.items():
+            for kw in keywords:
+                self._owners.setdefault(kw, []).append(name)
+
+        keywords = list(self._owners)
+        self._automaton = None
+        self._pattern = None
+
+        if AHOCORASICK_AVAILABLE and keywords:
+            self._automaton = ahocorasick.Automaton()
+            for kw in keywords:
+                self._automaton.add_word(kw, kw)
+            self._automaton.make_automaton()
+        elif keywords:
+            # A keyword matched at some position implies every keyword that is its prefix
+            self._implied = {kw: [other for other in keywords if kw.startswith(other)] for kw in keywords}
+            self._pattern = re.compile(f"(?=({self._trie_pattern(keywords)}))")
+
+    @staticmethod
+    def _trie_pattern(keywords: List[str]) -> str:
+        """Render keywords as a prefix-factored regex that prefers the longest match"""
+        trie: Dict[str, Any] = {}
+        for kw in keywords:
+            node = trie
+            for ch in kw:
+                node = node.setdefault(ch, {})
+            node[''] = {}
+
+        def render(node: Dict[str, Any]) -> str:
+            branches = [re.escape(ch) + render(child) for ch, child in sorted(node.items()) if ch]
+            if not branches:
+                return ''
+            body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+            if '' in node:
+                # Shorter keyword ends here; greedy ? still tries the longer ones first
+                body = f"(?:{body})?"
+            return body
+
+        return render(trie)
+
+    def find(self, text: str) -> Set[str]:
+        """Return the set of keywords that occur anywhere in text"""
+        if self._automaton is not None:
+            return {kw for _, kw in self._automaton.iter(text.lower())}
+
+        found: Set[str] = set()
+        if self._pattern is None:
+            return found
+
+        for kw in set(self._pattern.findall(text.lower())):
+            found.update(self._implied[kw])
+        return found
+
+    def counts(self, text: str) -> Dict[Any, int]:
+        """Return {category: number of its distinct keywords present in text}"""
+        counts = dict.fromkeys(self.categories, 0)
+        for kw in self.find(text):
+            for name in self._owners[kw]:
+                counts[name] += 1
+        return counts
+
+
+class EmbeddingRouter:
+    """
+    Nearest-neighbour task router over sentence embeddings.
+
+    Exemplar instructions are embedded once; each request embeds the
+    instruction once and compares it against every exemplar with a single
+    matrix product. classify() returns None when the best match is not
+    confident enough, so callers can fall back to keyword scoring.
+
+    Encoding blocks, so event-loop callers run prepare() in a worker thread
+    first; classify() then reuses the cached query vector. warm_up() embeds
+    the exemplars in the background at startup.
+    """
+
+    QUERY_CACHE_SIZE = 64
+
+    def __init__(self, encoder, project_root: str = "/home/gh0st/pkn",
+                 exemplars: Optional[Dict[str, List[str]]] = None,
+                 method: Optional[str] = None, k: Optional[int] = None,
+                 threshold: Optional[float] = None, min_similarity: Optional[float] = None):
+        """
+        Args:
+            encoder: SentenceTransformer-compatible encoder (e.g. RAGMemory.encoder)
+            project_root: Project root; memory/routing_exemplars.json extends the exemplars
+            exemplars: {agent_type: [example instructions]} (default: DEFAULT_EXEMPLARS)
+            method: 'knn' (similarity-weighted vote of the k nearest) or 'centroid'
+            k: Neighbours considered by knn
+            threshold: Minimum confidence to accept a route
+            min_similarity: Minimum cosine similarity of the best match
+        """
+        self.encoder = encoder
+        self.available = encoder is not None and NUMPY_AVAILABLE
+        self.method = method or os.environ.get('PKN_ROUTER_METHOD', 'knn')
+        self.k = k or int(os.environ.get('PKN_ROUTER_K', 5))
+        self.threshold = threshold if threshold is not None else float(os.environ.get('PKN_ROUTER_THRESHOLD', 0.6))
+        self.min_similarity = min_similarity if min_similarity is not None else float(
+            os.environ.get('PKN_ROUTER_MIN_SIMILARITY', 0.35))
+
+        self.exemplars = {label: list(texts) for label, texts in (exemplars or DEFAULT_EXEMPLARS).items()}
+        custom_file = Path(project_root) / "memory" / "routing_exemplars.json"
+        if exemplars is None and custom_file.exists():
+            try:
+                with open(custom_file, 'r') as f:
+                    for label, texts in json.load(f).items():
+                        self.exemplars.setdefault(label, []).extend(texts)
+            except (OSError, ValueError) as e:
+                print(f"Warning: could not load routing exemplars: {e}")
+
+        self._lock = threading.Lock()
+        # (label_names, texts, labels, matrix, centroids); matrix/centroids are L2-normalized
+        self._index = None
+        self._queries: OrderedDict = OrderedDict()  # {instruction: normalized vector}
+
+        self.stats = {'routed': 0, 'fallbacks': 0, 'total_ms': 0.0}
+
+    def _embed(self, texts: List[str]):
+        return np.asarray(self.encoder.encode(texts, normalize_embeddings=True), dtype=np.float32)
+
+    def _ensure_index(self):
+        """Embed the exemplars on first use"""
+        index = self._index
+        if index is not None:
+            return index
+
+        with self._lock:
+            if self._index is not None:
+                return self._index
+
+            label_names = sorted(self.exemplars)
+            texts, labels = [], []
+            for i, label in enumerate(label_names):
+                texts.extend(self.exemplars[label])
+                labels.extend([i] * len(self.exemplars[label]))
+
+            matrix = self._embed(texts)
+            labels = np.asarray(labels)
+
+            centroids = np.stack([matrix[labels == i].mean(axis=0) for i in range(len(label_names))])
+            centroids /= np.linalg.norm(centroids, axis=1, keepdims=True)
+
+            self._index = (label_names, texts, labels, matrix, centroids)
+            return self._index
+
+    def warm_up(self) -> Optional[threading.Thread]:
+        """Embed the exemplars on a background thread so the first request doesn't"""
+        if not self.available or self._index is not None:
+            return None
+        thread = threading.Thread(target=self._ensure_index, name="router-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def embed_query(self, instruction: str):
+        """Embed an instruction (cached, so classify() right after doesn't encode again)"""
+        with self._lock:
+            query = self._queries.get(instruction)
+            if query is not None:
+                self._queries.move_to_end(instruction)
+                return query
+
+        query = self._embed([instruction])[0]
+
+        with self._lock:
+            self._queries[instruction] = query
+            while len(self._queries) > self.QUERY_CACHE_SIZE:
+                self._queries.popitem(last=False)
+        return query
+
+    def prepare(self, instruction: str):
+        """Do classify()'s blocking work (exemplar index, query embedding) ahead of time"""
+        if self.available and instruction.strip():
+            self._ensure_index()
+            self.embed_query(instruction)
+
+    def add_exemplars(self, label: str, texts: List[str]):
+        """Add labeled examples (the index is rebuilt on next use)"""
+        with self._lock:
+            self.exemplars.setdefault(label, []).extend(texts)
+            self._index = None
+
+    def classify(self, instruction: str) -> Optional[Dict[str, Any]]:
+        """
+        Route an instruction.
+
+        Returns:
+            {'agent_type': str, 'confidence': float, 'similarity': float,
+             'neighbors': [(exemplar, similarity), ...]}
+            or None if the router is unavailable or not confident
+        """
+        if not self.available or not instruction.strip():
+            return None
+
+        start = time.perf_counter()
+        label_names, texts, labels, matrix, centroids = self._ensure_index()
+
+        query = self.embed_query(instruction)
+
+        if self.method == 'centroid':
+            sims = centroids @ query
+            order = np.argsort(sims)[::-1]
+            best = int(order[0])
+            similarity = float(sims[best])
+            # Margin over the runner-up, mapped into 0-1
+            runner_up = float(sims[order[1]]) if len(order) > 1 else 0.0
+            confidence = min(1.0, max(0.0, 0.5 + (similarity - runner_up) * 5))
+            neighbors = []
+        else:
+            sims = matrix @ query
+            k = min(self.k, len(sims))
+            top = np.argpartition(sims, -k)[-k:]
+            top = top[np.argsort(sims[top])[::-1]]
+
+            votes = np.zeros(len(label_names), dtype=np.float32)
+            np.add.at(votes, labels[top], np.clip(sims[top], 0.0, None))
+            best = int(np.argmax(votes))
+            confidence = float(votes[best] / votes.sum()) if votes.sum() > 0 else 0.0
+            similarity = float(sims[top[0]])
+            neighbors = [(texts[i], round(float(sims[i]), 3)) for i in top[:3]]
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.stats['total_ms'] += elapsed_ms
+
+        if confidence < self.threshold or similarity < self.min_similarity:
+            self.stats['fallbacks'] += 1
+            return None
+
+        self.stats['routed'] += 1
+        return {
+            'agent_type': label_names[best],
+            'confidence': confidence,
+            'similarity': similarity,
+            'neighbors': neighbors,
+            'latency_ms': elapsed_ms
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Routing counters"""
+        calls = self.stats['routed'] + self.stats['fallbacks']
+        return {
+            'available': self.available,
+            'method': self.method,
+            'exemplars': sum(len(texts) for texts in self.exemplars.values()),
+            'routed': self.stats['routed'],
+            'fallbacks': self.stats['fallbacks'],
+            'avg_latency_ms': self.stats['total_ms'] / calls if calls else 0.0
+        }
+
+
+if __name__ == "__main__":
+    # Routing benchmark: accuracy and per-call latency vs keyword scoring
+    import sys
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+    # Held-out instructions (not in DEFAULT_EXEMPLARS)
+    test_set = [
+        ("hello there, what's up?", 'general'),
+        ("give me a fun fact about octopuses", 'general'),
+        ("what's the capital of France", 'general'),
+        ("my React component re-renders forever, can you fix it", 'coder'),
+        ("write a Go HTTP handler that returns JSON", 'coder'),
+        ("this recursion overflows the stack, rewrite it iteratively", 'coder'),
+        ("look up the release date of Debian 13", 'researcher'),
+        ("find recent papers on retrieval augmented generation", 'researcher'),
+        ("who won the 2022 world cup?", 'researcher'),
+        ("show me what's inside the logs folder", 'executor'),
+        ("make a directory called backups and copy main.py into it", 'executor'),
+        ("print the first 20 lines of server.log", 'executor'),
+        ("lay out a roadmap for migrating from Python 2 to 3", 'reasoner'),
+        ("which is better for this workload, Postgres or MongoDB, and why?", 'reasoner'),
+        ("reason through why the cache hit rate dropped after the deploy", 'reasoner'),
+        ("should I sell my startup or keep building it? I need a serious opinion", 'consultant'),
+        ("give me your expert recommendation on our hiring strategy", 'consultant'),
+        ("find an exploit for CVE-2021-44228 on this server", 'security'),
+        ("how can I bypass this login form's authentication", 'security'),
+        ("brute force the SSH service on 10.0.0.5", 'security'),
+        ("what is shown in this photo of my desk?", 'vision'),
+        ("OCR this scanned receipt", 'vision'),
+        ("does this mockup look aligned to you?", 'vision'),
+    ]
+
+    print("=" * 60)
+    print("KEYWORD MATCHER BENCHMARK")
+    print("=" * 60)
+
+    from agent_manager import ROUTING_KEYWORDS
+
+    matcher = KeywordMatcher(ROUTING_KEYWORDS)
+    short_instruction = "write a python function to parse the uploaded csv file and fix the error"
+    long_instruction = (
+        "Please review the attached service: the python function that parses uploads throws an error "
+        "when the file is large, and after that I need a plan to evaluate whether we should move to "
+        "a streaming approach. Also check the screenshot of the dashboard and search the docs. "
+    ) * 8
+
+    def loop_counts(text):
+        return {agent: sum(1 for kw in keywords if kw in text) for agent, keywords in ROUTING_KEYWORDS.items()}
+
+    for instruction in (short_instruction, long_instruction):
+        lowered = instruction.lower()
+        assert loop_counts(lowered) == matcher.counts(lowered)
+        iterations = 2000
+        for name, fn in (("substring loops", loop_counts), ("compiled matcher", matcher.counts)):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                fn(lowered)
+            per_call = (time.perf_counter() - start) / iterations * 1e6
+            print(f"{name:<18} {per_call:8.1f} us/call ({len(lowered)} chars, "
+                  f"{sum(len(k) for k in ROUTING_KEYWORDS.values())} keywords)")
+    print(f"Backend: {'aho-corasick' if matcher._automaton is not None else 'trie regex'}")
+
+    print()
+    print("=" * 60)
+    print("EMBEDDING ROUTER BENCHMARK")
+    print("=" * 60)
+
+    try:
+        from sentence_transformers import SentenceTransformer
+        encoder = SentenceTransformer('all-MiniLM-L6-v2')
+    except ImportError:
+        encoder = None
+
+    if encoder is None or not NUMPY_AVAILABLE:
+        print("sentence-transformers/numpy not installed; nothing to benchmark")
+        sys.exit(0)
+
+    def run(name, classify):
+        classify(test_set[0][0])  # warm up
+        correct, latencies = 0, []
+        for text, expected in test_set:
+            start = time.perf_counter()
+            predicted = classify(text)
+            latencies.append((time.perf_counter() - start) * 1000)
+            correct += predicted == expected
+        latencies.sort()
+        print(f"{name:<28} accuracy {correct}/{len(test_set)} ({correct / len(test_set):.0%})  "
+              f"p50 {latencies[len(latencies) // 2]:.2f} ms  p95 {latencies[int(len(latencies) * 0.95)]:.2f} ms")
+
+    for method in ('knn', 'centroid'):
+        router = EmbeddingRouter(encoder, exemplars=DEFAULT_EXEMPLARS, method=method, threshold=0.0, min_similarity=0.0)
+        run(f"embedding ({method})", lambda text: router.classify(text)['agent_type'])
+
+    try:
+        from agent_manager import agent_manager
+        run("keyword scoring", lambda text: agent_manager._keyword_route(text.lower())[0].value)
+
+        router = EmbeddingRouter(encoder, exemplars=DEFAULT_EXEMPLARS)
+
+        def hybrid(text):
+            route = router.classify(text)
+            return route['agent_type'] if route else agent_manager._keyword_route(text.lower())[0].value
+        run(f"embedding + fallback (>={router.threshold})", hybrid)
+        print(f"Fallback rate: {router.get_stats()['fallbacks']}/{len(test_set) + 1}")
+    except Exception as e:
+        print(f"Keyword baseline unavailable: {e}")
+
+    print("=" * 60)